@@ -1,166 +1,160 @@
 # api/backend/app_flask.py
-import json
+import base64
+import hashlib
+import os
 from datetime import datetime, timezone
-from typing import Dict, Optional, List
+from typing import Iterator, Optional, List, Tuple
+from urllib.parse import urlencode
 
-from flask import Flask, jsonify, request, abort
+import numpy as np
+from flask import Flask, g, jsonify, request, abort, stream_with_context
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
 
-from db import SessionLocal
-from models import FrameRaw, FrameManual, FrameSuggestion
+from compression import (
+    COMPRESSIBLE_MIMETYPES, MIN_SIZE, STATS as COMPRESSION_STATS, CompressedStore, compress, compress_stream, negotiate,
+)
+from config import ROADS_GEOJSON_PATH
+from corridor import match_route
+from db import Base, SessionLocal, engine, pragma_report, read_engine, reset_reader, use_reader
+import frames_binary
+from frames_merged import ensure_built as ensure_merged, gc_paused
+from fragments import CACHE as FRAGMENT_CACHE, Fragment, collection_body, dumps as fast_dumps, encoder_name
+from generation import GenerationCache, LruGenerationCache, get_generation
+from geojson_stream import iter_features
+import metrics
+from metrics import phase
+from models import (
+    FrameMerged, FrameSuggestion, SuggestionCluster, SuggestionClusterMember, ensure_indexes,
+)
+from road_graph import RoadGraph, load_or_build as load_road_graph
+from spatial_index import GridIndex, parse_bbox
+from suggestion_queue import QUEUE as SUGGESTION_QUEUE, QueueFull, STORED, Ticket
+from tiles import LineTiles, PointTiles, validate_tile
+from truck_check import FrameLimits, STATUS_NAMES, VIOLATES, evaluate, parse_truck_profile, reason_names
 
 app = Flask(__name__)
 
+try:
+    # таблицы и индексы, добавленные в модели позже, на базе хостинга
+    Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
+    # база до появления frames_merged — собираем слой один раз
+    if ensure_merged(engine):
+        print("[app] слой frames_merged собран")
+except SQLAlchemyError as exc:
+    print(f"[app] схема не проверена: {exc}")
+
+try:
+    for _role, _pragmas in pragma_report().items():
+        print(f"[db] {_role}: " + " ".join(f"{k}={v}" for k, v in _pragmas.items()))
+except SQLAlchemyError as exc:
+    print(f"[db] PRAGMA не прочитаны: {exc}")
+
+print(f"[app] JSON: {encoder_name()}, LRU фрагментов фич вне снимков {FRAGMENT_CACHE.max_bytes // (1024 * 1024)} МБ")
+
 API_PREFIX = "/api"
 
 
-@app.route(f"{API_PREFIX}/health")
-def health():
-    return jsonify({"status": "ok"})
+# ---------- Движок базы по методу запроса ----------
+# GET/HEAD/OPTIONS читают через read_engine (пул только на чтение), остальное — через
+# писателя (db.py). POST-эндпоинты ниже в базу не пишут: расчёты по присланному
+# маршруту/профилю, а предложения пишет фоновая очередь — им тоже хватает читателя.
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+READ_ONLY_ENDPOINTS = {
+    "frames_corridor", "frames_evaluate", "route",
+    "suggest_for_existing_frame", "suggest_new_frame", "suggest_batch",
+}
 
 
-# ---------- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ----------
+@app.before_request
+def _select_db_engine():
+    g.db_reader_token = use_reader(request.method in READ_METHODS or request.endpoint in READ_ONLY_ENDPOINTS)
 
-def _parse_json_field(text: Optional[str], default):
-    if not text:
-        return default
-    try:
-        return json.loads(text)
-    except Exception:
-        return default
 
+@app.teardown_request
+def _reset_db_engine(_exc):
+    token = g.pop("db_reader_token", None)
+    if token is not None:
+        reset_reader(token)
 
-def _merge_raw_and_manual(raw: FrameRaw, manual: Optional[FrameManual]):
-    """Склеиваем данные raw + manual в properties + coords."""
 
-    def pick(override, base):
-        return override if override is not None else base
+# ---------- Метрики запросов ----------
+# Хуки объявлены до _compress_response: after_request вызываются в обратном порядке,
+# так что сюда ответ приходит уже сжатым и размер — тот, что уйдёт клиенту.
 
-    # координаты
-    lon = pick(manual.lon_override if manual else None, raw.lon)
-    lat = pick(manual.lat_override if manual else None, raw.lat)
+metrics.instrument_engine(engine)
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine)
 
-    # time_windows и tags
-    time_windows = _parse_json_field(
-        manual.time_windows_override if manual and manual.time_windows_override is not None else raw.time_windows,
-        default=[]
-    )
 
-    tags_raw = _parse_json_field(raw.tags, default=[])
-    tags_admin = _parse_json_field(manual.tags_admin, default=[]) if manual else []
-    tags = list(dict.fromkeys(tags_raw + tags_admin))
-
-    properties = {
-        "road_id": pick(manual.road_id_override if manual else None, raw.road_id),
-        "road_name": pick(manual.road_name_override if manual else None, raw.road_name),
-        "class": pick(manual.clazz_override if manual else None, raw.clazz),
-        "object_type": raw.object_type,
-        "hgv_access": pick(manual.hgv_access_override if manual else None, raw.hgv_access),
-        "weight_limit_tons": pick(
-            manual.weight_limit_tons_override if manual else None,
-            raw.weight_limit_tons,
-        ),
-        "axle_load_tons": pick(
-            manual.axle_load_tons_override if manual else None,
-            raw.axle_load_tons,
-        ),
-        "time_windows": time_windows,
-        "valid_from": pick(manual.valid_from_override if manual else None, raw.valid_from),
-        "valid_to": pick(manual.valid_to_override if manual else None, raw.valid_to),
-        "direction": pick(manual.direction_override if manual else None, raw.direction),
-        "source_type": raw.source_type,
-        "source_name": raw.source_name,
-        "priority": raw.priority,
-        "tags": tags,
-        "frame_id": raw.frame_id,
-        "frame_row_id_raw": raw.frame_row_id_raw,
-        "frame_url": raw.frame_url,
-        "frame_status_raw": raw.frame_status_raw,
-        "frame_error_raw": raw.frame_error_raw,
-        "frame_state": pick(
-            manual.frame_state_override if manual else None,
-            raw.frame_state,
-        ),
-        "frame_first_seen": raw.frame_first_seen,
-        "frame_last_seen": raw.frame_last_seen,
-        "frame_is_active": bool(raw.frame_is_active),
-        "frame_change_type": raw.frame_change_type,
-    }
+@app.before_request
+def _start_request_metrics():
+    rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.request_stats = metrics.start_request(rule, request.method)
 
-    # комментарии
-    comment_raw = raw.comment_raw or ""
-    comment_admin = manual.comment_admin if manual else None
 
-    if comment_admin:
-        base_human = raw.comment_human or ""
-        if base_human:
-            human = f"{base_human} Комментарий администратора: {comment_admin}"
-        else:
-            human = f"Комментарий администратора: {comment_admin}"
+@app.after_request
+def _finish_request_metrics(resp):
+    stats = g.pop("request_stats", None)
+    if stats is None:
+        return resp
+    resp.headers["Server-Timing"] = stats.server_timing()
+    status = resp.status_code
+    if resp.is_streamed:
+        # поток ещё не отдан: время и размер фиксируем, когда он закончится
+        resp.response = metrics.counting(resp.response, lambda size: metrics.finish_request(stats, status, size))
     else:
-        human = raw.comment_human
+        metrics.finish_request(stats, status, resp.content_length)
+    return resp
 
-    properties["comment_raw"] = comment_raw
-    properties["comment_human"] = human
 
-    return {
-        "type": "Feature",
-        "id": raw.frame_id,
-        "geometry": {
-            "type": "Point",
-            "coordinates": [lon, lat],
-        },
-        "properties": properties,
-    }
+def _external_metrics():
+    for encoding, item in COMPRESSION_STATS.snapshot().items():
+        labels = (("encoding", encoding),)
+        yield "tt_compression_responses_total", "counter", "Ответов по кодировкам", labels, item["responses"]
+        yield "tt_compression_bytes_in_total", "counter", "Байт до сжатия", labels, item["bytes_in"]
+        yield "tt_compression_bytes_out_total", "counter", "Байт после сжатия", labels, item["bytes_out"]
+    fragments = FRAGMENT_CACHE.stats()
+    yield "tt_fragment_cache_hits_total", "counter", "Фич слоя, взятых из кэша фрагментов", (), fragments["hits"]
+    yield "tt_fragment_cache_misses_total", "counter", "Фич слоя, разобранных заново", (), fragments["misses"]
+    yield "tt_fragment_cache_evictions_total", "counter", "Вытесненных фрагментов", (), fragments["evictions"]
+    yield "tt_fragment_cache_live_items", "gauge", "Фрагментов в живых снимках слоя", (), fragments["live_items"]
+    yield "tt_fragment_cache_items", "gauge", "Фрагментов в LRU (вне снимков)", (), fragments["items"]
+    yield "tt_fragment_cache_bytes", "gauge", "Оценка памяти LRU фрагментов", (), fragments["bytes"]
+    queue = SUGGESTION_QUEUE.stats()
+    yield "tt_suggestion_queue_pending_rows", "gauge", "Предложений в очереди записи", (), queue["pending_rows"]
+    yield "tt_suggestion_queue_batches_total", "counter", "Записанных пачек предложений", (), queue["batches"]
+    yield "tt_suggestion_queue_rows_written_total", "counter", "Записанных предложений", (), queue["rows_written"]
+    yield "tt_suggestion_queue_rejected_rows_total", "counter", "Отклонённых предложений (очередь полна)", (), \
+        queue["rejected_rows"]
 
 
-def _feature_from_manual_only(manual: FrameManual):
-    """Рамка, созданная только руками админа, без raw."""
-    if manual.lon_override is None or manual.lat_override is None:
-        return None
-
-    time_windows = _parse_json_field(manual.time_windows_override, default=[])
-    tags_admin = _parse_json_field(manual.tags_admin, default=[])
-
-    properties = {
-        "road_id": manual.road_id_override,
-        "road_name": manual.road_name_override,
-        "class": manual.clazz_override,
-        "object_type": "frame",
-        "hgv_access": manual.hgv_access_override,
-        "weight_limit_tons": manual.weight_limit_tons_override,
-        "axle_load_tons": manual.axle_load_tons_override,
-        "time_windows": time_windows,
-        "valid_from": manual.valid_from_override,
-        "valid_to": manual.valid_to_override,
-        "direction": manual.direction_override,
-        "source_type": "manual",
-        "source_name": "manual_admin",
-        "priority": 1,
-        "tags": tags_admin,
-        "frame_id": manual.frame_id,
-        "frame_row_id_raw": None,
-        "frame_url": None,
-        "frame_status_raw": None,
-        "frame_error_raw": None,
-        "frame_state": manual.frame_state_override,
-        "frame_first_seen": None,
-        "frame_last_seen": None,
-        "frame_is_active": True,
-        "frame_change_type": "manual_only",
-        "comment_raw": "",
-        "comment_human": manual.comment_admin,
-    }
+metrics.REGISTRY.add_collector(_external_metrics)
+
+
+@app.route(f"{API_PREFIX}/health")
+def health():
+    return jsonify({"status": "ok"})
+
+
+@app.route(f"{API_PREFIX}/stats")
+def stats():
+    """Счётчики процесса: сжатие ответов по кодировкам, очередь записи предложений, кэш фрагментов фич."""
+    return jsonify({
+        "compression": COMPRESSION_STATS.snapshot(),
+        "suggestions": SUGGESTION_QUEUE.stats(),
+        "fragments": {"encoder": encoder_name(), **FRAGMENT_CACHE.stats()},
+    })
 
-    return {
-        "type": "Feature",
-        "id": manual.frame_id,
-        "geometry": {
-            "type": "Point",
-            "coordinates": [manual.lon_override, manual.lat_override],
-        },
-        "properties": properties,
-    }
 
+@app.route(f"{API_PREFIX}/metrics")
+def get_metrics():
+    """Метрики процесса в текстовом формате Prometheus (см. metrics.py)."""
+    return app.response_class(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ----------
 
 def _suggestion_to_dict(s: FrameSuggestion) -> dict:
     return {
@@ -184,6 +178,263 @@ def _suggestion_to_dict(s: FrameSuggestion) -> dict:
     }
 
 
+# ---------- Слой рамок: сборка и кэш ----------
+
+# сборка снимка: если не в кэше больше 1/N слоя — читаем слой целиком, иначе по ключам
+FRAGMENT_FULL_SCAN_RATIO = 4
+FRAGMENT_FETCH_CHUNK = 400  # ключей (source, source_id) в одном IN (...)
+
+
+def _iter_frame_feature_texts(db, only_active: bool, batch_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Готовые JSON-строки фич слоя рамок из frames_merged (склейка raw + manual
+    сделана при записи, см. frames_merged.py) — один проход по первичному ключу.
+    С batch_size строки читаются курсором порциями (yield_per).
+    """
+    query = (
+        select(FrameMerged.feature)
+        .where(FrameMerged.in_active if only_active else FrameMerged.in_all)
+        .order_by(FrameMerged.source, FrameMerged.source_id)
+    )
+    if batch_size:
+        query = query.execution_options(yield_per=batch_size)
+    return db.execute(query).scalars()
+
+
+def _load_fragments(db, only_active: bool) -> List[Fragment]:
+    """
+    Фрагменты всех фич слоя (fragments.py): версии строк читаем из frames_merged,
+    свежие фичи берём из кэша фрагментов, из базы дочитываем и разбираем только
+    новые и изменившиеся. Собранный набор публикуется в кэш как живой для этого слоя:
+    следующий снимок возьмёт из него всё, кроме изменённых строк.
+    Между двумя запросами может пройти запись: текст тогда новее прочитанной версии
+    (в кэше такая запись просто не совпадёт со следующей версией), а удалённая
+    за это время строка в снимок не попадает.
+    """
+    in_layer = FrameMerged.in_active if only_active else FrameMerged.in_all
+    rows = db.execute(
+        select(FrameMerged.source, FrameMerged.source_id, FrameMerged.version)
+        .where(in_layer)
+        .order_by(FrameMerged.source, FrameMerged.source_id)
+    ).all()
+    keys = [((source, source_id), version) for source, source_id, version in rows]
+    found = FRAGMENT_CACHE.lookup(keys)
+    missing = [keys[i][0] for i, fragment in enumerate(found) if fragment is None]
+    if not missing:
+        FRAGMENT_CACHE.publish(only_active, [key for key, _ in keys], found)
+        return found
+
+    columns = (FrameMerged.source, FrameMerged.source_id, FrameMerged.feature)
+    if len(missing) * FRAGMENT_FULL_SCAN_RATIO >= len(keys):
+        # в кэше мало что есть: один проход по слою дешевле выборок по ключам
+        queries = [select(*columns).where(in_layer)]
+    else:
+        key_columns = tuple_(FrameMerged.source, FrameMerged.source_id)
+        queries = [
+            select(*columns).where(key_columns.in_(missing[i:i + FRAGMENT_FETCH_CHUNK]))
+            for i in range(0, len(missing), FRAGMENT_FETCH_CHUNK)
+        ]
+
+    texts = {(source, source_id): feature for query in queries for source, source_id, feature in db.execute(query)}
+    layer_keys = []
+    fragments = []
+    for (key, version), fragment in zip(keys, found):
+        if fragment is None:
+            text = texts.get(key)
+            if text is None:
+                continue
+            fragment = FRAGMENT_CACHE.parse(version, text)
+        layer_keys.append(key)
+        fragments.append(fragment)
+    FRAGMENT_CACHE.publish(only_active, layer_keys, fragments)
+    return fragments
+
+
+def _encode_json(payload) -> bytes:
+    return fast_dumps(payload)
+
+
+# ---------- Сжатие ответов ----------
+
+# Сжатые копии ответов, собранных на поколение: (etag, кодировка) -> bytes
+_compressed_store = CompressedStore()
+
+
+def _cached_response(body: bytes, etag: str, mimetype: str):
+    """
+    Ответ из кэша поколения с сильным ETag.
+    Сжатая копия берётся из _compressed_store (сжимаем один раз на ETag),
+    у каждой кодировки свой ETag; If-None-Match -> 304.
+    """
+    encoding = None
+    data = body
+    resp = app.response_class(mimetype=mimetype)
+    if len(body) >= MIN_SIZE:
+        resp.vary.add("Accept-Encoding")
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+    if encoding:
+        data = _compressed_store.get_or_compress(etag, encoding, body)
+        resp.headers["Content-Encoding"] = encoding
+        etag = f"{etag}-{encoding}"
+
+    resp.set_data(data)
+    resp.set_etag(etag)
+    # браузер хранит ответ, но каждый раз перепроверяет его по ETag
+    resp.headers["Cache-Control"] = "no-cache"
+    resp = resp.make_conditional(request)
+    if resp.status_code == 200 and len(body) >= MIN_SIZE:
+        COMPRESSION_STATS.add(encoding or "identity", len(body), len(data))
+    return resp
+
+
+@app.after_request
+def _compress_response(resp):
+    """Сжатие остальных ответов (bbox, коридор, потоки ndjson) — на лету, быстрым уровнем."""
+    if (
+        resp.status_code != 200
+        or request.method == "HEAD"
+        or "Content-Encoding" in resp.headers
+        or "ETag" in resp.headers  # ответы _cached_response уже сжаты и учтены
+        or resp.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return resp
+
+    if resp.is_streamed:
+        resp.vary.add("Accept-Encoding")
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        if encoding:
+            resp.response = compress_stream(resp.response, encoding)
+            resp.headers["Content-Encoding"] = encoding
+            resp.headers.pop("Content-Length", None)
+            COMPRESSION_STATS.add(encoding, 0, 0)
+        return resp
+
+    body = resp.get_data()
+    if len(body) < MIN_SIZE:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = negotiate(request.headers.get("Accept-Encoding"))
+    if not encoding:
+        COMPRESSION_STATS.add("identity", len(body), len(body))
+        return resp
+    data = compress(body, encoding)
+    resp.set_data(data)
+    resp.headers["Content-Encoding"] = encoding
+    COMPRESSION_STATS.add(encoding, len(body), len(data))
+    return resp
+
+
+class FramesSnapshot:
+    """
+    Фичи слоя рамок одного поколения + пространственный индекс по ним.
+    fragments — те же фичи готовыми байтами JSON (ответы склеиваются из них).
+    """
+
+    def __init__(self, generation: int, features: List[dict], fragments: List[bytes]):
+        self.generation = generation
+        self.features = features
+        self.fragments = fragments
+        coords = [f["geometry"]["coordinates"] for f in features]
+        self.lon = np.array([c[0] if c[0] is not None else np.nan for c in coords], dtype=np.float64)
+        self.lat = np.array([c[1] if c[1] is not None else np.nan for c in coords], dtype=np.float64)
+        self.index = GridIndex(self.lon, self.lat)
+        self.limits = FrameLimits(features)
+        self.position_by_id = {f.get("id"): i for i, f in enumerate(features)}
+
+    def bbox_body(self, bbox, limit: Optional[int] = None) -> bytes:
+        positions = self.index.query_bbox(*bbox, limit=limit)
+        return collection_body(self.fragments[i] for i in positions)
+
+
+# Снимок слоя: ключ (поколение, only_active) -> FramesSnapshot
+_frames_snapshot_cache = GenerationCache()
+
+# Готовые байты ответа /api/frames: ключ (поколение, only_active) -> (body, etag)
+_frames_body_cache = GenerationCache()
+_frames_binary_cache = GenerationCache()
+
+
+def _build_snapshot(db, generation: int, only_active: bool) -> FramesSnapshot:
+    # десятки тысяч dict и кортежей: без сборщика мусора, см. frames_merged.gc_paused
+    with gc_paused():
+        with phase("merge"):
+            fragments = _load_fragments(db, only_active)
+        with phase("snapshot_index"):
+            return FramesSnapshot(generation, [f[2] for f in fragments], [f[1] for f in fragments])
+
+
+def _frames_snapshot(only_active: bool) -> FramesSnapshot:
+    db = SessionLocal()
+    try:
+        # поколение читаем ДО данных: при гонке с импортом свежие данные
+        # могут попасть под старое поколение, но не наоборот
+        generation = get_generation(db)
+        return _frames_snapshot_cache.get_or_build(
+            generation, only_active,
+            lambda: _build_snapshot(db, generation, only_active),
+        )
+    finally:
+        db.close()
+
+
+def _frames_body(only_active: bool) -> Tuple[bytes, str]:
+    snapshot = _frames_snapshot(only_active)
+
+    def build():
+        with phase("serialize"):
+            body = collection_body(snapshot.fragments)
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        return body, f"g{snapshot.generation}-a{int(only_active)}-{digest}"
+
+    return _frames_body_cache.get_or_build(snapshot.generation, only_active, build)
+
+
+def _frames_binary(only_active: bool) -> Tuple[bytes, str]:
+    snapshot = _frames_snapshot(only_active)
+
+    def build():
+        with phase("serialize_bin"):
+            body = frames_binary.encode(snapshot.features)
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        return body, f"g{snapshot.generation}-a{int(only_active)}-bin-{digest}"
+
+    return _frames_binary_cache.get_or_build(snapshot.generation, only_active, build)
+
+
+# NDJSON: сколько строк raw читать из курсора за раз и каким куском отдавать ответ
+NDJSON_BATCH_ROWS = 500
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+FRAMES_FORMATS = ("json", "ndjson", "bin")
+
+
+def _frames_ndjson(only_active: bool):
+    """Генератор ответа: по строке JSON на рамку, прямо из курсора базы."""
+    db = SessionLocal()
+    try:
+        buf = []
+        size = 0
+        first = True
+        # строки frames_merged уже в том же компактном JSON — отдаём как есть
+        for text in _iter_frame_feature_texts(db, only_active, batch_size=NDJSON_BATCH_ROWS):
+            line = text.encode("utf-8") + b"\n"
+            if first:
+                # первую строку отдаём сразу — время до первого байта не зависит от размера слоя
+                first = False
+                yield line
+                continue
+            buf.append(line)
+            size += len(line)
+            if size >= NDJSON_CHUNK_BYTES:
+                yield b"".join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield b"".join(buf)
+    finally:
+        db.close()
+
+
 # ---------- API: объединённый слой рамок ----------
 
 @app.route(f"{API_PREFIX}/frames", methods=["GET"])
@@ -191,133 +442,682 @@ def get_frames():
     """
     GET /api/frames
     Возвращает FeatureCollection с рамками (raw + manual).
+
+    Ответ собирается один раз на поколение данных и отдаётся с сильным ETag;
+    на If-None-Match с тем же ETag отвечаем 304 без обращения к данным.
+
+    GET /api/frames?bbox=minLon,minLat,maxLon,maxLat[&limit=N]
+    Только рамки внутри bbox (через пространственный индекс снимка).
+
+    GET /api/frames?format=ndjson
+    Поток application/x-ndjson: одна фича на строку, читается из базы курсором.
+
+    GET /api/frames?format=bin
+    Колоночный бинарный формат (см. frames_binary.py), с ETag как у JSON.
     """
     only_active = request.args.get("only_active", "1") != "0"
+    fmt = request.args.get("format", "json")
+    if fmt not in FRAMES_FORMATS:
+        abort(400, description=f"format must be one of: {', '.join(FRAMES_FORMATS)}")
 
-    db = SessionLocal()
     try:
-        query = db.query(FrameRaw)
-        if only_active:
-            query = query.filter(FrameRaw.frame_is_active == True)  # noqa: E712
-        raws: List[FrameRaw] = query.all()
+        bbox = parse_bbox(request.args.get("bbox"))
+        # не type=int: werkzeug молча отбрасывает нечисловое значение, а нам нужен 400
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError as e:
+        abort(400, description=str(e))
+    if limit is not None and limit < 0:
+        abort(400, description="limit must be >= 0")
 
-        manuals: List[FrameManual] = db.query(FrameManual).all()
+    if bbox is not None:
+        if fmt != "json":
+            abort(400, description="bbox is supported only with format=json")
+        body = _frames_snapshot(only_active).bbox_body(bbox, limit=limit)
+        resp = app.response_class(body, mimetype="application/json")
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
 
-        manual_by_frame: Dict[str, FrameManual] = {}
-        manual_only_list: List[FrameManual] = []
+    if fmt == "ndjson":
+        resp = app.response_class(stream_with_context(_frames_ndjson(only_active)), mimetype="application/x-ndjson")
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
 
-        for m in manuals:
-            if m.is_deleted_by_admin:
-                manual_by_frame[m.frame_id] = m
-                continue
-            if m.manual_only:
-                manual_only_list.append(m)
-            manual_by_frame.setdefault(m.frame_id, m)
+    if fmt == "bin":
+        body, etag = _frames_binary(only_active)
+        mimetype = "application/octet-stream"
+    else:
+        body, etag = _frames_body(only_active)
+        mimetype = "application/json"
 
-        features: List[dict] = []
+    return _cached_response(body, etag, mimetype)
 
-        for raw in raws:
-            m = manual_by_frame.get(raw.frame_id)
-            if m and m.is_deleted_by_admin:
-                continue
-            features.append(_merge_raw_and_manual(raw, m))
 
-        raw_ids = {r.frame_id for r in raws}
-        for m in manual_only_list:
-            if m.frame_id in raw_ids:
-                continue
-            feat = _feature_from_manual_only(m)
-            if feat:
-                features.append(feat)
+# Ограничения на вход /api/frames/corridor
+CORRIDOR_MAX_POINTS = 20000
+CORRIDOR_DEFAULT_BUFFER_M = 150.0
+CORRIDOR_MAX_BUFFER_M = 50000.0
 
-        return jsonify({"type": "FeatureCollection", "features": features})
-    finally:
-        db.close()
+
+@app.route(f"{API_PREFIX}/frames/corridor", methods=["POST"])
+def frames_corridor():
+    """
+    POST /api/frames/corridor
+    {"route": [[lon, lat], ...], "buffer_m": 150, "only_active": true, "truck": {...}}
+
+    Рамки не дальше buffer_m от любого отрезка маршрута, по порядку следования.
+    В properties каждой рамки добавляются corridor_distance_m и route_offset_m,
+    а если передан truck — ещё truck_status (ok/warn/violates) и truck_reasons.
+    """
+    data = request.get_json(silent=True) or {}
+    route = data.get("route")
+    if not isinstance(route, list) or not route:
+        abort(400, description="route must be a non-empty list of [lon, lat]")
+    if len(route) > CORRIDOR_MAX_POINTS:
+        abort(400, description=f"route is limited to {CORRIDOR_MAX_POINTS} points")
+
+    try:
+        points = np.asarray(route, dtype=np.float64)
+        buffer_m = float(data.get("buffer_m", CORRIDOR_DEFAULT_BUFFER_M))
+    except (TypeError, ValueError):
+        abort(400, description="route must be a list of [lon, lat] numbers")
+    if points.ndim != 2 or points.shape[1] != 2:
+        abort(400, description="route must be a list of [lon, lat] numbers")
+    if not (0 < buffer_m <= CORRIDOR_MAX_BUFFER_M):
+        abort(400, description=f"buffer_m must be in (0, {CORRIDOR_MAX_BUFFER_M:g}]")
+
+    truck = None
+    if data.get("truck"):
+        try:
+            truck = parse_truck_profile(data["truck"])
+        except (TypeError, ValueError) as e:
+            abort(400, description=f"truck: {e}")
+
+    only_active = bool(data.get("only_active", True))
+    snapshot = _frames_snapshot(only_active)
+    positions, distance, along = match_route(snapshot.index, snapshot.lon, snapshot.lat, points, buffer_m)
+
+    status = reasons = None
+    if truck is not None:
+        status, reasons = evaluate(snapshot.limits, positions, [truck])
+
+    features = []
+    for i, (pos, dist_m, offset_m) in enumerate(zip(positions.tolist(), distance.tolist(), along.tolist())):
+        feat = snapshot.features[pos]
+        props = dict(feat["properties"])
+        props["corridor_distance_m"] = round(dist_m, 1)
+        props["route_offset_m"] = round(offset_m, 1)
+        if status is not None:
+            props["truck_status"] = STATUS_NAMES[status[0, i]]
+            props["truck_reasons"] = reason_names(int(reasons[0, i]))
+        features.append({**feat, "properties": props})
+
+    body = _encode_json({"type": "FeatureCollection", "features": features})
+    return app.response_class(body, mimetype="application/json")
+
+
+# Ограничения на вход /api/frames/evaluate
+EVALUATE_MAX_FRAMES = 50000
+EVALUATE_MAX_PROFILES = 200
+
+
+@app.route(f"{API_PREFIX}/frames/evaluate", methods=["POST"])
+def frames_evaluate():
+    """
+    POST /api/frames/evaluate
+    {"frame_ids": [...], "trucks": [{"weight": 40, "axle_load": 10}, ...]}
+    (или "truck": {...} для одного профиля; без frame_ids — весь слой)
+
+    Классифицирует рамки против каждого профиля ТС: ok / warn / violates + причины.
+    """
+    data = request.get_json(silent=True) or {}
+
+    raw_profiles = data.get("trucks")
+    if raw_profiles is None and data.get("truck") is not None:
+        raw_profiles = [data["truck"]]
+    if not isinstance(raw_profiles, list) or not raw_profiles:
+        abort(400, description="truck or trucks is required")
+    if len(raw_profiles) > EVALUATE_MAX_PROFILES:
+        abort(400, description=f"trucks is limited to {EVALUATE_MAX_PROFILES} profiles")
+    try:
+        profiles = [parse_truck_profile(p) for p in raw_profiles]
+    except (TypeError, ValueError) as e:
+        abort(400, description=f"truck: {e}")
+
+    only_active = bool(data.get("only_active", True))
+    snapshot = _frames_snapshot(only_active)
+
+    frame_ids = data.get("frame_ids")
+    if frame_ids is None:
+        positions = np.arange(len(snapshot.features), dtype=np.int64)
+    else:
+        if not isinstance(frame_ids, list) or len(frame_ids) > EVALUATE_MAX_FRAMES:
+            abort(400, description=f"frame_ids must be a list of up to {EVALUATE_MAX_FRAMES} ids")
+        # id в снимке — строки или числа (как в GeoJSON); bool — тоже int, но id быть не может
+        if not all(isinstance(fid, (str, int)) and not isinstance(fid, bool) for fid in frame_ids):
+            abort(400, description="frame_ids must contain only string or number ids")
+        found = [snapshot.position_by_id.get(fid) for fid in frame_ids]
+        positions = np.array([p for p in found if p is not None], dtype=np.int64)
+
+    status, reasons = evaluate(snapshot.limits, positions, profiles)
+
+    ids = [snapshot.features[p].get("id") for p in positions.tolist()]
+    results = []
+    for row_status, row_reasons in zip(status, reasons):
+        counts = np.bincount(row_status, minlength=len(STATUS_NAMES))
+        results.append({
+            "summary": dict(zip(STATUS_NAMES, counts.tolist())),
+            "frames": [
+                {"frame_id": fid, "status": STATUS_NAMES[st], "reasons": reason_names(mask)}
+                for fid, st, mask in zip(ids, row_status.tolist(), row_reasons.tolist())
+            ],
+        })
+
+    payload = {"frames_total": len(ids), "results": results}
+    if frame_ids is not None:
+        payload["unknown_frame_ids"] = [fid for fid, p in zip(frame_ids, found) if p is None]
+    return app.response_class(_encode_json(payload), mimetype="application/json")
+
+
+# ---------- API: тайлы слоёв карты ----------
+
+TILE_CACHE_SIZE = 4096
+
+# Индексы тайлов по слоям: рамки — на поколение данных, дороги — на mtime файла
+_frames_tiles_cache = GenerationCache()
+_roads_tiles_cache = GenerationCache()
+
+
+def _frames_tiles(only_active: bool) -> Tuple[int, PointTiles]:
+    snapshot = _frames_snapshot(only_active)
+    tiles = _frames_tiles_cache.get_or_build(
+        snapshot.generation, only_active,
+        lambda: PointTiles(snapshot.features, snapshot.lon, snapshot.lat, snapshot.index),
+    )
+    return snapshot.generation, tiles
+
+
+def _roads_tiles() -> Tuple[int, LineTiles]:
+    try:
+        version = os.stat(ROADS_GEOJSON_PATH).st_mtime_ns
+    except OSError:
+        abort(404, description="roads layer is not available")
+    tiles = _roads_tiles_cache.get_or_build(
+        version, "roads", lambda: LineTiles(list(iter_features(ROADS_GEOJSON_PATH))),
+    )
+    return version, tiles
+
+
+TILE_LAYERS = ("frames", "roads_ufo_hgv")
+
+# Готовые тайлы (LRU, свой кэш на слой): ключ (only_active, z, x, y) -> (body, etag)
+_tile_body_caches = {layer: LruGenerationCache(TILE_CACHE_SIZE) for layer in TILE_LAYERS}
+
+
+@app.route(f"{API_PREFIX}/tiles/<layer>/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def get_tile(layer: str, z: int, x: int, y: int):
+    """
+    GET /api/tiles/<layer>/<z>/<x>/<y>   (layer: frames | roads_ufo_hgv)
+    Тайл XYZ (Web Mercator) слоя в виде GeoJSON FeatureCollection:
+    рамки кластеризуются по сетке на мелких зумах, дороги обрезаются по тайлу.
+    Тайлы кэшируются (LRU) до смены поколения данных / файла слоя.
+    """
+    if layer not in TILE_LAYERS:
+        abort(404, description=f"unknown layer, expected one of: {', '.join(TILE_LAYERS)}")
+    try:
+        validate_tile(z, x, y)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    if layer == "frames":
+        only_active = request.args.get("only_active", "1") != "0"
+        version, tiles = _frames_tiles(only_active)
+    else:
+        only_active = False
+        version, tiles = _roads_tiles()
+
+    def build():
+        return _encode_json(tiles.tile(z, x, y)), f"{layer}-v{version}-a{int(only_active)}-{z}-{x}-{y}"
+
+    body, etag = _tile_body_caches[layer].get_or_build(version, (only_active, z, x, y), build)
+
+    return _cached_response(body, etag, "application/json")
+
+
+# ---------- API: маршрут для грузовика ----------
+
+# рамка относится к ребру графа, если стоит не дальше этого от отрезка дороги
+ROUTE_FRAME_ATTACH_M = 50.0
+# начало/конец маршрута — не дальше этого от сети дорог для грузовых
+ROUTE_SNAP_MAX_M = 5000.0
+
+# Граф — на версию файла слоя дорог; рамки на рёбрах — на (поколение, версия графа)
+_road_graph_cache = GenerationCache()
+_route_frames_cache = GenerationCache()
+
+
+class RouteFrames:
+    """Рамки снимка, привязанные к отрезкам графа, и ограничения самих дорог."""
+
+    def __init__(self, graph: RoadGraph, snapshot: FramesSnapshot):
+        snapped = graph.segments.snap(snapshot.lon, snapshot.lat)
+        attached = (snapped["segment"] >= 0) & (snapped["distance_m"] <= ROUTE_FRAME_ATTACH_M)
+        self.positions = np.flatnonzero(attached)
+        self.segments = snapped["segment"][self.positions]
+        self.road_limits = FrameLimits([{"properties": road} for road in graph.roads])
+
+
+def _road_graph() -> Tuple[int, RoadGraph]:
+    try:
+        version = os.stat(ROADS_GEOJSON_PATH).st_mtime_ns
+    except OSError:
+        abort(404, description="roads layer is not available")
+    return version, _road_graph_cache.get_or_build(version, "graph", load_road_graph)
+
+
+# граф поднимаем при старте процесса (артефакт отображается в память — это дёшево)
+if ROADS_GEOJSON_PATH.exists():
+    try:
+        _road_graph()
+    except (OSError, ValueError) as exc:
+        print(f"[app] граф дорог не загружен: {exc}")
+
+
+def _parse_point(value, name: str) -> Tuple[float, float]:
+    try:
+        lon, lat = (float(v) for v in value)
+    except (TypeError, ValueError):
+        abort(400, description=f"{name} must be [lon, lat]")
+    if not (np.isfinite(lon) and np.isfinite(lat) and -180 <= lon <= 180 and -90 <= lat <= 90):
+        abort(400, description=f"{name} must be [lon, lat]")
+    return lon, lat
+
+
+@app.route(f"{API_PREFIX}/route", methods=["POST"])
+def route():
+    """
+    POST /api/route
+    {"from": [lon, lat], "to": [lon, lat], "truck": {"weight": 40, "axle_load": 10}}
+
+    Кратчайший маршрут по сети дорог для грузовых, объезжающий рёбра с рамками
+    (и дороги), ограничения которых ТС нарушает (status violates). Рамки со статусом
+    warn не объезжаются, а перечисляются в ответе. Без truck — просто кратчайший путь.
+    404 — при таких ограничениях пути нет.
+    """
+    data = request.get_json(silent=True) or {}
+    start = _parse_point(data.get("from"), "from")
+    end = _parse_point(data.get("to"), "to")
+    try:
+        profile = parse_truck_profile(data.get("truck") or {})
+    except (TypeError, ValueError) as e:
+        abort(400, description=f"truck: {e}")
+
+    version, graph = _road_graph()
+    snapshot = _frames_snapshot(True)
+    frames = _route_frames_cache.get_or_build(
+        snapshot.generation, version, lambda: RouteFrames(graph, snapshot),
+    )
+
+    source, source_m, target, target_m = graph.endpoints(start, end)
+    if max(source_m, target_m) > ROUTE_SNAP_MAX_M:
+        abort(400, description=f"from/to must be within {ROUTE_SNAP_MAX_M:.0f} m of the HGV road network")
+
+    status, reasons = evaluate(snapshot.limits, frames.positions, [profile])
+    status, reasons = status[0], reasons[0]
+    road_status, _ = evaluate(frames.road_limits, np.arange(len(graph.roads)), [profile])
+    blocked = set(frames.segments[status == VIOLATES].tolist())
+    bad_roads = np.flatnonzero(road_status[0] == VIOLATES)
+    if bad_roads.size:
+        blocked.update(np.flatnonzero(np.isin(graph.seg_road, bad_roads)).tolist())
+
+    found = graph.route(source, target, blocked)
+    if found is None:
+        abort(404, description="No route for this truck profile")
+    nodes, segs, length = found
+
+    # дороги маршрута: подряд идущие отрезки одной дороги — одним куском
+    roads = []
+    seg_road = graph.seg_road[segs].tolist() if segs else []
+    seg_len = graph.seg_len[segs].tolist() if segs else []
+    for road, part in zip(seg_road, seg_len):
+        if roads and roads[-1]["_road"] == road:
+            roads[-1]["length_m"] += part
+            continue
+        info = graph.roads[road]
+        roads.append({"_road": road, "road_id": info["road_id"], "road_name": info["road_name"], "length_m": part})
+    for item in roads:
+        del item["_road"]
+        item["length_m"] = round(item["length_m"], 1)
+
+    on_route = np.flatnonzero(np.isin(frames.segments, segs))
+    order = {seg: i for i, seg in enumerate(segs)}
+    on_route = sorted(on_route.tolist(), key=lambda i: order[int(frames.segments[i])])
+    payload = {
+        "length_m": round(length, 1),
+        "geometry": {
+            "type": "LineString",
+            "coordinates": np.column_stack((graph.node_lon[nodes], graph.node_lat[nodes])).round(7).tolist(),
+        },
+        "snap": {"from_m": round(source_m, 1), "to_m": round(target_m, 1)},
+        "roads": roads,
+        "frames": [
+            {
+                "frame_id": snapshot.features[int(frames.positions[i])].get("id"),
+                "status": STATUS_NAMES[int(status[i])],
+                "reasons": reason_names(int(reasons[i])),
+            }
+            for i in on_route
+        ],
+        "avoided_frames": int((status == VIOLATES).sum()),
+        "blocked_segments": len(blocked),
+    }
+    return app.response_class(_encode_json(payload), mimetype="application/json")
 
 
 # ---------- API: предложения от водителей ----------
 
+SUGGESTION_NUMBER_FIELDS = (
+    "suggested_lon", "suggested_lat", "suggested_weight_limit_tons", "suggested_axle_load_tons",
+)
+SUGGESTION_TEXT_FIELDS = ("suggested_direction", "suggested_frame_state", "contact_phone", "contact_name")
+
+# сколько одиночный запрос ждёт, пока его пачку возьмут в запись; не дождался — 503 и строка снимается
+SUGGESTION_WAIT_S = 10.0
+SUGGESTION_BATCH_MAX = 500
+SUGGESTION_RETRY_AFTER_S = 5
+
+
+def _suggestion_row(data: dict, frame_id: Optional[str]) -> dict:
+    """
+    Проверка предложения и готовая строка frame_suggestions.
+    Всё проверяется здесь, до очереди: принятая строка не должна упасть при записи.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("suggestion must be an object")
+    comment = data.get("comment_driver")
+    if not comment or len(str(comment).strip()) < 3:
+        raise ValueError("comment_driver is required")
+
+    row = {
+        "frame_id": frame_id,
+        "type": "change_existing" if frame_id is not None else "new_frame",
+        "comment_driver": str(comment).strip(),
+        "status": "new",
+        # SQLite хранит время без зоны: наивное UTC, чтобы ответ 201 совпадал со списком и курсором
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+    for name in SUGGESTION_NUMBER_FIELDS:
+        value = data.get(name)
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number")
+            if not np.isfinite(value):
+                raise ValueError(f"{name} must be a number")
+        row[name] = value
+    for name in SUGGESTION_TEXT_FIELDS:
+        value = data.get(name)
+        row[name] = str(value) if value is not None else None
+
+    if frame_id is None and (row["suggested_lon"] is None or row["suggested_lat"] is None):
+        raise ValueError("suggested_lon and suggested_lat are required for new_frame")
+    return row
+
+
+def _frame_exists(frame_id: str) -> bool:
+    # по снимку слоя, а не запросом в БД: снимок уже в памяти у /api/frames
+    return frame_id in _frames_snapshot(False).position_by_id
+
+
+def _busy_response(message: str):
+    resp = jsonify({"error": message})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(SUGGESTION_RETRY_AFTER_S)
+    return resp
+
+
+def _submit_suggestions(rows: List[dict], track: bool = False) -> Ticket:
+    try:
+        return SUGGESTION_QUEUE.submit(rows, track)
+    except QueueFull as exc:
+        abort(_busy_response(str(exc)))
+
+
+def _ticket_response(ticket: Ticket):
+    resp = jsonify(ticket.to_dict())
+    resp.status_code = 202
+    resp.headers["Location"] = f"{API_PREFIX}/frames/suggest/batch/{ticket.id}"
+    return resp
+
+
+def _single_suggestion_response(row: dict):
+    """
+    Одиночное предложение идёт через ту же очередь (групповой commit) и ждёт своей пачки:
+    ответ всегда 201 с id записанной строки, как до очереди. Если пачку не взяли в запись
+    за SUGGESTION_WAIT_S, строка снимается из очереди и клиент получает 503 — повторить можно
+    без риска дубля. Уже пишущуюся пачку дожидаемся до конца.
+    """
+    ticket = _submit_suggestions([row])
+    if not ticket.wait(SUGGESTION_WAIT_S):
+        if SUGGESTION_QUEUE.cancel(ticket):
+            return _busy_response("suggestion queue is busy, try again later")
+        ticket.wait()
+    if ticket.status != STORED:
+        abort(500, description="suggestion was not stored")
+    return jsonify(_suggestion_to_dict(FrameSuggestion(id=ticket.suggestion_ids[0], **row))), 201
+
+
 @app.route(f"{API_PREFIX}/frames/<frame_id>/suggest", methods=["POST"])
 def suggest_for_existing_frame(frame_id: str):
     data = request.get_json(silent=True) or {}
-    comment = data.get("comment_driver")
-    if not comment or len(str(comment).strip()) < 3:
-        abort(400, description="comment_driver is required")
+    try:
+        row = _suggestion_row(data, frame_id)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    if not _frame_exists(frame_id):
+        abort(404, description="Frame not found")
+    return _single_suggestion_response(row)
+
+
+@app.route(f"{API_PREFIX}/frames/suggest", methods=["POST"])
+def suggest_new_frame():
+    data = request.get_json(silent=True) or {}
+    try:
+        row = _suggestion_row(data, None)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    return _single_suggestion_response(row)
+
+
+@app.route(f"{API_PREFIX}/frames/suggest/batch", methods=["POST"])
+def suggest_batch():
+    """
+    Пачка предложений: [{...}, ...] или {"suggestions": [...]}.
+    Элемент с frame_id — правка существующей рамки, без него — новая рамка.
+    Проверяется вся пачка сразу (ошибка в любом элементе — 400, ничего не принято),
+    ответ 202 с id тикета; состояние записи — GET по заголовку Location.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("suggestions") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        abort(400, description="suggestions must be a non-empty list")
+    if len(items) > SUGGESTION_BATCH_MAX:
+        abort(400, description=f"at most {SUGGESTION_BATCH_MAX} suggestions per request")
+
+    rows = []
+    for i, item in enumerate(items):
+        frame_id = item.get("frame_id") if isinstance(item, dict) else None
+        try:
+            rows.append(_suggestion_row(item, str(frame_id) if frame_id is not None else None))
+        except ValueError as exc:
+            abort(400, description=f"suggestions[{i}]: {exc}")
+
+    frame_ids = {row["frame_id"] for row in rows if row["frame_id"] is not None}
+    if frame_ids:
+        known = _frames_snapshot(False).position_by_id
+        for i, row in enumerate(rows):
+            if row["frame_id"] is not None and row["frame_id"] not in known:
+                abort(400, description=f"suggestions[{i}]: frame {row['frame_id']} not found")
+
+    return _ticket_response(_submit_suggestions(rows, track=True))
+
+
+@app.route(f"{API_PREFIX}/frames/suggest/batch/<ticket_id>", methods=["GET"])
+def suggest_batch_status(ticket_id: str):
+    # итог тикета лежит в suggestion_tickets: опрос может прийти в любой процесс API
+    state = SUGGESTION_QUEUE.lookup(ticket_id)
+    if state is None:
+        abort(404, description="Unknown ticket")
+    return jsonify(state)
+
+
+SUGGESTIONS_PAGE_DEFAULT = 50
+SUGGESTIONS_PAGE_MAX = 500
+
+
+def _encode_cursor(s: FrameSuggestion) -> str:
+    raw = f"{s.created_at.isoformat()}|{s.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(text: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)).decode("utf-8")
+        created_at, _, row_id = raw.rpartition("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+@app.route(f"{API_PREFIX}/frame_suggestions", methods=["GET"])
+def list_suggestions():
+    """
+    GET /api/frame_suggestions[?status=&type=&frame_id=&bbox=][&limit=N][&cursor=...]
+    Страница предложений от новых к старым (keyset по (created_at, id)):
+    курсор следующей страницы — в заголовке X-Next-Cursor (и Link rel="next"),
+    на последней странице его нет. Любая страница стоит как первая — без OFFSET.
+    bbox фильтрует по suggested_lon/lat (предложения без координат не попадают).
+
+    ?count=1 — только {"count": N} по тем же фильтрам (счётчики-бейджи).
+    """
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+        cursor = request.args.get("cursor")
+        after = _decode_cursor(cursor) if cursor else None
+        limit = int(request.args.get("limit", SUGGESTIONS_PAGE_DEFAULT))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    if not 1 <= limit <= SUGGESTIONS_PAGE_MAX:
+        abort(400, description=f"limit must be in [1, {SUGGESTIONS_PAGE_MAX}]")
+
+    filters = []
+    for name in ("status", "type", "frame_id"):
+        value = request.args.get(name)
+        if value:
+            filters.append(getattr(FrameSuggestion, name) == value)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        filters.append(FrameSuggestion.suggested_lon.between(min_lon, max_lon))
+        filters.append(FrameSuggestion.suggested_lat.between(min_lat, max_lat))
 
     db = SessionLocal()
     try:
-        raw = db.query(FrameRaw).filter(FrameRaw.frame_id == frame_id).first()
-        if not raw:
-            abort(404, description="Frame not found")
-
-        suggestion = FrameSuggestion(
-            frame_id=frame_id,
-            type="change_existing",
-            suggested_lon=data.get("suggested_lon"),
-            suggested_lat=data.get("suggested_lat"),
-            suggested_weight_limit_tons=data.get("suggested_weight_limit_tons"),
-            suggested_axle_load_tons=data.get("suggested_axle_load_tons"),
-            suggested_direction=data.get("suggested_direction"),
-            suggested_frame_state=data.get("suggested_frame_state"),
-            comment_driver=str(comment).strip(),
-            contact_phone=data.get("contact_phone"),
-            contact_name=data.get("contact_name"),
-            status="new",
-            created_at=datetime.now(timezone.utc),
-        )
-        db.add(suggestion)
-        db.commit()
-        db.refresh(suggestion)
-        return jsonify(_suggestion_to_dict(suggestion)), 201
+        if request.args.get("count") in ("1", "true"):
+            total = db.execute(select(func.count()).select_from(FrameSuggestion).where(*filters)).scalar()
+            return jsonify({"count": total})
+
+        q = select(FrameSuggestion).where(*filters)
+        if after is not None:
+            q = q.where(tuple_(FrameSuggestion.created_at, FrameSuggestion.id) < after)
+        q = q.order_by(FrameSuggestion.created_at.desc(), FrameSuggestion.id.desc()).limit(limit + 1)
+        items = db.execute(q).scalars().all()
+
+        resp = jsonify([_suggestion_to_dict(s) for s in items[:limit]])
+        if len(items) > limit:
+            next_cursor = _encode_cursor(items[limit - 1])
+            args = request.args.to_dict()
+            args["cursor"] = next_cursor
+            resp.headers["X-Next-Cursor"] = next_cursor
+            resp.headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+        return resp
     finally:
         db.close()
 
 
-@app.route(f"{API_PREFIX}/frames/suggest", methods=["POST"])
-def suggest_new_frame():
-    data = request.get_json(silent=True) or {}
-    comment = data.get("comment_driver")
-    if not comment or len(str(comment).strip()) < 3:
-        abort(400, description="comment_driver is required")
+# ---------- API: группы предложений новых рамок ----------
 
-    if data.get("suggested_lon") is None or data.get("suggested_lat") is None:
-        abort(400, description="suggested_lon and suggested_lat are required for new_frame")
+SUGGESTION_CLUSTERS_LIMIT_MAX = 500
+
+
+def _cluster_to_dict(c: SuggestionCluster, pending: int) -> dict:
+    return {
+        "id": c.id,
+        "lon": c.lon,
+        "lat": c.lat,
+        "size": c.size,
+        "pending": pending,
+        "frame_id": c.frame_id,
+        "frame_distance_m": c.frame_distance_m,
+        "first_created_at": c.first_created_at.isoformat() if c.first_created_at else None,
+        "last_created_at": c.last_created_at.isoformat() if c.last_created_at else None,
+    }
+
+
+@app.route(f"{API_PREFIX}/suggestion_clusters", methods=["GET"])
+def list_suggestion_clusters():
+    """
+    GET /api/suggestion_clusters[?bbox=...][&min_size=N][&limit=N]
+    Группы, в которых есть неразобранные (status=new) предложения, — сначала самые большие.
+    pending — сколько предложений группы ещё ждут модерации, size — всего в группе;
+    frame_id — ближайшая существующая рамка (возможно, это дубль).
+    """
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+        min_size = int(request.args.get("min_size", 1))
+        limit = int(request.args.get("limit", 100))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    if not 1 <= limit <= SUGGESTION_CLUSTERS_LIMIT_MAX:
+        abort(400, description=f"limit must be in [1, {SUGGESTION_CLUSTERS_LIMIT_MAX}]")
+
+    pending = func.count(FrameSuggestion.id).label("pending")
+    q = (
+        select(SuggestionCluster, pending)
+        .join(SuggestionClusterMember, SuggestionClusterMember.cluster_id == SuggestionCluster.id)
+        .join(FrameSuggestion, FrameSuggestion.id == SuggestionClusterMember.suggestion_id)
+        .where(FrameSuggestion.status == "new")
+        .group_by(SuggestionCluster.id)
+        .having(pending >= min_size)
+        .order_by(pending.desc(), SuggestionCluster.last_created_at.desc())
+        .limit(limit)
+    )
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        q = q.where(SuggestionCluster.lon.between(min_lon, max_lon), SuggestionCluster.lat.between(min_lat, max_lat))
 
     db = SessionLocal()
     try:
-        suggestion = FrameSuggestion(
-            frame_id=None,
-            type="new_frame",
-            suggested_lon=data.get("suggested_lon"),
-            suggested_lat=data.get("suggested_lat"),
-            suggested_weight_limit_tons=data.get("suggested_weight_limit_tons"),
-            suggested_axle_load_tons=data.get("suggested_axle_load_tons"),
-            suggested_direction=data.get("suggested_direction"),
-            suggested_frame_state=data.get("suggested_frame_state"),
-            comment_driver=str(comment).strip(),
-            contact_phone=data.get("contact_phone"),
-            contact_name=data.get("contact_name"),
-            status="new",
-            created_at=datetime.now(timezone.utc),
-        )
-        db.add(suggestion)
-        db.commit()
-        db.refresh(suggestion)
-        return jsonify(_suggestion_to_dict(suggestion)), 201
+        return jsonify([_cluster_to_dict(c, n) for c, n in db.execute(q).all()])
     finally:
         db.close()
 
 
-@app.route(f"{API_PREFIX}/frame_suggestions", methods=["GET"])
-def list_suggestions():
-    status = request.args.get("status")
+@app.route(f"{API_PREFIX}/suggestion_clusters/<int:cluster_id>", methods=["GET"])
+def get_suggestion_cluster(cluster_id: int):
+    """Группа и все её предложения (от новых к старым) — для разбора группы целиком."""
     db = SessionLocal()
     try:
-        q = db.query(FrameSuggestion)
-        if status:
-            q = q.filter(FrameSuggestion.status == status)
-        items = q.order_by(FrameSuggestion.created_at.desc()).all()
-        return jsonify([_suggestion_to_dict(s) for s in items])
+        cluster = db.get(SuggestionCluster, cluster_id)
+        if cluster is None:
+            abort(404, description="Cluster not found")
+        items = db.execute(
+            select(FrameSuggestion)
+            .join(SuggestionClusterMember, SuggestionClusterMember.suggestion_id == FrameSuggestion.id)
+            .where(SuggestionClusterMember.cluster_id == cluster_id)
+            .order_by(FrameSuggestion.created_at.desc(), FrameSuggestion.id.desc())
+        ).scalars().all()
+        pending = sum(1 for s in items if s.status == "new")
+        return jsonify({**_cluster_to_dict(cluster, pending), "suggestions": [_suggestion_to_dict(s) for s in items]})
     finally:
         db.close()
 
@@ -0,0 +1,259 @@
+# api/backend/bench_api.py
+"""
+Замеры горячих путей API и конвейера на синтетических данных (synth_data.py).
+
+Сценарии:
+  - merge           — merge_raw_and_manual по всем рамкам (строки уже в памяти);
+  - merged_refresh  — полный пересчёт frames_merged; manual_edit — правка одной рамки
+                      через ORM (пересчёт её строки frames_merged в той же транзакции);
+  - frames_cold     — GET /api/frames со сброшенными кэшами (запросы + разбор фич + склейка ответа);
+  - frames_after_edit — правка одной рамки и GET /api/frames (фичи из кэша фрагментов, кроме одной;
+                      больше одного промаха на запрос — кэш не удержал слой, бенч падает);
+  - frames_warm     — GET /api/frames из кэша поколения; frames_304 — If-None-Match;
+  - frames_<enc>_first — GET /api/frames с Accept-Encoding: br / gzip, сжатая копия сброшена
+                      (первый такой запрос после смены поколения); frames_<enc>_warm — из копии;
+  - frames_bbox     — GET /api/frames?bbox=... (окно ~50 км), frames_ndjson — потоком;
+  - suggestions_*   — GET /api/frame_suggestions: первая страница, фильтр, страница
+                      на глубине --deep-pages, count=1;
+  - import          — geojson_import.main на файле тех же рамок (потоковый upsert + подмена);
+  - parse_html_*    — parse_html каждым бэкендом на fixtures/nerudas (parse_page = загрузка +
+                      parse_html, сеть в замер не берём).
+
+Каждый сценарий: прогрев, затем --repeat прогонов, в отчёт — медиана и минимум.
+С --baseline сравнивает с прошлым отчётом минимумы (медиана сильнее зависит от
+соседей по машине): медленнее на --threshold и больше чем на --min-delta-ms —
+регрессия, код выхода 1.
+
+  python bench_api.py --frames 50000 --suggestions 200000 --json out/bench_api.json
+  python bench_api.py --baseline out/bench_api.json --threshold 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+FIXTURES_DIR = Path(__file__).with_name("fixtures") / "nerudas"
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    runs: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": round(statistics.median(runs), 3), "min_ms": round(min(runs), 3), "runs": len(runs)}
+
+
+def run_cases(args: argparse.Namespace, workdir: Path) -> Dict[str, Dict[str, float]]:
+    # db.py читает TT_DB_URL при импорте — модули проекта импортируем только после выбора базы
+    import app_flask
+    import compression
+    import fragments
+    import frames_merged
+    import geojson_import
+    import synth_data
+    from db import engine
+    from models import FrameManual, FrameRaw, FrameRoadMatch
+    from parser_nerudas import EXTRACTORS, parse_html
+
+    spec = synth_data.SynthSpec(
+        frames=args.frames, suggestions=args.suggestions, manual_ratio=args.manual_ratio,
+        time_windows=args.time_windows, tags=args.tags, spread=args.spread, seed=args.seed,
+    )
+    t0 = time.perf_counter()
+    counts = synth_data.populate(spec)
+    geojson_path = synth_data.write_geojson(workdir / "synth_frames.geojson", spec)
+    print(f"[bench] данные: {counts} за {time.perf_counter() - t0:.1f}с")
+
+    results: Dict[str, Dict[str, float]] = {}
+    repeat = args.repeat
+
+    def case(name: str, fn: Callable[[], object], n: Optional[int] = None, warmup: int = 1) -> None:
+        results[name] = measure(fn, n or repeat, warmup)
+        print(f"[bench] {name:24s} median={results[name]['median_ms']:9.2f}ms min={results[name]['min_ms']:9.2f}ms")
+
+    # --- склейка raw + manual ---
+    db = app_flask.SessionLocal()
+    try:
+        raws = db.query(FrameRaw).all()
+        manual = {m.frame_id: m for m in db.query(FrameManual).all()}
+        matches = {m.external_id: m for m in db.query(FrameRoadMatch).all()}
+    finally:
+        db.close()
+    merge = frames_merged.merge_raw_and_manual
+    case("merge", lambda: [merge(r, manual.get(r.frame_id), matches.get(r.external_id)) for r in raws])
+
+    def merged_refresh():
+        with engine.begin() as conn:
+            frames_merged.refresh(conn)
+
+    case("merged_refresh", merged_refresh)
+
+    def manual_edit():
+        db = app_flask.SessionLocal()
+        try:
+            m = db.get(FrameManual, 1)
+            m.weight_limit_tons_override = 30.0 if m.weight_limit_tons_override != 30.0 else 31.0
+            db.commit()
+        finally:
+            db.close()
+
+    case("manual_edit", manual_edit, n=repeat * 5)
+
+    # --- /api/frames ---
+    client = app_flask.app.test_client()
+
+    def frames_cold():
+        app_flask._frames_snapshot_cache.clear()
+        app_flask._frames_body_cache.clear()
+        fragments.CACHE.clear()
+        resp = client.get("/api/frames")
+        assert resp.status_code == 200, resp.status_code
+
+    case("frames_cold", frames_cold)
+
+    def frames_after_edit():
+        misses = fragments.CACHE.stats()["misses"]
+        manual_edit()
+        resp = client.get("/api/frames")
+        assert resp.status_code == 200, resp.status_code
+        misses = fragments.CACHE.stats()["misses"] - misses
+        assert misses <= 1, f"после правки одной рамки разобрано заново {misses} фич"
+
+    case("frames_after_edit", frames_after_edit)
+    print(f"[bench] кэш фрагментов: {fragments.CACHE.stats()}")
+    case("frames_warm", lambda: client.get("/api/frames").get_data())
+    etag = client.get("/api/frames").headers["ETag"]
+    case("frames_304", lambda: client.get("/api/frames", headers={"If-None-Match": etag}), n=repeat * 20)
+
+    # тестовый клиент сам Accept-Encoding не шлёт — без заголовка сжатие не измерить
+    for encoding in compression.available_encodings():
+        headers = {"Accept-Encoding": encoding}
+
+        def compressed_first(headers=headers, encoding=encoding):
+            app_flask._compressed_store.clear()
+            resp = client.get("/api/frames", headers=headers)
+            assert resp.headers.get("Content-Encoding") == encoding, resp.headers
+
+        case(f"frames_{encoding}_first", compressed_first)
+        case(f"frames_{encoding}_warm", lambda headers=headers: client.get("/api/frames", headers=headers).get_data(),
+             n=repeat * 5)
+    lon, lat = spec.bbox[0] + (spec.bbox[2] - spec.bbox[0]) / 2, spec.bbox[1] + (spec.bbox[3] - spec.bbox[1]) / 2
+    bbox = f"{lon - 0.4},{lat - 0.25},{lon + 0.4},{lat + 0.25}"
+    case("frames_bbox", lambda: client.get(f"/api/frames?bbox={bbox}").get_data(), n=repeat * 5)
+    case("frames_ndjson", lambda: client.get("/api/frames?format=ndjson").get_data())
+
+    # --- /api/frame_suggestions ---
+    url = "/api/frame_suggestions?limit=50"
+    case("suggestions_first_page", lambda: client.get(url).get_data(), n=repeat * 5)
+    case("suggestions_filtered", lambda: client.get(url + "&status=new&type=new_frame").get_data(), n=repeat * 5)
+    cursor = None
+    for _ in range(args.deep_pages):
+        next_cursor = client.get(url + (f"&cursor={cursor}" if cursor else "")).headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        cursor = next_cursor
+    deep = url + (f"&cursor={cursor}" if cursor else "")
+    case("suggestions_deep_page", lambda: client.get(deep).get_data(), n=repeat * 5)
+    case("suggestions_count", lambda: client.get("/api/frame_suggestions?count=1&status=new").get_data())
+
+    # --- импорт: тот же набор рамок, вывод импорта не печатаем ---
+    def run_import():
+        with contextlib.redirect_stdout(io.StringIO()):
+            geojson_import.main([str(geojson_path)])
+
+    case("import", run_import, n=max(1, repeat // 2), warmup=0)
+
+    # --- разбор страниц ---
+    pages = [(f"https://nerudas.ru/fixtures/{p.name}", p.read_text(encoding="utf-8"))
+             for p in sorted(FIXTURES_DIR.glob("*.html"))]
+    for name in EXTRACTORS:
+        case(f"parse_html_{name}", lambda name=name: [parse_html(html, u, name) for u, html in pages], n=repeat * 5)
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, min_delta_ms: float) -> List[dict]:
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = row["min_ms"] / base["min_ms"] if base["min_ms"] else float("inf")
+        if ratio > 1 + threshold and row["min_ms"] - base["min_ms"] > min_delta_ms:
+            regressions.append({"case": name, "baseline_ms": base["min_ms"], "min_ms": row["min_ms"],
+                                "ratio": round(ratio, 2)})
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Замеры API и конвейера на синтетических данных")
+    ap.add_argument("--frames", type=int, default=50000)
+    ap.add_argument("--suggestions", type=int, default=100000)
+    ap.add_argument("--manual-ratio", type=float, default=0.2)
+    ap.add_argument("--time-windows", type=int, default=2)
+    ap.add_argument("--tags", type=int, default=3)
+    ap.add_argument("--spread", choices=("uniform", "clusters"), default="clusters")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=5, help="прогонов каждого сценария (быстрые — кратно больше)")
+    ap.add_argument("--deep-pages", type=int, default=200, help="на какой странице мерить suggestions_deep_page")
+    ap.add_argument("--workdir", type=Path, default=None, help="где держать базу и GeoJSON (по умолчанию — временно)")
+    ap.add_argument("--json", type=Path, default=None, help="куда записать отчёт")
+    ap.add_argument("--baseline", type=Path, default=None, help="прошлый отчёт для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление (0.25 = 25%%)")
+    ap.add_argument("--min-delta-ms", type=float, default=1.0, help="разница меньше этой — шум, не регрессия")
+    return ap.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="tt-bench-") as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        db_path = workdir / "bench.db"
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        os.environ["TT_DB_URL"] = f"sqlite:///{db_path.as_posix()}"
+        results = run_cases(args, workdir)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "cases": results,
+        "regressions": [],
+    }
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("params", {}).get("frames") != args.frames:
+            print("[bench] внимание: отчёт-база снят на другом объёме данных", file=sys.stderr)
+        report["regressions"] = compare(results, baseline.get("cases", {}), args.threshold, args.min_delta_ms)
+        for r in report["regressions"]:
+            print(f"[bench] РЕГРЕССИЯ {r['case']}: {r['baseline_ms']}ms -> {r['min_ms']}ms (x{r['ratio']})")
+        if not report["regressions"]:
+            print(f"[bench] регрессий нет (порог +{args.threshold:.0%})")
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[bench] отчёт: {args.json}")
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
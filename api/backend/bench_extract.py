@@ -0,0 +1,110 @@
+# api/backend/bench_extract.py
+"""
+Бенчмарк бэкендов parse_html (bs4 vs stream) на сохранённых страницах.
+
+Источники страниц:
+  - fixtures/nerudas/*.html (по умолчанию);
+  - --archive out/archive — все страницы из архива краулера.
+
+Проверяет, что результаты бэкендов совпадают, и печатает время на страницу.
+Код выхода 1, если хоть одна страница разобрана по-разному.
+
+  python bench_extract.py
+  python bench_extract.py --archive out/archive --repeat 3 --json out/bench_extract.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from html_archive import HtmlArchive
+from parser_nerudas import EXTRACTORS, parse_html
+
+FIXTURES_DIR = Path(__file__).with_name("fixtures") / "nerudas"
+
+
+def load_pages(args: argparse.Namespace) -> List[Tuple[str, str]]:
+    """[(url или имя файла, html)]"""
+    pages = []
+    if args.archive:
+        archive = HtmlArchive(args.archive)
+        try:
+            for url, (digest, encoding) in sorted(archive.load_index().items()):
+                pages.append((url, archive.get(digest).decode(encoding or "utf-8", errors="replace")))
+        finally:
+            archive.close()
+    else:
+        for path in sorted(args.fixtures.glob("*.html")):
+            pages.append((f"https://nerudas.ru/fixtures/{path.name}", path.read_text(encoding="utf-8")))
+    return pages
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="bs4 vs stream: скорость и совпадение результатов parse_html")
+    ap.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    ap.add_argument("--archive", type=Path, default=None)
+    ap.add_argument("--repeat", type=int, default=5, help="прогонов каждой страницы каждым бэкендом")
+    ap.add_argument("--json", type=Path, default=None, help="куда записать результаты в JSON")
+    args = ap.parse_args(argv)
+
+    pages = load_pages(args)
+    if not pages:
+        print("[bench] нет страниц для замера", file=sys.stderr)
+        return 2
+
+    timings: Dict[str, List[float]] = {name: [] for name in EXTRACTORS}
+    mismatches = []
+
+    for url, html in pages:
+        results = {}
+        for name in EXTRACTORS:
+            best = float("inf")
+            for _ in range(max(1, args.repeat)):
+                t0 = time.perf_counter()
+                results[name] = parse_html(html, url, name)
+                best = min(best, time.perf_counter() - t0)
+            timings[name].append(best)
+
+        reference = results[EXTRACTORS[0]]
+        for name in EXTRACTORS[1:]:
+            if results[name] != reference:
+                mismatches.append({"page": url, "backend": name})
+
+    summary = {
+        "pages": len(pages),
+        "bytes": sum(len(html.encode("utf-8")) for _, html in pages),
+        "backends": {
+            name: {
+                "total_ms": round(sum(ts) * 1000, 3),
+                "median_page_ms": round(statistics.median(ts) * 1000, 3),
+            }
+            for name, ts in timings.items()
+        },
+        "mismatches": mismatches,
+    }
+    base_total = sum(timings[EXTRACTORS[0]])
+    for name, ts in timings.items():
+        summary["backends"][name]["speedup"] = round(base_total / sum(ts), 2) if sum(ts) else None
+
+    print(f"[bench] pages={summary['pages']} bytes={summary['bytes']}")
+    for name, row in summary["backends"].items():
+        print(f"[bench] {name:7s} total={row['total_ms']:.1f}ms median/page={row['median_page_ms']:.2f}ms "
+              f"speedup={row['speedup']}x")
+    for m in mismatches:
+        print(f"[bench] MISMATCH {m['backend']}: {m['page']}")
+    print(f"[bench] identical output: {'yes' if not mismatches else 'NO'}")
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# api/backend/build_layers.py
+"""
+Сборка облегчённых статических слоёв карты из map/data/*.geojson.
+
+Для каждого слоя пишет в map/data/build/:
+  <layer>.z8.geojson, <layer>.z11.geojson, <layer>.z14.geojson — линии упрощены
+      Дугласом–Пекером с допуском TOLERANCE_PX пикселя на этом зуме,
+      координаты округлены до точности, которой хватает на этом зуме;
+  <layer>.full.geojson — без упрощения, координаты до 6 знаков (~0.1 м);
+и рядом .gz / .br (brotli — если установлен пакет brotli). JSON без пробелов.
+Точечные слои (рамки) не упрощаются — только .full.
+
+  python build_layers.py                      # все слои по умолчанию
+  python build_layers.py --layers roads_ufo_hgv --report out/build_layers.json
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import PROJECT_ROOT
+from geojson_stream import iter_features
+from tiles import TILE_SIZE, lonlat_to_unit
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость
+    brotli = None
+
+SRC_DIR = PROJECT_ROOT / "map" / "data"
+OUT_DIR = SRC_DIR / "build"
+DEFAULT_LAYERS = ["roads_ufo_hgv", "frames_ready", "hgv_allowed", "hgv_conditional"]
+
+# уровни упрощения: имя -> зум (None — без упрощения)
+LEVELS: Dict[str, Optional[int]] = {"z8": 8, "z11": 11, "z14": 14, "full": None}
+FULL_DIGITS = 6
+TOLERANCE_PX = 1.0
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def level_params(zoom: Optional[int]) -> Tuple[float, int]:
+    """(допуск в единичных координатах Меркатора, знаков после запятой) для зума."""
+    if zoom is None:
+        return 0.0, FULL_DIGITS
+    tolerance = TOLERANCE_PX / (TILE_SIZE * (1 << zoom))
+    # шаг округления не больше четверти пикселя этого зума (в градусах долготы)
+    pixel_deg = 360.0 / (TILE_SIZE * (1 << zoom))
+    digits = min(FULL_DIGITS, max(0, math.ceil(-math.log10(pixel_deg / 4))))
+    return tolerance, digits
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Маска оставляемых вершин ломаной (итеративно, расстояния — векторно)."""
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        px, py = x[i + 1:j], y[i + 1:j]
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        seg2 = dx * dx + dy * dy
+        if seg2 > 0:
+            t = np.clip(((px - x[i]) * dx + (py - y[i]) * dy) / seg2, 0.0, 1.0)
+            dist = np.hypot(px - (x[i] + t * dx), py - (y[i] + t * dy))
+        else:  # замкнутое кольцо: концы совпадают
+            dist = np.hypot(px - x[i], py - y[i])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+def simplify_line(coords: list, tolerance: float, digits: int) -> list:
+    arr = np.asarray(coords, dtype=np.float64)[:, :2]
+    if tolerance > 0 and len(arr) > 2:
+        ux, uy = lonlat_to_unit(arr[:, 0], arr[:, 1])
+        arr = arr[douglas_peucker(ux, uy, tolerance)]
+    arr = np.round(arr, digits)
+    # после округления соседние вершины могут совпасть
+    if len(arr) > 2:
+        same = np.all(arr[1:] == arr[:-1], axis=1)
+        arr = np.concatenate((arr[:1], arr[1:][~same]))
+    if len(arr) < 2:
+        arr = np.round(np.asarray([coords[0], coords[-1]], dtype=np.float64)[:, :2], digits)
+    return arr.tolist()
+
+
+def simplify_geometry(geom: Dict[str, Any], tolerance: float, digits: int) -> Dict[str, Any]:
+    kind = geom.get("type")
+    coords = geom.get("coordinates")
+    if kind == "Point":
+        out = [round(c, digits) if c is not None else None for c in coords]
+    elif kind == "MultiPoint":
+        out = [[round(c, digits) for c in p] for p in coords]
+    elif kind == "LineString":
+        out = simplify_line(coords, tolerance, digits)
+    elif kind in ("MultiLineString", "Polygon"):
+        out = [simplify_line(line, tolerance, digits) for line in coords]
+    elif kind == "MultiPolygon":
+        out = [[simplify_line(ring, tolerance, digits) for ring in poly] for poly in coords]
+    else:
+        return geom
+    return {"type": kind, "coordinates": out}
+
+
+def count_vertices(geom: Dict[str, Any]) -> int:
+    def walk(c) -> int:
+        if not isinstance(c, list) or not c:
+            return 0
+        if not isinstance(c[0], list):
+            return 1  # одна позиция [lon, lat]
+        return sum(walk(x) for x in c)
+
+    return walk((geom or {}).get("coordinates"))
+
+
+def write_artifacts(path: Path, payload: bytes) -> Dict[str, int]:
+    """Пишет файл и сжатые копии рядом, возвращает размеры."""
+    path.write_bytes(payload)
+    sizes = {"raw": len(payload)}
+    gz = gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+    path.with_name(path.name + ".gz").write_bytes(gz)
+    sizes["gz"] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(payload, quality=BROTLI_QUALITY)
+        path.with_name(path.name + ".br").write_bytes(br)
+        sizes["br"] = len(br)
+    return sizes
+
+
+def build_layer(name: str, src_dir: Path, out_dir: Path) -> Dict[str, Any]:
+    src = src_dir / f"{name}.geojson"
+    features = list(iter_features(src))
+    has_lines = any((f.get("geometry") or {}).get("type") not in ("Point", "MultiPoint") for f in features)
+    levels = LEVELS if has_lines else {"full": None}
+
+    report: Dict[str, Any] = {
+        "source_bytes": src.stat().st_size,
+        "features": len(features),
+        "vertices": sum(count_vertices(f.get("geometry")) for f in features),
+        "levels": {},
+    }
+    for level, zoom in levels.items():
+        tolerance, digits = level_params(zoom)
+        out_features = [
+            {**f, "geometry": simplify_geometry(f["geometry"], tolerance, digits)} if f.get("geometry") else f
+            for f in features
+        ]
+        payload = json.dumps(
+            {"type": "FeatureCollection", "features": out_features}, ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+        sizes = write_artifacts(out_dir / f"{name}.{level}.geojson", payload)
+        report["levels"][level] = {
+            "digits": digits,
+            "vertices": sum(count_vertices(f.get("geometry")) for f in out_features),
+            **sizes,
+        }
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Упрощённые и сжатые копии статических слоёв карты")
+    ap.add_argument("--layers", nargs="+", default=DEFAULT_LAYERS)
+    ap.add_argument("--src", type=Path, default=SRC_DIR)
+    ap.add_argument("--out", type=Path, default=OUT_DIR)
+    ap.add_argument("--report", type=Path, default=None, help="куда записать отчёт в JSON")
+    args = ap.parse_args(argv)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    if brotli is None:
+        print("[build] brotli не установлен — .br не пишем", file=sys.stderr)
+
+    reports = {}
+    for name in args.layers:
+        rep = reports[name] = build_layer(name, args.src, args.out)
+        print(f"[build] {name}: {rep['features']} объектов, {rep['vertices']} вершин, {rep['source_bytes']} байт")
+        for level, row in rep["levels"].items():
+            compressed = " ".join(f"{k}={row[k]}" for k in ("gz", "br") if k in row)
+            print(f"[build]   {level:5s} вершин {row['vertices']:7d} ({row['vertices'] / max(rep['vertices'], 1):6.1%})"
+                  f"  байт {row['raw']:8d} ({row['raw'] / rep['source_bytes']:6.1%})  {compressed}")
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
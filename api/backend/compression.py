@@ -0,0 +1,190 @@
+# api/backend/compression.py
+"""
+Сжатие ответов API (Accept-Encoding: br / gzip).
+
+  - negotiate(): выбор кодировки по Accept-Encoding (с учётом q=);
+    br — только если установлен пакет brotli;
+  - CompressedStore: сжатые копии готовых ответов по ключу (ETag, кодировка).
+    ETag уже содержит поколение данных, поэтому ответ сжимается один раз
+    на поколение, а не на каждый запрос; параллельные запросы нового ETag
+    ждут одно сжатие, а не сжимают тело каждый сам;
+  - compress_stream(): потоковое сжатие генераторных ответов (ndjson);
+  - STATS: счётчики отданных/сэкономленных байт.
+
+Ответы меньше MIN_SIZE не сжимаем — заголовки и CPU дороже выигрыша.
+"""
+from __future__ import annotations
+
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость, без него только gzip
+    brotli = None
+
+MIN_SIZE = 1024
+STORE_MAX_ITEMS = 1024
+STORE_MAX_BYTES = 64 * 1024 * 1024  # на 50k рамок сжатый слой ~2.5 МБ, старые ETag не должны копиться
+
+# уровни: сохраняемые копии тоже сжимаются внутри запроса (первого после смены поколения),
+# поэтому не максимум: br 11 сжимает 1 МБ слоя ~2 с (на 50k рамок — минуты) ради ~11% размера,
+# br 6 — ~17 мс; gzip 9 на 50k рамок втрое дольше 6 ради ~10%
+STORED_LEVELS = {"br": 6, "gzip": 6}
+DYNAMIC_LEVELS = {"br": 5, "gzip": 6}
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/geo+json",
+    "application/x-ndjson",
+    "application/octet-stream",
+    "text/plain",
+}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Лучшая из поддерживаемых кодировок, которую принимает клиент (None — без сжатия)."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best = None
+    best_q = 0.0
+    for enc in available_encodings():  # порядок = наше предпочтение при равных q
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def compress(body: bytes, encoding: str, levels: Dict[str, int] = DYNAMIC_LEVELS) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=levels["br"])
+    return gzip.compress(body, compresslevel=levels["gzip"], mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Сжимает поток кусками; каждый кусок сбрасывается (flush), чтобы клиент получал данные сразу."""
+    if encoding == "br":
+        comp = brotli.Compressor(quality=DYNAMIC_LEVELS["br"])
+        for chunk in chunks:
+            out = comp.process(chunk) + comp.flush()
+            STATS.add_stream(encoding, len(chunk), len(out))
+            if out:
+                yield out
+        tail = comp.finish()
+    else:
+        comp = zlib.compressobj(DYNAMIC_LEVELS["gzip"], zlib.DEFLATED, 31)  # 31 — формат gzip
+        for chunk in chunks:
+            out = comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+            STATS.add_stream(encoding, len(chunk), len(out))
+            if out:
+                yield out
+        tail = comp.flush()
+    STATS.add_stream(encoding, 0, len(tail))
+    if tail:
+        yield tail
+
+
+class CompressedStore:
+    """
+    LRU сжатых тел: (etag, кодировка) -> bytes.
+    Каждый ключ сжимается один раз: первый запрос сжимает, остальные ждут его
+    на блокировке этого ключа (другие ключи при этом не ждут).
+    """
+
+    def __init__(self, maxsize: int = STORE_MAX_ITEMS, max_bytes: int = STORE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._pending: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: str, encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+            pending = self._pending.setdefault(key, threading.Lock())
+
+        with pending:
+            with self._lock:
+                data = self._items.get(key)
+            if data is not None:
+                return data
+            try:
+                data = compress(body, encoding, STORED_LEVELS)
+                with self._lock:
+                    old = self._items.pop(key, None)
+                    self._items[key] = data
+                    self._bytes += len(data) - (len(old) if old is not None else 0)
+                    while len(self._items) > self.maxsize or (self._bytes > self.max_bytes and len(self._items) > 1):
+                        self._bytes -= len(self._items.popitem(last=False)[1])
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class CompressionStats:
+    """Счётчики по кодировкам: ответов, байт до/после сжатия."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses: Dict[str, int] = {}
+        self.bytes_in: Dict[str, int] = {}
+        self.bytes_out: Dict[str, int] = {}
+
+    def add(self, encoding: str, size_in: int, size_out: int) -> None:
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+            self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + size_in
+            self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + size_out
+
+    def add_stream(self, encoding: str, size_in: int, size_out: int) -> None:
+        """Как add, но без счётчика ответов (поток учитывается по кускам)."""
+        with self._lock:
+            self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + size_in
+            self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + size_out
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            encodings = set(self.responses) | set(self.bytes_in)
+            return {
+                enc: {
+                    "responses": self.responses.get(enc, 0),
+                    "bytes_in": self.bytes_in.get(enc, 0),
+                    "bytes_out": self.bytes_out.get(enc, 0),
+                    "bytes_saved": self.bytes_in.get(enc, 0) - self.bytes_out.get(enc, 0),
+                }
+                for enc in sorted(encodings)
+            }
+
+
+STATS = CompressionStats()
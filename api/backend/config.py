@@ -1,4 +1,5 @@
 # api/backend/config.py
+import os
 from pathlib import Path
 
 # Папка backend/ (…/trans-time.ru/api/backend)
@@ -15,9 +16,22 @@ SQLALCHEMY_DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
 # У тебя он: trans-time.ru/map/data/frames_ready.geojson
 FRAMES_GEOJSON_PATH = PROJECT_ROOT / "map" / "data" / "frames_ready.geojson"
 
+# Слой дорог для грузовых (для /api/tiles/roads_ufo_hgv/...)
+ROADS_GEOJSON_PATH = PROJECT_ROOT / "map" / "data" / "roads_ufo_hgv.geojson"
+
+# Граф дорог для /api/route (собирает road_graph.py, в git не хранится)
+ROADS_GRAPH_PATH = BASE_DIR / "roads_graph.bin"
+
+# Группировка предложений новых рамок (suggestion_clusters.py):
+# предложения ближе радиуса к центру группы попадают в неё,
+# группа сопоставляется с рамкой frames_raw не дальше радиуса сопоставления
+SUGGESTION_CLUSTER_RADIUS_M = float(os.getenv("TT_SUGGESTION_CLUSTER_RADIUS_M", "150"))
+SUGGESTION_MATCH_RADIUS_M = float(os.getenv("TT_SUGGESTION_MATCH_RADIUS_M", "300"))
+
 
 def debug_print_paths():
     print("[config] BASE_DIR        =", BASE_DIR)
     print("[config] PROJECT_ROOT    =", PROJECT_ROOT)
     print("[config] SQLITE_PATH     =", SQLITE_PATH)
     print("[config] FRAMES_GEOJSON  =", FRAMES_GEOJSON_PATH)
+    print("[config] ROADS_GEOJSON   =", ROADS_GEOJSON_PATH)
@@ -0,0 +1,146 @@
+# api/backend/corridor.py
+"""
+Рамки в коридоре маршрута: честное расстояние от точки до ломаной.
+
+Схема:
+  1) грубый отбор кандидатов по bbox маршрута (+буфер) через GridIndex;
+  2) маршрут режем на блоки и куски (CHUNKS_PER_BLOCK кусков по SEGMENTS_PER_CHUNK отрезков),
+     у каждого свой bbox — пары (рамка, кусок) отбираются векторно в два уровня;
+  3) для пар считаем расстояние до каждого отрезка куска (NumPy, без циклов по точкам),
+     берём минимум по рамке и положение проекции вдоль маршрута.
+
+Отрезки считаются в локальной равнопромежуточной проекции: долгота масштабируется
+косинусом средней широты каждого отрезка, так что длинные маршруты не искажаются.
+"""
+from __future__ import annotations
+
+import math
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from spatial_index import GridIndex
+
+# метров в одном градусе широты (средний радиус Земли 6371008.8 м)
+M_PER_DEG = 6371008.8 * math.pi / 180.0
+
+SEGMENTS_PER_CHUNK = 16
+CHUNKS_PER_BLOCK = 8
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """[s0, s0+1, ..., s0+c0-1, s1, ...] без цикла на Python."""
+    total = int(counts.sum())
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+def match_route(index: GridIndex, lon: np.ndarray, lat: np.ndarray,
+                route: Sequence[Sequence[float]], buffer_m: float
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Точки (lon[i], lat[i]) не дальше buffer_m от ломаной route ([[lon, lat], ...]).
+
+    Возвращает (positions, distance_m, along_m), отсортированные по положению вдоль маршрута:
+      positions  — номера точек во входных массивах;
+      distance_m — расстояние до ближайшего отрезка;
+      along_m    — расстояние от начала маршрута до проекции точки.
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+    pts = np.asarray(route, dtype=np.float64).reshape(-1, 2)
+    pts = pts[np.isfinite(pts).all(axis=1)]
+    if len(pts) == 0:
+        return empty
+    if len(pts) == 1:
+        pts = np.vstack([pts, pts])
+
+    ax, ay = pts[:-1, 0], pts[:-1, 1]
+    bx, by = pts[1:, 0], pts[1:, 1]
+    kx = np.cos(np.radians((ay + by) / 2.0)) * M_PER_DEG
+    sx = (bx - ax) * kx
+    sy = (by - ay) * M_PER_DEG
+    seg_len2 = sx * sx + sy * sy
+    seg_len = np.sqrt(seg_len2)
+    seg_start = np.concatenate([[0.0], np.cumsum(seg_len)[:-1]])
+
+    pad_lat = buffer_m / M_PER_DEG
+    max_abs_lat = min(float(np.abs(pts[:, 1]).max()) + pad_lat, 89.0)
+    pad_lon = buffer_m / (M_PER_DEG * math.cos(math.radians(max_abs_lat)))
+
+    # 1) кандидаты по общему bbox
+    cand = index.query_bbox(
+        float(pts[:, 0].min()) - pad_lon, float(pts[:, 1].min()) - pad_lat,
+        float(pts[:, 0].max()) + pad_lon, float(pts[:, 1].max()) + pad_lat,
+    )
+    if cand.size == 0:
+        return empty
+    cx = lon[cand]
+    cy = lat[cand]
+
+    # 2) пары (кандидат, кусок маршрута): сначала крупные куски, потом мелкие внутри них
+    n_seg = len(ax)
+    seg_min_lon, seg_max_lon = np.minimum(ax, bx) - pad_lon, np.maximum(ax, bx) + pad_lon
+    seg_min_lat, seg_max_lat = np.minimum(ay, by) - pad_lat, np.maximum(ay, by) + pad_lat
+
+    def chunk_boxes(size):
+        starts = np.arange(0, n_seg, size)
+        return (
+            starts,
+            np.diff(np.append(starts, n_seg)),
+            np.minimum.reduceat(seg_min_lon, starts), np.maximum.reduceat(seg_max_lon, starts),
+            np.minimum.reduceat(seg_min_lat, starts), np.maximum.reduceat(seg_max_lat, starts),
+        )
+
+    big = chunk_boxes(SEGMENTS_PER_CHUNK * CHUNKS_PER_BLOCK)
+    hit = (
+        (cx[:, None] >= big[2]) & (cx[:, None] <= big[3])
+        & (cy[:, None] >= big[4]) & (cy[:, None] <= big[5])
+    )
+    pair_c, pair_b = np.nonzero(hit)  # по строкам -> pair_c не убывает
+
+    small = chunk_boxes(SEGMENTS_PER_CHUNK)
+    sub_counts = np.ceil(big[1][pair_b] / SEGMENTS_PER_CHUNK).astype(np.int64)
+    pair_c = np.repeat(pair_c, sub_counts)
+    pair_k = _expand_ranges(pair_b * CHUNKS_PER_BLOCK, sub_counts)
+    px, py = cx[pair_c], cy[pair_c]
+    inside = (
+        (px >= small[2][pair_k]) & (px <= small[3][pair_k])
+        & (py >= small[4][pair_k]) & (py <= small[5][pair_k])
+    )
+    pair_c, pair_k = pair_c[inside], pair_k[inside]
+    if pair_c.size == 0:
+        return empty
+    chunk_starts, chunk_lens = small[0], small[1]
+
+    # 3) разворачиваем пары в (кандидат, отрезок)
+    counts = chunk_lens[pair_k]
+    total = int(counts.sum())
+    owner = np.repeat(pair_c, counts)
+    seg = _expand_ranges(chunk_starts[pair_k], counts)
+
+    k = kx[seg]
+    dx = (cx[owner] - ax[seg]) * k
+    dy = (cy[owner] - ay[seg]) * M_PER_DEG
+    l2 = seg_len2[seg]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(l2 > 0, (dx * sx[seg] + dy * sy[seg]) / l2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    dist = np.hypot(dx - t * sx[seg], dy - t * sy[seg])
+
+    # минимум по каждому кандидату; при равенстве — первый отрезок вдоль маршрута
+    group_starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    group_owner = owner[group_starts]
+    best = np.minimum.reduceat(dist, group_starts)
+    is_best = dist == np.repeat(best, np.diff(np.append(group_starts, total)))
+    best_pos = np.flatnonzero(is_best)
+    _, first = np.unique(owner[best_pos], return_index=True)
+    best_pos = best_pos[first]
+
+    keep = best <= buffer_m
+    best_pos = best_pos[keep]
+    positions = cand[group_owner[keep]]
+    distance = best[keep]
+    along = seg_start[seg[best_pos]] + t[best_pos] * seg_len[seg[best_pos]]
+
+    order = np.argsort(along, kind="stable")
+    return positions[order], distance[order], along[order]
@@ -0,0 +1,106 @@
+# api/backend/crawl_state.py
+"""
+Состояние краулера nerudas по каждой ссылке (out/page_state.sqlite):
+ETag, Last-Modified, хэш содержимого и последний результат parse_html.
+
+Нужно для инкрементального обхода: повторный запуск шлёт условный GET
+и переиспользует прошлый разбор, если страница не изменилась.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class PageState:
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    parsed: Optional[Dict[str, Any]] = None
+    fetched_at: Optional[str] = None
+    changed_at: Optional[str] = None
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+class PageStateStore:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_state (
+                url           TEXT PRIMARY KEY,
+                etag          TEXT,
+                last_modified TEXT,
+                content_hash  TEXT,
+                parsed_json   TEXT,
+                fetched_at    TEXT,
+                changed_at    TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+    def load_all(self) -> Dict[str, PageState]:
+        rows = self.conn.execute(
+            "SELECT url, etag, last_modified, content_hash, parsed_json, fetched_at, changed_at FROM page_state"
+        )
+        states = {}
+        for url, etag, last_modified, content_hash, parsed_json, fetched_at, changed_at in rows:
+            states[url] = PageState(
+                url=url,
+                etag=etag,
+                last_modified=last_modified,
+                content_hash=content_hash,
+                parsed=json.loads(parsed_json) if parsed_json else None,
+                fetched_at=fetched_at,
+                changed_at=changed_at,
+            )
+        return states
+
+    def save(self, state: PageState) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO page_state (url, etag, last_modified, content_hash, parsed_json, fetched_at, changed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                parsed_json = excluded.parsed_json,
+                fetched_at = excluded.fetched_at,
+                changed_at = excluded.changed_at
+            """,
+            (
+                state.url,
+                state.etag,
+                state.last_modified,
+                state.content_hash,
+                json.dumps(state.parsed, ensure_ascii=False) if state.parsed is not None else None,
+                state.fetched_at,
+                state.changed_at,
+            ),
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self) -> "PageStateStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,11 +1,29 @@
 # api/backend/db.py
+"""
+Подключение к базе: отдельные движки на чтение и на запись.
+
+  - engine (писатель): одно соединение на процесс — записи процесса идут по очереди,
+    а не толкаются за блокировку SQLite; WAL + synchronous=NORMAL (в WAL это надёжно
+    при сбое процесса, fsync только на checkpoint);
+  - read_engine (читатели): пул соединений только на чтение (mode=ro + query_only),
+    с mmap и увеличенным кэшем страниц; в WAL читатели не ждут писателя.
+
+SessionLocal сама выбирает движок: внутри use_reader(True) (API ставит его для
+GET-запросов, см. app_flask.py) — читатель, иначе писатель. Скрипты (импорт,
+фоновые потоки) ничего не ставят и работают через писателя, как раньше.
+
+pragma_report() — фактические настройки соединений (печатается при старте API).
+"""
 from __future__ import annotations
 
+import contextvars
 import os
 from pathlib import Path
+from typing import Dict
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 # SQLite файл рядом с кодом backend
 BASE_DIR = Path(__file__).resolve().parent
@@ -14,13 +32,96 @@ DB_PATH = BASE_DIR / "frames.db"
 # Можно переопределить через переменную окружения (удобно для CI)
 DB_URL = os.getenv("TT_DB_URL", f"sqlite:///{DB_PATH.as_posix()}")
 
+# сколько ждать блокировку записи, прежде чем отдать "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# читатели: отображение файла в память и кэш страниц на соединение (KiB, отрицательное число)
+READ_POOL_SIZE = 8
+READ_MMAP_BYTES = 256 * 1024 * 1024
+READ_CACHE_KIB = 32 * 1024
+
+REPORTED_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store",
+                    "query_only")
+
+_url = make_url(DB_URL)
+IS_SQLITE = _url.get_backend_name() == "sqlite"
+_sqlite_file = IS_SQLITE and _url.database not in (None, "", ":memory:") and not _url.database.startswith("file:")
+
 # check_same_thread=False нужно для SQLite в веб-приложениях, в CI тоже ок
 engine = create_engine(
     DB_URL,
-    connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    # один писатель на процесс: остальные ждут соединение из пула, а не блокировку базы
+    **({"pool_size": 1, "max_overflow": 0, "pool_timeout": 30} if _sqlite_file else {}),
     future=True,
 )
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+if _sqlite_file:
+    read_engine = create_engine(
+        _url.set(database=f"file:{Path(_url.database).as_posix()}", query={"mode": "ro", "uri": "true"}),
+        connect_args={"check_same_thread": False},
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_SIZE,
+        future=True,
+    )
+else:
+    # :memory:, другие СУБД — читаем через тот же движок
+    read_engine = engine
+
+
+if IS_SQLITE:
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL: читатели (Flask) не блокируются писателем (импорт) и видят последний commit
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.close()
+
+
+if read_engine is not engine:
+
+    @event.listens_for(read_engine, "connect")
+    def _sqlite_read_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={READ_MMAP_BYTES}")
+        cur.execute(f"PRAGMA cache_size=-{READ_CACHE_KIB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA query_only=ON")
+        cur.close()
+
+
+_use_reader: contextvars.ContextVar[bool] = contextvars.ContextVar("tt_db_use_reader", default=False)
+
+
+def use_reader(flag: bool) -> contextvars.Token:
+    """Сессии текущего контекста читают через read_engine (True) или пишут через engine."""
+    return _use_reader.set(flag)
+
+
+def reset_reader(token: contextvars.Token) -> None:
+    _use_reader.reset(token)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        return read_engine if _use_reader.get() else engine
+
+
+def pragma_report() -> Dict[str, Dict[str, str]]:
+    """Фактические PRAGMA соединений писателя и читателя."""
+    if not IS_SQLITE:
+        return {}
+    report = {}
+    for name, eng in (("write", engine), ("read", read_engine)):
+        with eng.connect() as conn:
+            report[name] = {p: str(conn.exec_driver_sql(f"PRAGMA {p}").scalar()) for p in REPORTED_PRAGMAS}
+    return report
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autoflush=False, autocommit=False, future=True)
 
 Base = declarative_base()
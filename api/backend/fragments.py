@@ -0,0 +1,182 @@
+# api/backend/fragments.py
+"""
+Фичи слоя рамок как готовые куски JSON (фрагменты) и кэш этих кусков в процессе.
+
+  - dumps() / loads(): orjson, если установлен, иначе стандартный json.
+    Вывод dumps совпадает с json.dumps(..., ensure_ascii=False, separators=(",", ":"))
+    для всего, что бывает в фичах (строки, числа без экспоненты, списки, dict);
+    то, что orjson не умеет (int длиннее 64 бит и т.п.), уходит в стандартный json;
+  - FragmentCache: строка frames_merged (source, source_id) -> (version, байты фичи, dict фичи).
+    Версия строки меняется при каждом изменении её feature (frames_merged.apply_refresh),
+    так что после правки одной рамки новый снимок слоя разбирает одну фичу,
+    а остальные берёт из кэша — и dict, и байты для склейки ответа;
+  - collection_body(): FeatureCollection склейкой готовых фрагментов, без кодирования.
+
+Кэш двухуровневый:
+  - живые фрагменты — те, что держит последний снимок каждого слоя (publish()).
+    Они в памяти и так, пока жив снимок, поэтому лимитом не считаются и не вытесняются:
+    следующий снимок того же слоя берёт их целиком, сколько бы рамок ни было;
+  - LRU с ограничением по памяти (TT_FRAGMENT_CACHE_MB) — фрагменты, которые выпали
+    из нового снимка (рамку убрали из слоя, строку удалили), на случай их возврата.
+    Только эту память кэш добавляет к снимкам; разобранный dict в памяти в несколько раз
+    больше своего JSON — это учитывается в размере записи.
+У каждого процесса Passenger свой кэш. TT_FRAGMENT_CACHE_MB=0 выключает оба уровня.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson — необязательная зависимость, без него стандартный json
+    orjson = None
+
+CACHE_MAX_BYTES = int(float(os.getenv("TT_FRAGMENT_CACHE_MB", "256")) * 1024 * 1024)
+
+# dict фичи (со строками, списками, float) ~ в 5 раз больше её компактного JSON
+DECODED_SIZE_FACTOR = 5
+
+COLLECTION_HEAD = b'{"type":"FeatureCollection","features":['
+COLLECTION_TAIL = b"]}"
+
+# (version, байты фичи, dict фичи)
+Fragment = Tuple[int, bytes, dict]
+
+
+def encoder_name() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def collection_body(fragments: Iterable[bytes]) -> bytes:
+    """Байты {"type":"FeatureCollection","features":[...]} из готовых фрагментов фич."""
+    return COLLECTION_HEAD + b",".join(fragments) + COLLECTION_TAIL
+
+
+class FragmentCache:
+    """
+    Фрагменты фич: ключ строки -> (version, байты, dict).
+    Живые — из последних снимков слоёв (без лимита), вытесненные из снимков — LRU по байтам.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # слой снимка (only_active) -> {ключ: фрагмент} последнего опубликованного снимка
+        self._live: Dict[Hashable, Dict[Hashable, Fragment]] = {}
+        self._items: "OrderedDict[Hashable, Fragment]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _cost(fragment: Fragment) -> int:
+        return len(fragment[1]) * (1 + DECODED_SIZE_FACTOR)
+
+    def lookup(self, keys: Sequence[Tuple[Hashable, int]]) -> List[Optional[Fragment]]:
+        """Фрагменты для пар (ключ, версия); None — нет в кэше или версия другая."""
+        if self.max_bytes <= 0:
+            with self._lock:
+                self.misses += len(keys)
+            return [None] * len(keys)
+        found: List[Optional[Fragment]] = []
+        hits = 0
+        with self._lock:
+            live = list(self._live.values())
+            items = self._items
+            for key, version in keys:
+                for layer in live:
+                    fragment = layer.get(key)
+                    if fragment is not None and fragment[0] == version:
+                        break
+                else:
+                    # из LRU фрагмент уходит в новый снимок: место в лимите ему больше не нужно
+                    fragment = items.get(key)
+                    if fragment is not None and fragment[0] == version:
+                        del items[key]
+                        self._bytes -= self._cost(fragment)
+                    else:
+                        fragment = None
+                if fragment is not None:
+                    hits += 1
+                found.append(fragment)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    @staticmethod
+    def parse(version: int, text: str) -> Fragment:
+        """Фрагмент из JSON фичи (feature из frames_merged)."""
+        data = text.encode("utf-8")
+        return version, data, loads(data)
+
+    def publish(self, layer: Hashable, keys: Sequence[Hashable], fragments: Sequence[Fragment]) -> None:
+        """
+        Фрагменты нового снимка слоя становятся живыми. Строки прошлого снимка этого слоя,
+        которых нет ни в одном живом снимке, переходят в LRU (там они и считаются в лимите);
+        прежние версии изменённых строк не нужны никому и просто отпускаются.
+        """
+        if self.max_bytes <= 0:
+            return
+        fresh = dict(zip(keys, fragments))
+        with self._lock:
+            old = self._live.get(layer)
+            self._live[layer] = fresh
+            if not old:
+                return
+            others = [items for name, items in self._live.items() if name != layer]
+            for key, fragment in old.items():
+                if key in fresh or any(key in items for items in others):
+                    continue
+                self._remember(key, fragment)
+
+    def _remember(self, key: Hashable, fragment: Fragment) -> None:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= self._cost(old)
+        self._items[key] = fragment
+        self._bytes += self._cost(fragment)
+        while self._bytes > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= self._cost(evicted)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "live_items": sum(len(layer) for layer in self._live.values()),
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._live.clear()
+            self._items.clear()
+            self._bytes = 0
+
+
+CACHE = FragmentCache()
@@ -0,0 +1,167 @@
+# api/backend/frames_binary.py
+"""
+Колоночный бинарный формат слоя рамок (/api/frames?format=bin).
+
+Раскладка (little-endian, все буферы выровнены на 8 байт):
+
+  "TTFB"                      4 байта — сигнатура
+  u32 header_len              длина JSON-заголовка
+  header (utf-8 JSON)         дополнен пробелами до кратности 8
+  буферы колонок              смещения — от начала файла
+
+Заголовок:
+  {"version": 1, "count": N, "columns": [
+     {"name": "lon", "type": "float64", "length": N, "offset": ..., "bytes": ...},
+     {"name": "road_name", "type": "dict", "length": N,
+      "codes": {offset, bytes}, "dict_offsets": {offset, bytes, length}, "dict_data": {offset, bytes}},
+     ...]}
+
+Типы колонок:
+  float64 — числа (null = NaN); lon/lat — координаты точки;
+  bool    — uint8: 0/1, null = 255;
+  dict    — строки со словарём: codes — int32 на строку (null = -1),
+            dict_offsets — uint32[K+1] границ в dict_data (utf-8).
+            Списки/объекты (tags, time_windows) кладутся как JSON-текст.
+
+Клиент читает колонки без копирования: Float64Array(buf, offset, length) и т.п.
+Колонки id и properties.* называются как в GeoJSON (id — "id").
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+MAGIC = b"TTFB"
+VERSION = 1
+ALIGN = 8
+
+NULL_CODE = -1
+BOOL_NULL = 255
+
+
+def _column_type(values: List[Any]) -> str:
+    kinds = {type(v) for v in values if v is not None}
+    if kinds and kinds <= {bool}:
+        return "bool"
+    if kinds and kinds <= {int, float}:
+        return "float64"
+    return "dict"
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> Dict[str, int]:
+        """Кладёт буфер (с выравниванием), возвращает его смещение от начала области буферов."""
+        pad = (-self.size) % ALIGN
+        if pad:
+            self.parts.append(b"\0" * pad)
+            self.size += pad
+        offset = self.size
+        self.parts.append(data)
+        self.size += len(data)
+        return {"offset": offset, "bytes": len(data)}
+
+
+def encode(features: List[dict]) -> bytes:
+    n = len(features)
+    writer = _Writer()
+    columns: List[Dict[str, Any]] = []
+
+    coords = [(f.get("geometry") or {}).get("coordinates") or [None, None] for f in features]
+    for name, axis in (("lon", 0), ("lat", 1)):
+        arr = np.array([c[axis] if c[axis] is not None else np.nan for c in coords], dtype="<f8")
+        columns.append({"name": name, "type": "float64", "length": n, **writer.add(arr.tobytes())})
+
+    keys: Dict[str, None] = {}
+    for f in features:
+        keys.update(dict.fromkeys(f.get("properties") or {}))
+
+    table: List[Tuple[str, List[Any]]] = [("id", [f.get("id") for f in features])]
+    table += [(key, [(f.get("properties") or {}).get(key) for f in features]) for key in keys]
+
+    for name, values in table:
+        kind = _column_type(values)
+        if kind == "float64":
+            arr = np.array([np.nan if v is None else v for v in values], dtype="<f8")
+            columns.append({"name": name, "type": kind, "length": n, **writer.add(arr.tobytes())})
+        elif kind == "bool":
+            arr = np.array([BOOL_NULL if v is None else int(v) for v in values], dtype=np.uint8)
+            columns.append({"name": name, "type": kind, "length": n, **writer.add(arr.tobytes())})
+        else:
+            index: Dict[str, int] = {}
+            codes = np.array(
+                [NULL_CODE if v is None else index.setdefault(_as_text(v), len(index)) for v in values],
+                dtype="<i4",
+            )
+            blobs = [s.encode("utf-8") for s in index]
+            offsets = np.zeros(len(blobs) + 1, dtype="<u4")
+            np.cumsum([len(b) for b in blobs], out=offsets[1:])
+            columns.append({
+                "name": name,
+                "type": "dict",
+                "length": n,
+                "codes": writer.add(codes.tobytes()),
+                "dict_offsets": {**writer.add(offsets.tobytes()), "length": len(blobs) + 1},
+                "dict_data": writer.add(b"".join(blobs)),
+            })
+
+    # смещения буферов считаем от начала файла: длина заголовка зависит от самих смещений,
+    # поэтому подбираем её, пока не сойдётся (обычно с первой-второй попытки)
+    base = 0
+    while True:
+        header = {"version": VERSION, "count": n, "columns": _shift(columns, base)}
+        raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        raw += b" " * ((-(8 + len(raw))) % ALIGN)
+        if 8 + len(raw) == base:
+            break
+        base = 8 + len(raw)
+
+    return MAGIC + struct.pack("<I", len(raw)) + raw + b"".join(writer.parts)
+
+
+def _shift(columns: List[Dict[str, Any]], base: int) -> List[Dict[str, Any]]:
+    out = []
+    for col in columns:
+        col = dict(col)
+        if "offset" in col:
+            col["offset"] += base
+        for key in ("codes", "dict_offsets", "dict_data"):
+            if key in col:
+                col[key] = {**col[key], "offset": col[key]["offset"] + base}
+        out.append(col)
+    return out
+
+
+def decode(buf: bytes) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Обратное преобразование (для проверок и Python-клиентов): (header, {колонка: значения})."""
+    if buf[:4] != MAGIC:
+        raise ValueError("not a TTFB buffer")
+    (header_len,) = struct.unpack_from("<I", buf, 4)
+    header = json.loads(buf[8:8 + header_len].decode("utf-8"))
+    n = header["count"]
+    out: Dict[str, Any] = {}
+    for col in header["columns"]:
+        if col["type"] == "float64":
+            out[col["name"]] = np.frombuffer(buf, dtype="<f8", count=n, offset=col["offset"])
+        elif col["type"] == "bool":
+            out[col["name"]] = np.frombuffer(buf, dtype=np.uint8, count=n, offset=col["offset"])
+        else:
+            codes = np.frombuffer(buf, dtype="<i4", count=n, offset=col["codes"]["offset"])
+            offsets = np.frombuffer(buf, dtype="<u4", count=col["dict_offsets"]["length"],
+                                    offset=col["dict_offsets"]["offset"])
+            data = buf[col["dict_data"]["offset"]:col["dict_data"]["offset"] + col["dict_data"]["bytes"]]
+            words = [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+            out[col["name"]] = [None if c == NULL_CODE else words[c] for c in codes.tolist()]
+    return header, out
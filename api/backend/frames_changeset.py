@@ -0,0 +1,298 @@
+# api/backend/frames_changeset.py
+"""
+Построчный changeset frames_raw между двумя файлами базы.
+
+Нужен для публикации: вместо всего frames.db на сервер уходит только разница
+с последней опубликованной версией (новые/изменённые строки по external_id
+и список удалённых), сжатая gzip. На сервере changeset применяется к живой
+базе одной транзакцией — ручные правки и предложения там не затираются.
+
+  python frames_changeset.py digest frames.db
+  python frames_changeset.py build out/published/frames.db frames.db out/changeset.json.gz
+  python frames_changeset.py apply changeset.json.gz [--db frames.db]
+  python frames_changeset.py install frames_upload.db [--db frames.db]
+
+install — полная замена живой базы загруженной копией (когда changeset невозможен).
+Копия переносится backup API SQLite: он пишет через WAL живой базы, так что ни
+-wal/-shm, ни открытые соединения API не остаются от старого файла. Если на сервере
+есть то, что пишут пользователи (ручные правки, предложения водителей), install
+отказывается (код 4) — их в загруженной копии нет, и замена бы их уничтожила.
+
+frames_merged (слой для API) пересчитывается в той же транзакции, что и frames_raw,
+до подъёма поколения: читатели не увидят новое поколение со старым слоем.
+
+Код выхода apply: 0 — применён (или уже был применён), 3 — база на сервере
+не совпадает с базой, от которой строился changeset (нужна полная выгрузка).
+Код выхода install: 0 — база заменена, 4 — на сервере есть пользовательские данные.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from db import Base
+from frames_merged import refresh as refresh_merged
+from generation import STATE_ROW_ID
+from models import FrameMerged, FrameRaw, FrameRoadMatch, ensure_indexes
+
+FORMAT_VERSION = 1
+EXIT_BASE_MISMATCH = 3
+EXIT_USER_DATA = 4
+
+# таблицы, которые наполняют пользователи на сервере (а не импорт) — их install не затирает
+USER_TABLES = ("frames_manual", "frame_suggestions")
+
+# id/created_at/updated_at у каждой базы свои — сравниваем только данные из импорта
+COLUMNS = [c.name for c in FrameRaw.__table__.columns if c.name not in ("id", "created_at", "updated_at")]
+DATA_COLUMNS = [c for c in COLUMNS if c != "external_id"]
+
+
+class BaseMismatch(Exception):
+    """frames_raw на сервере не та, от которой строился changeset."""
+
+
+class UserDataPresent(Exception):
+    """В живой базе есть ручные правки или предложения — полная замена их бы уничтожила."""
+
+
+def frames_digest(conn: sqlite3.Connection, schema: str = "main") -> str:
+    """sha256 содержимого frames_raw (порядок строк — по external_id)."""
+    h = hashlib.sha256()
+    cols = ", ".join(COLUMNS)
+    for row in conn.execute(f"SELECT {cols} FROM {schema}.frames_raw ORDER BY external_id"):
+        h.update(json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def digest_of_file(db_path: Path) -> str:
+    conn = sqlite3.connect(f"file:{db_path.as_posix()}?mode=ro", uri=True)
+    try:
+        return frames_digest(conn)
+    finally:
+        conn.close()
+
+
+def build_changeset(base_path: Path, target_path: Path) -> Dict[str, Any]:
+    """Разница frames_raw: base (опубликованная версия) -> target (новая)."""
+    conn = sqlite3.connect(f"file:{target_path.as_posix()}?mode=ro", uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS base", (f"file:{base_path.as_posix()}?mode=ro",))
+        cols = ", ".join(f"n.{c}" for c in COLUMNS)
+        differs = " OR ".join(f"n.{c} IS NOT o.{c}" for c in DATA_COLUMNS)
+        upsert = conn.execute(
+            f"""
+            SELECT {cols} FROM main.frames_raw n
+            LEFT JOIN base.frames_raw o ON o.external_id = n.external_id
+            WHERE o.external_id IS NULL OR {differs}
+            ORDER BY n.external_id
+            """
+        ).fetchall()
+        delete = [
+            r[0]
+            for r in conn.execute(
+                """
+                SELECT external_id FROM base.frames_raw
+                WHERE external_id NOT IN (SELECT external_id FROM main.frames_raw)
+                ORDER BY external_id
+                """
+            )
+        ]
+        return {
+            "version": FORMAT_VERSION,
+            "base": frames_digest(conn, "base"),
+            "target": frames_digest(conn, "main"),
+            "columns": COLUMNS,
+            "upsert": [list(r) for r in upsert],
+            "delete": delete,
+        }
+    finally:
+        conn.close()
+
+
+def write_changeset(changeset: Dict[str, Any], path: Path) -> int:
+    """Пишет gzip(JSON), возвращает размер файла."""
+    data = json.dumps(changeset, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    return path.stat().st_size
+
+
+def read_changeset(path: Path) -> Dict[str, Any]:
+    changeset = json.loads(gzip.decompress(path.read_bytes()).decode("utf-8"))
+    if changeset.get("version") != FORMAT_VERSION:
+        raise ValueError(f"неизвестная версия changeset: {changeset.get('version')}")
+    return changeset
+
+
+def apply_changeset(db_path: Path, changeset: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """
+    Применяет changeset одной транзакцией (читатели в WAL видят старые данные до commit)
+    и в ней же пересчитывает frames_merged. Возвращает статистику пересчёта слоя
+    или None, если база уже в целевом состоянии.
+    """
+    # isolation_level=None: транзакцией управляем сами (BEGIN IMMEDIATE), а пересчёт слоя
+    # идёт через SQLAlchemy по тому же соединению — внутри этой транзакции
+    eng = create_engine(f"sqlite:///{db_path.as_posix()}", connect_args={"isolation_level": None},
+                        poolclass=NullPool, future=True)
+    try:
+        with eng.connect() as sa_conn:
+            conn = sa_conn.connection.driver_connection
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = frames_digest(conn)
+                if current == changeset["target"]:
+                    conn.execute("ROLLBACK")
+                    return None
+                if current != changeset["base"]:
+                    raise BaseMismatch(f"frames_raw {current[:12]} != base {changeset['base'][:12]}")
+
+                cols = changeset["columns"]
+                data_cols = [c for c in cols if c != "external_id"]
+                conn.executemany(
+                    f"""
+                    INSERT INTO frames_raw ({", ".join(cols)}, created_at, updated_at)
+                    VALUES ({", ".join("?" for _ in cols)}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                    ON CONFLICT(external_id) DO UPDATE SET
+                        {", ".join(f"{c} = excluded.{c}" for c in data_cols)},
+                        updated_at = CURRENT_TIMESTAMP
+                    """,
+                    changeset["upsert"],
+                )
+                conn.executemany("DELETE FROM frames_raw WHERE external_id = ?", [(i,) for i in changeset["delete"]])
+
+                if frames_digest(conn) != changeset["target"]:
+                    raise BaseMismatch("после применения frames_raw не совпала с целевой версией")
+
+                # слой для API строится из frames_raw
+                Base.metadata.create_all(bind=sa_conn, tables=[FrameMerged.__table__, FrameRoadMatch.__table__])
+                ensure_indexes(sa_conn)
+                merged = refresh_merged(sa_conn)
+
+                # новое поколение данных -> API сбросит свои кэши
+                bumped = conn.execute(
+                    "UPDATE dataset_state SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (STATE_ROW_ID,),
+                ).rowcount
+                if not bumped:
+                    conn.execute(
+                        "INSERT INTO dataset_state (id, generation, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP)",
+                        (STATE_ROW_ID,),
+                    )
+                conn.execute("COMMIT")
+                return merged
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        eng.dispose()
+
+
+def _generation(conn: sqlite3.Connection) -> int:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dataset_state'").fetchone()
+    if not exists:
+        return 0
+    row = conn.execute("SELECT generation FROM dataset_state WHERE id = ?", (STATE_ROW_ID,)).fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def install_database(db_path: Path, upload_path: Path) -> int:
+    """
+    Заменяет содержимое db_path загруженной копией upload_path (backup API), возвращает
+    новое поколение. Поколение копии и version всех строк её frames_merged ставятся выше
+    поколения живой базы — кэши API не примут новые данные за уже виденные.
+    """
+    live = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        live.execute("PRAGMA busy_timeout=5000")
+        tables = {r[0] for r in live.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        filled = [t for t in USER_TABLES if t in tables and live.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone()]
+        if filled:
+            raise UserDataPresent(", ".join(filled))
+        generation = _generation(live) + 1
+
+        upload = sqlite3.connect(str(upload_path), isolation_level=None)
+        try:
+            upload.execute("BEGIN IMMEDIATE")
+            bumped = upload.execute(
+                "UPDATE dataset_state SET generation = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (generation, STATE_ROW_ID),
+            ).rowcount
+            if not bumped:
+                upload.execute(
+                    "INSERT INTO dataset_state (id, generation, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                    (STATE_ROW_ID, generation),
+                )
+            if upload.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'frames_merged'").fetchone():
+                upload.execute("UPDATE frames_merged SET version = ?", (generation,))
+            upload.execute("COMMIT")
+            # одним шагом (pages=-1): вся копия пишется одной транзакцией живой базы
+            upload.backup(live)
+        finally:
+            upload.close()
+        return generation
+    finally:
+        live.close()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Построчный changeset frames_raw")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("digest", help="хэш содержимого frames_raw")
+    p.add_argument("db", type=Path)
+
+    p = sub.add_parser("build", help="changeset base -> target")
+    p.add_argument("base", type=Path)
+    p.add_argument("target", type=Path)
+    p.add_argument("out", type=Path)
+
+    p = sub.add_parser("apply", help="применить changeset к базе")
+    p.add_argument("changeset", type=Path)
+    p.add_argument("--db", type=Path, default=Path(__file__).resolve().parent / "frames.db")
+
+    p = sub.add_parser("install", help="заменить базу загруженной копией (если нет пользовательских данных)")
+    p.add_argument("upload", type=Path)
+    p.add_argument("--db", type=Path, default=Path(__file__).resolve().parent / "frames.db")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "digest":
+        print(digest_of_file(args.db))
+    elif args.cmd == "build":
+        changeset = build_changeset(args.base, args.target)
+        size = write_changeset(changeset, args.out)
+        print(f"[changeset] upsert={len(changeset['upsert'])} delete={len(changeset['delete'])} bytes={size}")
+    elif args.cmd == "install":
+        try:
+            generation = install_database(args.db, args.upload)
+        except UserDataPresent as e:
+            print(f"[changeset] install refused: server has user data in {e}", file=sys.stderr)
+            return EXIT_USER_DATA
+        print(f"[changeset] installed, generation={generation}")
+    else:
+        try:
+            merged = apply_changeset(args.db, read_changeset(args.changeset))
+        except BaseMismatch as e:
+            print(f"[changeset] base mismatch: {e}", file=sys.stderr)
+            return EXIT_BASE_MISMATCH
+        if merged is None:
+            print("[changeset] already up to date")
+        else:
+            print(f"[changeset] applied, frames_merged: changed={merged['changed']} deleted={merged['deleted']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
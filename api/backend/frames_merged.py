@@ -0,0 +1,404 @@
+# api/backend/frames_merged.py
+"""
+Материализованный слой рамок: таблица frames_merged.
+
+Склейка raw + правка админа + привязка к дороге (merge_raw_and_manual) делается
+при записи, а не при каждом чтении: в frames_merged лежит готовый GeoJSON Feature
+каждой видимой рамки (JSON-поля time_windows / tags уже разобраны и слиты),
+и API читает слой одним проходом по первичному ключу.
+
+Когда пересчитывается:
+  - целиком — при импорте (geojson_import.py: plan_refresh по теневой таблице до подмены,
+    apply_refresh в транзакции подмены) и при применении changeset (frames_changeset.py, в его транзакции);
+  - refresh(conn, frame_ids) — только затронутые рамки: при любой записи frames_manual
+    через ORM-сессию (_refresh_on_manual_write, в той же транзакции) и при изменении
+    привязки к дорогам (road_snap.py).
+
+Неизменившиеся строки не переписываются. Запись изменений поднимает поколение данных,
+и version изменившихся строк — это новое поколение: у строки с одним ключом разное
+содержимое всегда с разной версией, даже если строку удалили и создали заново
+(по (ключ, version) API кэширует готовые фичи, см. fragments.py).
+Если таблица пуста (старая база), любой пересчёт идёт целиком.
+
+  python frames_merged.py   # пересчитать слой в базе из db.py
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+
+from db import Base, SessionLocal, engine
+from fragments import dumps
+from generation import bump_generation, get_generation
+from models import FrameManual, FrameMerged, FrameRaw, FrameRoadMatch
+
+RAW_ALL, MANUAL_ONLY = 0, 1
+IN_CHUNK = 500  # frame_id в одном IN (...)
+
+# raw_json (копия исходной фичи) для слоя не нужен — не тянем его из базы
+RAW_COLUMNS = [c for c in FrameRaw.__table__.columns if c.name != "raw_json"]
+UPDATE_COLUMNS = ("frame_id", "in_all", "in_active", "lon", "lat", "feature", "version")
+
+
+def parse_json_field(text: Optional[str], default):
+    if not text:
+        return default
+    try:
+        return json.loads(text)
+    except Exception:
+        return default
+
+
+def merge_raw_and_manual(raw, manual=None, match=None) -> dict:
+    """Склеиваем данные raw + manual (+ привязку к дороге) в properties + coords."""
+
+    def pick(override, base):
+        return override if override is not None else base
+
+    # координаты
+    lon = pick(manual.lon_override if manual else None, raw.lon)
+    lat = pick(manual.lat_override if manual else None, raw.lat)
+
+    # time_windows и tags
+    time_windows = parse_json_field(
+        manual.time_windows_override if manual and manual.time_windows_override is not None else raw.time_windows,
+        default=[]
+    )
+
+    tags_raw = parse_json_field(raw.tags, default=[])
+    tags_admin = parse_json_field(manual.tags_admin, default=[]) if manual else []
+    tags = list(dict.fromkeys(tags_raw + tags_admin))
+
+    # дорога: правка админа -> исходные данные -> привязка road_snap.py
+    properties = {
+        "road_id": pick(manual.road_id_override if manual else None,
+                        pick(raw.road_id, match.road_id if match else None)),
+        "road_name": pick(manual.road_name_override if manual else None,
+                          pick(raw.road_name, match.road_name if match else None)),
+        "road_distance_m": match.distance_m if match else None,
+        "road_bearing_deg": match.bearing_deg if match else None,
+        "road_match_confidence": match.confidence if match else None,
+        "class": pick(manual.clazz_override if manual else None, raw.clazz),
+        "object_type": raw.object_type,
+        "hgv_access": pick(manual.hgv_access_override if manual else None, raw.hgv_access),
+        "weight_limit_tons": pick(
+            manual.weight_limit_tons_override if manual else None,
+            raw.weight_limit_tons,
+        ),
+        "axle_load_tons": pick(
+            manual.axle_load_tons_override if manual else None,
+            raw.axle_load_tons,
+        ),
+        "time_windows": time_windows,
+        "valid_from": pick(manual.valid_from_override if manual else None, raw.valid_from),
+        "valid_to": pick(manual.valid_to_override if manual else None, raw.valid_to),
+        "direction": pick(manual.direction_override if manual else None, raw.direction),
+        "source_type": raw.source_type,
+        "source_name": raw.source_name,
+        "priority": raw.priority,
+        "tags": tags,
+        "frame_id": raw.frame_id,
+        "frame_row_id_raw": raw.frame_row_id_raw,
+        "frame_url": raw.frame_url,
+        "frame_status_raw": raw.frame_status_raw,
+        "frame_error_raw": raw.frame_error_raw,
+        "frame_state": pick(
+            manual.frame_state_override if manual else None,
+            raw.frame_state,
+        ),
+        "frame_first_seen": raw.frame_first_seen,
+        "frame_last_seen": raw.frame_last_seen,
+        "frame_is_active": bool(raw.frame_is_active),
+        "frame_change_type": raw.frame_change_type,
+    }
+
+    # комментарии
+    comment_raw = raw.comment_raw or ""
+    comment_admin = manual.comment_admin if manual else None
+
+    if comment_admin:
+        base_human = raw.comment_human or ""
+        if base_human:
+            human = f"{base_human} Комментарий администратора: {comment_admin}"
+        else:
+            human = f"Комментарий администратора: {comment_admin}"
+    else:
+        human = raw.comment_human
+
+    properties["comment_raw"] = comment_raw
+    properties["comment_human"] = human
+
+    return {
+        "type": "Feature",
+        "id": raw.frame_id,
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lon, lat],
+        },
+        "properties": properties,
+    }
+
+
+def feature_from_manual_only(manual) -> Optional[dict]:
+    """Рамка, созданная только руками админа, без raw."""
+    if manual.lon_override is None or manual.lat_override is None:
+        return None
+
+    time_windows = parse_json_field(manual.time_windows_override, default=[])
+    tags_admin = parse_json_field(manual.tags_admin, default=[])
+
+    properties = {
+        "road_id": manual.road_id_override,
+        "road_name": manual.road_name_override,
+        "road_distance_m": None,
+        "road_bearing_deg": None,
+        "road_match_confidence": None,
+        "class": manual.clazz_override,
+        "object_type": "frame",
+        "hgv_access": manual.hgv_access_override,
+        "weight_limit_tons": manual.weight_limit_tons_override,
+        "axle_load_tons": manual.axle_load_tons_override,
+        "time_windows": time_windows,
+        "valid_from": manual.valid_from_override,
+        "valid_to": manual.valid_to_override,
+        "direction": manual.direction_override,
+        "source_type": "manual",
+        "source_name": "manual_admin",
+        "priority": 1,
+        "tags": tags_admin,
+        "frame_id": manual.frame_id,
+        "frame_row_id_raw": None,
+        "frame_url": None,
+        "frame_status_raw": None,
+        "frame_error_raw": None,
+        "frame_state": manual.frame_state_override,
+        "frame_first_seen": None,
+        "frame_last_seen": None,
+        "frame_is_active": True,
+        "frame_change_type": "manual_only",
+        "comment_raw": "",
+        "comment_human": manual.comment_admin,
+    }
+
+    return {
+        "type": "Feature",
+        "id": manual.frame_id,
+        "geometry": {
+            "type": "Point",
+            "coordinates": [manual.lon_override, manual.lat_override],
+        },
+        "properties": properties,
+    }
+
+
+@contextmanager
+def gc_paused():
+    """
+    Без сборщика мусора на время массовой сборки dict: на десятках тысяч фич он
+    срабатывает сотни раз и каждый раз обходит всю растущую кучу (это больше половины времени).
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def encode_feature(feature: dict) -> str:
+    return dumps(feature).decode("utf-8")
+
+
+def _select_for(conn, stmt, column, frame_ids: Optional[List[str]]):
+    """Строки stmt — все или только для frame_ids (порциями по IN_CHUNK)."""
+    if frame_ids is None:
+        yield from conn.execute(stmt)
+        return
+    for i in range(0, len(frame_ids), IN_CHUNK):
+        yield from conn.execute(stmt.where(column.in_(frame_ids[i:i + IN_CHUNK])))
+
+
+def build_rows(conn, frame_ids: Optional[List[str]] = None,
+               raw_table=FrameRaw.__table__) -> Dict[Tuple[int, int], dict]:
+    """
+    Строки frames_merged (все или для frame_ids): ключ (source, source_id) -> значения.
+    Правила те же, что были у сборки слоя в API: удалённая админом рамка скрыта,
+    правка берётся первая по id, рамка «только руками» скрыта, если есть raw
+    с тем же frame_id (для слоя активных — активная raw).
+    raw_table — таблица с колонками frames_raw (импорт считает слой по теневой таблице).
+    """
+    manual_by_frame = {}
+    manual_only_list = []
+    for m in _select_for(conn, select(FrameManual.__table__).order_by(FrameManual.id), FrameManual.frame_id, frame_ids):
+        if m.is_deleted_by_admin:
+            manual_by_frame[m.frame_id] = m
+            continue
+        if m.manual_only:
+            manual_only_list.append(m)
+        manual_by_frame.setdefault(m.frame_id, m)
+
+    match_by_external = {
+        m.external_id: m
+        for m in _select_for(conn, select(FrameRoadMatch.__table__), FrameRoadMatch.frame_id, frame_ids)
+    }
+
+    rows: Dict[Tuple[int, int], dict] = {}
+    raw_ids_all = set()
+    raw_ids_active = set()
+    raw_columns = [raw_table.c[c.name] for c in RAW_COLUMNS]
+    for raw in _select_for(conn, select(*raw_columns).order_by(raw_table.c.id), raw_table.c.frame_id, frame_ids):
+        raw_ids_all.add(raw.frame_id)
+        if raw.frame_is_active:
+            raw_ids_active.add(raw.frame_id)
+        m = manual_by_frame.get(raw.frame_id)
+        if m is not None and m.is_deleted_by_admin:
+            continue
+        feature = merge_raw_and_manual(raw, m, match_by_external.get(raw.external_id))
+        rows[(RAW_ALL, raw.id)] = _row(feature, raw.frame_id, True, bool(raw.frame_is_active))
+
+    for m in manual_only_list:
+        # скрыта среди активных -> скрыта и во всём слое
+        if m.frame_id in raw_ids_active:
+            continue
+        feature = feature_from_manual_only(m)
+        if feature is not None:
+            rows[(MANUAL_ONLY, m.id)] = _row(feature, m.frame_id, m.frame_id not in raw_ids_all, True)
+    return rows
+
+
+def _row(feature: dict, frame_id: Optional[str], in_all: bool, in_active: bool) -> dict:
+    lon, lat = feature["geometry"]["coordinates"]
+    return {"frame_id": frame_id, "in_all": in_all, "in_active": in_active, "lon": lon, "lat": lat,
+            "feature": encode_feature(feature)}
+
+
+class RefreshPlan:
+    """Что записать в frames_merged: новые/изменившиеся строки и ключи удалённых."""
+
+    def __init__(self, rows: int, upserts: List[dict], removed: List[dict]):
+        self.rows = rows
+        self.upserts = upserts
+        self.removed = removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"rows": self.rows, "changed": len(self.upserts), "deleted": len(self.removed)}
+
+
+def plan_refresh(conn, frame_ids: Optional[Iterable[str]] = None, raw_table=FrameRaw.__table__) -> RefreshPlan:
+    """
+    Считает изменения frames_merged (всё или только frame_ids), ничего не записывая.
+    Только читает — импорт зовёт это до транзакции подмены, по теневой таблице (raw_table).
+    """
+    if frame_ids is not None:
+        frame_ids = sorted({f for f in frame_ids if f is not None})
+        if not frame_ids:
+            return RefreshPlan(0, [], [])
+        if conn.execute(select(FrameMerged.source).limit(1)).first() is None:
+            frame_ids = None  # слой ещё не собирался — собираем целиком
+
+    with gc_paused():
+        new = build_rows(conn, frame_ids, raw_table)
+        old = {
+            (r.source, r.source_id): r
+            for r in _select_for(
+                conn,
+                select(FrameMerged.source, FrameMerged.source_id, FrameMerged.in_all, FrameMerged.in_active,
+                       FrameMerged.feature),
+                FrameMerged.frame_id, frame_ids,
+            )
+        }
+
+    upserts = []
+    for key, row in new.items():
+        prev = old.get(key)
+        if prev is not None and (prev.feature, prev.in_all, prev.in_active) == (
+            row["feature"], row["in_all"], row["in_active"]
+        ):
+            continue
+        upserts.append({"source": key[0], "source_id": key[1], **row})
+    removed = [{"s": k[0], "i": k[1]} for k in old.keys() - new.keys()]
+    return RefreshPlan(len(new), upserts, removed)
+
+
+def apply_refresh(conn, plan: RefreshPlan) -> Dict[str, int]:
+    """
+    Записывает план в текущей транзакции conn. Если есть что записать — поднимает
+    поколение, и оно становится version записанных строк.
+    """
+    if not plan.upserts and not plan.removed:
+        return plan.stats()
+    bump_generation(conn)
+    version = get_generation(conn)
+    if plan.removed:
+        conn.execute(
+            delete(FrameMerged).where(FrameMerged.source == bindparam("s"), FrameMerged.source_id == bindparam("i")),
+            plan.removed,
+        )
+    if plan.upserts:
+        stmt = insert(FrameMerged)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[FrameMerged.source, FrameMerged.source_id],
+                set_={c: stmt.excluded[c] for c in UPDATE_COLUMNS},
+            ),
+            [{**row, "version": version} for row in plan.upserts],
+        )
+    return plan.stats()
+
+
+def refresh(conn, frame_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Пересчитывает frames_merged (всё или только frame_ids) в текущей транзакции conn.
+    Поколение поднимается, только если слой изменился (apply_refresh).
+    """
+    return apply_refresh(conn, plan_refresh(conn, frame_ids))
+
+
+def ensure_built(bind) -> Optional[Dict[str, int]]:
+    """Собирает слой, если frames_merged пуста, а рамки есть (база до появления таблицы)."""
+    with bind.begin() as conn:
+        if conn.execute(select(FrameMerged.source).limit(1)).first() is not None:
+            return None
+        has_frames = (conn.execute(select(FrameRaw.id).limit(1)).first() is not None
+                      or conn.execute(select(FrameManual.id).limit(1)).first() is not None)
+        if not has_frames:
+            return None
+        return refresh(conn)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _refresh_on_manual_write(session, flush_context):
+    """Правка frames_manual через ORM пересчитывает свои рамки в той же транзакции."""
+    frame_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, FrameManual):
+            frame_ids.add(obj.frame_id)
+            # frame_id правки поменяли — старую рамку тоже пересчитываем
+            frame_ids.update(inspect(obj).attrs.frame_id.history.deleted or ())
+    if frame_ids - {None}:
+        refresh(session.connection(), frame_ids)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Пересчёт материализованного слоя рамок frames_merged")
+    ap.parse_args(argv)
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine, tables=[FrameMerged.__table__])
+    with engine.begin() as conn:
+        stats = refresh(conn)
+    print(f"[frames_merged] рамок {stats['rows']}, изменено {stats['changed']}, удалено {stats['deleted']}, "
+          f"{(time.perf_counter() - started) * 1000:.0f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# api/backend/generation.py
+"""
+Поколение (generation) данных рамок.
+
+Счётчик хранится в таблице dataset_state и увеличивается:
+  - при каждом импорте (geojson_import.py);
+  - при любой записи в frames_manual через ORM-сессию (см. _bump_on_manual_write).
+
+Всё, что API строит из рамок (готовые ответы, индексы и т.п.), кэшируется
+по ключу поколения — пока поколение не изменилось, повторно ничего не считаем.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from sqlalchemy import event, insert, select, update
+
+from db import SessionLocal
+from models import DatasetState, FrameManual
+
+STATE_ROW_ID = 1
+
+
+def get_generation(db) -> int:
+    """Текущее поколение данных (0, если импорт ещё ни разу не запускался)."""
+    value = db.execute(
+        select(DatasetState.generation).where(DatasetState.id == STATE_ROW_ID)
+    ).scalar()
+    return int(value or 0)
+
+
+def bump_generation(db) -> None:
+    """
+    Увеличиваем поколение в текущей транзакции (commit делает вызывающий).
+    UPDATE generation = generation + 1 атомарен и между процессами.
+    """
+    result = db.execute(
+        update(DatasetState)
+        .where(DatasetState.id == STATE_ROW_ID)
+        .values(generation=DatasetState.generation + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(DatasetState).values(id=STATE_ROW_ID, generation=1))
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _bump_on_manual_write(session, flush_context, instances):
+    """Любая правка frames_manual через ORM инвалидирует кэши API."""
+    changed = [*session.new, *session.deleted]
+    changed += [o for o in session.dirty if session.is_modified(o)]
+    if any(isinstance(o, FrameManual) for o in changed):
+        bump_generation(session)
+
+
+class GenerationCache:
+    """
+    Кэш значений, привязанных к поколению данных.
+    При сборке значения для нового поколения записи старых поколений выбрасываются,
+    так что в памяти живут данные только актуального поколения.
+    """
+
+    def __init__(self):
+        self._items: Dict[Tuple[int, Hashable], Any] = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, generation: int, key: Hashable, build: Callable[[], Any]) -> Any:
+        item = self._items.get((generation, key))
+        if item is not None:
+            return item
+
+        with self._lock:
+            item = self._items.get((generation, key))
+            if item is None:
+                item = build()
+                fresh = {k: v for k, v in self._items.items() if k[0] == generation}
+                fresh[(generation, key)] = item
+                self._items = fresh
+        return item
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items = {}
+
+
+class LruGenerationCache:
+    """
+    Как GenerationCache, но с ограничением на число записей (LRU):
+    для ключей, которых много и которые нужны не все сразу (тайлы и т.п.).
+    Смена поколения сбрасывает кэш целиком.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.generation: Any = None
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, generation: Any, key: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if generation == self.generation and key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        # собираем без блокировки: тайлы строятся параллельно в разных потоках
+        item = build()
+
+        with self._lock:
+            if generation != self.generation:
+                self._items.clear()
+                self.generation = generation
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return item
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
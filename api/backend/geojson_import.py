@@ -1,27 +1,54 @@
 # api/backend/geojson_import.py
+"""
+Импорт GeoJSON (выхлоп парсера или готовый слой рамок) в frames_raw.
+
+Файл читается потоково (geojson_stream.iter_features), строки пишутся пачками
+через Core executemany: INSERT ... ON CONFLICT(external_id) DO UPDATE — вместо
+очистки таблицы и построчного db.add. Неизменившиеся строки не переписываются.
+
+Без простоя для API: загрузка идёт в теневую таблицу frames_raw_shadow
+(копия текущих строк + upsert, commit на каждую пачку — запись из API не ждёт
+весь импорт), затем одной короткой транзакцией shadow переименовывается
+в frames_raw и записываются изменения готового слоя frames_merged (сам слой
+считается заранее, по shadow). Читатели (WAL, см. db.py) всё это время видят
+старые данные целиком.
+
+  python geojson_import.py [path.geojson] [--chunk-size 1000] [--no-raw-json]
+"""
 from __future__ import annotations
 
+import argparse
 import json
-import sys
+import time
 from pathlib import Path
-from typing import Any, Dict
-
-from sqlalchemy import delete
+from typing import Any, Dict, List
 
-from db import engine, SessionLocal, Base
-from models import FrameRaw
+from sqlalchemy import MetaData, Table, or_, text
+from sqlalchemy.dialects.sqlite import insert
 
+from config import ROADS_GEOJSON_PATH
+from db import engine, Base
+from frames_merged import (
+    apply_refresh as apply_merged_refresh, plan_refresh as plan_merged_refresh, refresh as refresh_merged,
+)
+from generation import bump_generation, get_generation
+from geojson_stream import iter_features
+from models import FrameRaw, ensure_indexes
+from road_snap import load_segments, refresh_matches
 
-def get_geojson_path() -> Path:
-    # 1) если передали аргументом — берём его
-    if len(sys.argv) >= 2:
-        return Path(sys.argv[1]).resolve()
+DEFAULT_PATH = Path(__file__).resolve().parent / "out" / "frames_parsed_latest.geojson"
+DEFAULT_CHUNK_SIZE = 1000
+PROGRESS_EVERY_S = 2.0
+SHADOW_TABLE = "frames_raw_shadow"
 
-    # 2) иначе по умолчанию берём результат парсера
-    return (Path(__file__).resolve().parent / "out" / "frames_parsed_latest.geojson").resolve()
+# колонки, которые берутся из файла (остальные — id/created_at/updated_at — ведёт база)
+IMPORT_COLUMNS = [
+    c.name for c in FrameRaw.__table__.columns if c.name not in ("id", "created_at", "updated_at")
+]
+UPDATE_COLUMNS = [c for c in IMPORT_COLUMNS if c != "external_id"]
 
 
-def normalize_feature(feature: Dict[str, Any]) -> Dict[str, Any]:
+def normalize_feature(feature: Dict[str, Any], keep_raw_json: bool = True) -> Dict[str, Any]:
     props = feature.get("properties") or {}
     geom = feature.get("geometry") or {}
     coords = geom.get("coordinates") or [None, None]
@@ -35,52 +62,208 @@ def normalize_feature(feature: Dict[str, Any]) -> Dict[str, Any]:
         lon = coords[0]
         lat = coords[1]
 
+    source_url = props.get("source_url") or props.get("url")
+    comment = props.get("comment") or props.get("description")
+
+    def json_list(value) -> str:
+        return json.dumps(value if isinstance(value, list) else [], ensure_ascii=False)
+
+    is_active = props.get("frame_is_active")
+
     return {
         "external_id": external_id,
-        "source_url": props.get("source_url") or props.get("url"),
+        "source_url": source_url,
         "source": props.get("source") or "nerudas.ru",
         "title": props.get("title") or props.get("name"),
-        "comment": props.get("comment") or props.get("description"),
+        "comment": comment,
         "lon": lon,
         "lat": lat,
         "height_m": props.get("height_m") or props.get("height"),
         "width_m": props.get("width_m") or props.get("width"),
         "weight_t": props.get("weight_t") or props.get("weight"),
-        "raw_json": json.dumps(feature, ensure_ascii=False),
+        # поля слоя рамок: из готового GeoJSON берём как есть,
+        # для выхлопа парсера nerudas заполняем из базовых полей
+        "frame_id": props.get("frame_id") or external_id,
+        "road_id": props.get("road_id"),
+        "road_name": props.get("road_name"),
+        "clazz": props.get("class"),
+        "object_type": props.get("object_type") or "frame",
+        "hgv_access": props.get("hgv_access"),
+        "weight_limit_tons": props.get("weight_limit_tons"),
+        "axle_load_tons": props.get("axle_load_tons"),
+        "time_windows": json_list(props.get("time_windows")),
+        "tags": json_list(props.get("tags")),
+        "valid_from": props.get("valid_from"),
+        "valid_to": props.get("valid_to"),
+        "direction": props.get("direction"),
+        "source_type": props.get("source_type") or "nerudas",
+        "source_name": props.get("source_name") or props.get("source") or "nerudas.ru",
+        "priority": props.get("priority"),
+        "frame_row_id_raw": props.get("frame_row_id_raw"),
+        "frame_url": props.get("frame_url") or source_url,
+        "frame_status_raw": props.get("frame_status_raw"),
+        "frame_error_raw": props.get("frame_error_raw"),
+        "frame_state": props.get("frame_state"),
+        "frame_first_seen": props.get("frame_first_seen"),
+        "frame_last_seen": props.get("frame_last_seen"),
+        "frame_is_active": True if is_active is None else bool(is_active),
+        "frame_change_type": props.get("frame_change_type"),
+        "comment_raw": props.get("comment_raw") or comment or "",
+        "comment_human": props.get("comment_human"),
+        "raw_json": json.dumps(feature, ensure_ascii=False) if keep_raw_json else None,
     }
 
 
-def main():
+def make_shadow_table() -> Table:
+    """Таблица той же структуры, что frames_raw (индексы — со своими именами)."""
+    return FrameRaw.__table__.to_metadata(MetaData(), name=SHADOW_TABLE)
+
+
+def build_upsert(table: Table):
+    stmt = insert(table)
+    excluded = stmt.excluded
+    changed = or_(*[table.c[name].is_distinct_from(excluded[name]) for name in UPDATE_COLUMNS])
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.external_id],
+        set_={**{name: excluded[name] for name in UPDATE_COLUMNS}, "updated_at": text("CURRENT_TIMESTAMP")},
+        where=changed,
+    )
+
+
+def prepare_shadow(conn, shadow: Table) -> None:
+    """Пустая теневая таблица + копия текущих строк (сохраняем id и created_at)."""
+    shadow.drop(conn, checkfirst=True)  # остаток упавшего импорта
+    shadow.create(conn)
+    columns = ", ".join(c.name for c in FrameRaw.__table__.columns)
+    # в старых базах external_id мог повторяться — при копировании остаётся последняя строка
+    conn.execute(text(
+        f"INSERT OR REPLACE INTO {SHADOW_TABLE} ({columns}) SELECT {columns} FROM frames_raw ORDER BY id"
+    ))
+
+
+def swap_in_shadow(conn, shadow: Table) -> None:
+    """Подменяет frames_raw теневой таблицей (вызывать внутри одной транзакции)."""
+    conn.execute(text("DROP TABLE frames_raw"))
+    conn.execute(text(f"ALTER TABLE {SHADOW_TABLE} RENAME TO frames_raw"))
+    # индексы переехали вместе с таблицей, но со «теневыми» именами — пересоздаём штатные
+    for index in shadow.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    for index in FrameRaw.__table__.indexes:
+        index.create(conn)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Импорт GeoJSON в frames_raw (потоковый upsert)")
+    ap.add_argument("path", nargs="?", type=Path, default=DEFAULT_PATH)
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="строк в одном executemany")
+    ap.add_argument("--no-raw-json", action="store_true", help="не сохранять копию фичи в raw_json")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.path.resolve()
+    chunk_size = max(1, args.chunk_size)
+
     print("[import] Создаем таблицы, если их ещё нет...")
     Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
 
-    path = get_geojson_path()
     print(f"[import] GeoJSON путь: {path}")
-
     if not path.exists():
         raise FileNotFoundError(f"GeoJSON не найден: {path}")
 
-    data = json.loads(path.read_text(encoding="utf-8"))
-    if data.get("type") != "FeatureCollection":
-        raise ValueError("Ожидался GeoJSON FeatureCollection")
+    shadow = make_shadow_table()
+    upsert = build_upsert(shadow)
+    started = time.perf_counter()
+    last_report = started
+    processed = 0
+
+    with engine.connect() as conn:
+        try:
+            with conn.begin():
+                prepare_shadow(conn, shadow)
+                # external_id из файла — чтобы в конце удалить строки, которых больше нет
+                conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS import_seen (external_id TEXT PRIMARY KEY)"))
+                conn.execute(text("DELETE FROM import_seen"))
+
+            chunk: List[Dict[str, Any]] = []
+
+            def flush() -> None:
+                with conn.begin():
+                    conn.execute(upsert, chunk)
+                    conn.execute(
+                        text("INSERT OR IGNORE INTO import_seen (external_id) VALUES (:external_id)"),
+                        [{"external_id": row["external_id"]} for row in chunk],
+                    )
+                chunk.clear()
+
+            for feature in iter_features(path):
+                chunk.append(normalize_feature(feature, keep_raw_json=not args.no_raw_json))
+                processed += 1
+                if len(chunk) >= chunk_size:
+                    flush()
+                    now = time.perf_counter()
+                    if now - last_report >= PROGRESS_EVERY_S:
+                        print(f"[import] ... {processed} объектов, {processed / (now - started):.0f}/с")
+                        last_report = now
+            if chunk:
+                flush()
+
+            if processed == 0:
+                # пустой файл — скорее ошибка парсера, чем «рамок больше нет»: базу не трогаем
+                raise ValueError(f"В {path} нет ни одного объекта, импорт отменён")
+
+            with conn.begin():
+                removed = conn.execute(text(
+                    f"DELETE FROM {SHADOW_TABLE} WHERE external_id NOT IN (SELECT external_id FROM import_seen)"
+                )).rowcount
 
-    features = data.get("features") or []
-    print(f"[import] Найдено объектов: {len(features)}")
+            # изменения готового слоя для API считаем по теневой таблице ещё до подмены, без блокировки
+            # записи; правки и привязка к дорогам поднимают поколение — если оно сдвинулось, план устарел
+            with conn.begin():  # только чтение: pysqlite не начинает транзакцию в базе до первой записи
+                generation = get_generation(conn)
+                merged_plan = plan_merged_refresh(conn, raw_table=shadow)
 
-    with SessionLocal() as db:
-        # очищаем raw слой перед новой загрузкой (manual/suggestions будут в других таблицах позже)
-        db.execute(delete(FrameRaw))
-        db.commit()
+            swap_started = time.perf_counter()
+            with conn.begin():
+                swap_in_shadow(conn, shadow)
+                # слой — в той же транзакции: читатели не увидят новую raw со старым слоем
+                if get_generation(conn) == generation:
+                    merged = apply_merged_refresh(conn, merged_plan)
+                else:
+                    merged = refresh_merged(conn)
+                # новое поколение данных -> API сбросит свои кэши
+                bump_generation(conn)
+            swap_ms = (time.perf_counter() - swap_started) * 1000
+        except BaseException:
+            with conn.begin():
+                shadow.drop(conn, checkfirst=True)
+            raise
+        finally:
+            conn.execute(text("DROP TABLE IF EXISTS import_seen"))
+            conn.commit()
 
-        added = 0
-        for f in features:
-            row = normalize_feature(f)
-            db.add(FrameRaw(**row))
-            added += 1
+        # привязка рамок к дорогам для грузовых — отдельной короткой транзакцией после подмены
+        if ROADS_GEOJSON_PATH.exists():
+            snap_started = time.perf_counter()
+            roads = load_segments(ROADS_GEOJSON_PATH)
+            with conn.begin():
+                snap = refresh_matches(conn, roads)
+            print(f"[import] Привязка к дорогам: {snap['matched']} из {snap['frames']} рамок, "
+                  f"{(time.perf_counter() - snap_started) * 1000:.0f}мс")
+        else:
+            print(f"[import] Нет слоя дорог {ROADS_GEOJSON_PATH} — привязку к дорогам пропускаем")
 
-        db.commit()
+        # переносим WAL в основной файл: frames.db дальше копируется на сервер как есть
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
 
-    print(f"[import] Импорт завершен. Добавлено: {added}")
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else float("inf")
+    print(f"[import] Импорт завершен. Обработано: {processed}, удалено устаревших: {removed}, "
+          f"{elapsed:.2f}с ({rate:.0f} объектов/с), подмена таблицы: {swap_ms:.1f}мс")
+    print(f"[import] Слой frames_merged: {merged['rows']} рамок, изменено {merged['changed']}, "
+          f"удалено {merged['deleted']}")
 
 
 if __name__ == "__main__":
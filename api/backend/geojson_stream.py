@@ -0,0 +1,118 @@
+# api/backend/geojson_stream.py
+"""
+Потоковое чтение фич из GeoJSON FeatureCollection без загрузки файла целиком.
+
+Простой разборщик на json.JSONDecoder.raw_decode (без внешних зависимостей):
+файл читается кусками, верхний уровень объекта разбирается вручную,
+элементы массива "features" декодируются по одному.
+В памяти одновременно — буфер чтения и одна фича.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, TextIO
+
+READ_CHUNK = 1 << 16
+WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """Буфер поверх текстового файла с догрузкой по мере разбора."""
+
+    def __init__(self, fh: TextIO):
+        self.fh = fh
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fh.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Следующий непробельный символ ('' в конце файла)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, char: str) -> None:
+        got = self.peek()
+        if got != char:
+            raise ValueError(f"GeoJSON: ожидался '{char}', а встретился '{got or 'EOF'}'")
+        self.pos += 1
+
+    def value(self, decoder: json.JSONDecoder) -> Any:
+        """Декодирует одно JSON-значение, при нехватке данных дочитывает файл."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+                continue
+            # число на границе буфера могло быть обрезано — убеждаемся, что за ним что-то есть
+            if end >= len(self.buf) and not self.eof and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_features(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    reader = _Reader(fh)
+    reader.expect("{")
+    collection_type = None
+
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            key = reader.value(decoder)
+            reader.expect(":")
+            if key == "features":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.value(decoder)
+                        sep = reader.peek()
+                        reader.pos += 1
+                        if sep == "]":
+                            break
+                        if sep != ",":
+                            raise ValueError("GeoJSON: ошибка в массиве features")
+            else:
+                value = reader.value(decoder)
+                if key == "type":
+                    collection_type = value
+
+            sep = reader.peek()
+            reader.pos += 1
+            if sep == "}":
+                break
+            if sep != ",":
+                raise ValueError("GeoJSON: ошибка в объекте верхнего уровня")
+
+    # "type" может идти и после "features" — проверяем в конце (импорт тогда откатится)
+    if collection_type != "FeatureCollection":
+        raise ValueError("Ожидался GeoJSON FeatureCollection")
+
+
+def iter_features(path: Path) -> Iterator[Dict[str, Any]]:
+    """Фичи FeatureCollection по одной."""
+    with path.open("r", encoding="utf-8") as fh:
+        yield from _iter_features(fh)
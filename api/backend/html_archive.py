@@ -0,0 +1,134 @@
+# api/backend/html_archive.py
+"""
+Архив скачанных страниц с адресацией по содержимому.
+
+  out/archive/objects/ab/<sha256>.zst|.gz  — сжатое тело ответа (ключ = sha256 тела)
+  out/archive/index.sqlite                 — url -> sha256 + кодировка последней версии
+
+Одинаковые тела хранятся один раз. Позволяет прогнать новую версию parse_html
+по уже скачанным страницам без обращения к сайту (--reparse-from-archive).
+zstd используется, если установлен пакет zstandard, иначе gzip.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd — необязательная зависимость
+    zstandard = None
+
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class HtmlArchive:
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects = root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index_path = root / "index.sqlite"
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ---------- объекты (можно звать из любых потоков/процессов) ----------
+
+    def _object_base(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def find(self, digest: str) -> Optional[Path]:
+        base = self._object_base(digest)
+        for suffix in (".zst", ".gz"):
+            path = base.with_suffix(suffix)
+            if path.exists():
+                return path
+        return None
+
+    def put(self, body: bytes) -> str:
+        """Сохраняет тело (если такого ещё нет) и возвращает его sha256."""
+        digest = content_hash(body)
+        if self.find(digest) is not None:
+            return digest
+
+        if zstandard is not None:
+            data = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+            suffix = ".zst"
+        else:
+            data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            suffix = ".gz"
+
+        target = self._object_base(digest).with_suffix(suffix)
+        target.parent.mkdir(exist_ok=True)
+        # пишем во временный файл и атомарно переименовываем — без полузаписанных объектов
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        path = self.find(digest)
+        if path is None:
+            raise KeyError(f"нет объекта в архиве: {digest}")
+        data = path.read_bytes()
+        if path.suffix == ".zst":
+            if zstandard is None:
+                raise RuntimeError("для чтения .zst нужен пакет zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    # ---------- индекс url -> hash (только из одного потока) ----------
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.index_path))
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS url_index (
+                    url          TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    encoding     TEXT,
+                    archived_at  TEXT
+                )
+                """
+            )
+        return self._conn
+
+    def record(self, url: str, digest: str, encoding: Optional[str], archived_at: str) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO url_index (url, content_hash, encoding, archived_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                encoding = excluded.encoding,
+                archived_at = excluded.archived_at
+            """,
+            (url, digest, encoding, archived_at),
+        )
+
+    def load_index(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        return {
+            url: (digest, encoding)
+            for url, digest, encoding in self.conn.execute("SELECT url, content_hash, encoding FROM url_index")
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
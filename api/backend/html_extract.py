@@ -0,0 +1,194 @@
+# api/backend/html_extract.py
+"""
+Потоковый извлекатель для страниц nerudas (бэкенд "stream" для parse_html).
+
+Вместо полного дерева BeautifulSoup идём токенизатором html.parser (тем же,
+что использует bs4 с "html.parser") и собираем только то, что нужно parse_html:
+  - текст первого <h1>;
+  - текст первого <article> (или первого div с классом content/entry/post);
+  - первую пару координат в тексте страницы.
+Как только всё найдено — дальше документ не разбираем.
+
+Результат совпадает с parse_html на BeautifulSoup: тексты режутся на строки
+так же (между тегами, комментарии/скрипты/стили/template не входят), проверка —
+bench_extract.py на сохранённых страницах.
+"""
+from __future__ import annotations
+
+import re
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional
+
+# Теги без закрывающей пары: в стек не кладём
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "meta", "param", "source", "track", "wbr", "basefont", "bgsound",
+    "command", "frame", "image", "isindex", "menuitem", "nextid", "spacer",
+}
+# Строки внутри этих тегов bs4 не включает в get_text()
+SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+ARTICLE_CLASS_RE = re.compile("content|entry|post", re.I)
+
+# Совпадение координат целиком состоит из цифр, точек, запятых и пробелов:
+# если после начала совпадения в тексте уже есть другой символ, оно окончательное
+NON_COORD_CHAR_RE = re.compile(r"[^\d.,\s]")
+
+FEED_CHUNK = 8192
+
+
+class _Capture:
+    """Сбор текста одного элемента (пока он открыт в стеке)."""
+
+    def __init__(self, node_id: int):
+        self.node_id = node_id
+        self.parts: List[str] = []
+        self.closed = False
+
+
+class FrameExtractor(HTMLParser):
+    def __init__(self, coords_re: "re.Pattern[str]"):
+        super().__init__(convert_charrefs=True)
+        self.coords_re = coords_re
+        self.stack: List[tuple] = []  # (tag, node_id)
+        self.next_id = 0
+        self.skip_depth = 0
+        self.pending: List[str] = []
+
+        self.page_parts: List[str] = []
+        self.h1: Optional[_Capture] = None
+        self.article: Optional[_Capture] = None
+        self.content_div: Optional[_Capture] = None
+
+        # хвост текста страницы, в котором ещё может начаться совпадение координат
+        self.coords_run = ""
+        self.coords_match: Optional[str] = None
+        self.coords_final = False
+
+    # ---------- токены ----------
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in VOID_TAGS:
+            return
+        node_id = self.next_id
+        self.next_id += 1
+        self.stack.append((tag, node_id))
+        if tag in SKIP_TEXT_TAGS:
+            self.skip_depth += 1
+
+        if tag == "h1" and self.h1 is None:
+            self.h1 = _Capture(node_id)
+        elif tag == "article" and self.article is None:
+            self.article = _Capture(node_id)
+        elif tag == "div" and self.content_div is None:
+            classes = (dict(attrs).get("class") or "").split()
+            if any(ARTICLE_CLASS_RE.search(c) for c in classes):
+                self.content_div = _Capture(node_id)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        # как bs4: закрываем до последнего открытого тега с этим именем, иначе игнорируем
+        for pos in range(len(self.stack) - 1, -1, -1):
+            if self.stack[pos][0] == tag:
+                break
+        else:
+            return
+        for name, node_id in self.stack[pos:]:
+            if name in SKIP_TEXT_TAGS:
+                self.skip_depth -= 1
+            for cap in (self.h1, self.article, self.content_div):
+                if cap is not None and cap.node_id == node_id:
+                    cap.closed = True
+        del self.stack[pos:]
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA["):
+            self._add_string(data[len("CDATA["):])
+
+    # ---------- текст ----------
+
+    def _flush(self):
+        if self.pending:
+            text = "".join(self.pending)
+            self.pending = []
+            if not self.skip_depth:
+                self._add_string(text)
+
+    def _add_string(self, text: str):
+        text = text.strip()
+        if not text:
+            return
+        sep = "\n" if self.page_parts else ""
+        self.page_parts.append(text)
+        for cap in (self.h1, self.article, self.content_div):
+            if cap is not None and not cap.closed:
+                cap.parts.append(text)
+        if not self.coords_final:
+            self._scan_coords(sep + text)
+
+    def _scan_coords(self, chunk: str):
+        candidate = self.coords_run + chunk
+        m = self.coords_re.search(candidate)
+        if m:
+            self.coords_match = m.group(0)
+            if NON_COORD_CHAR_RE.search(candidate, m.start()):
+                self.coords_final = True
+                return
+        tail = None
+        for tail in NON_COORD_CHAR_RE.finditer(candidate):
+            pass
+        self.coords_run = candidate[tail.end():] if tail is not None else candidate
+
+    @property
+    def complete(self) -> bool:
+        return (
+            self.h1 is not None and self.h1.closed
+            and self.article is not None and self.article.closed
+            and self.coords_final
+        )
+
+    def finish(self):
+        self.close()
+        self._flush()
+
+
+def extract(html: str, url: str, coords_re: "re.Pattern[str]",
+            guess_coords: Callable[[str], Optional[List[float]]]) -> Dict[str, Any]:
+    """То же, что parse_html на BeautifulSoup, но с ранней остановкой."""
+    parser = FrameExtractor(coords_re)
+    for start in range(0, len(html), FEED_CHUNK):
+        parser.feed(html[start:start + FEED_CHUNK])
+        if parser.complete:
+            break
+    else:
+        parser.finish()
+
+    title = " ".join(parser.h1.parts).strip() if parser.h1 is not None else ""
+
+    article = parser.article or parser.content_div
+    if article is not None:
+        comment = "\n".join(article.parts)
+    else:
+        comment = "\n".join(parser.page_parts)
+
+    coords = guess_coords(parser.coords_match) if parser.coords_match else None
+
+    return {
+        "title": title or url,
+        "comment": comment[:2000],
+        "coords": coords,
+    }
@@ -0,0 +1,301 @@
+# api/backend/metrics.py
+"""
+Метрики процесса API в формате Prometheus (text exposition 0.0.4) для /api/metrics.
+
+  - запросы: гистограммы длительности и размера ответа по (маршрут, метод, код);
+    маршрут — шаблон Flask (/api/tiles/<layer>/<int:z>/...), а не сам URL;
+  - SQL: число запросов и время по маршрутам и гистограмма длительности
+    (события before/after_cursor_execute движка SQLAlchemy);
+  - фазы: phase("merge") / phase("serialize") — именованные таймеры участков кода;
+  - внешние источники (сжатие, очередь предложений) добавляются через add_collector.
+
+Учёт текущего запроса живёт в contextvar: SQL и фазы внутри запроса попадают
+в его счётчики (и в заголовок Server-Timing). Стоимость на запрос — пара
+perf_counter и обновление словарей под одним локом.
+
+Профилировщик медленных запросов (по умолчанию выключен): TT_PROFILE_SLOW_MS=500
+включает фоновый поток, который раз в PROFILE_INTERVAL_S снимает стеки потоков
+с запросами в работе (sys._current_frames). Если запрос шёл дольше порога,
+его стеки пишутся в PROFILE_DIR в «свёрнутом» формате flamegraph.pl / speedscope.
+
+Метрики — на процесс: у каждого процесса Passenger свои (метка pid).
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+PROFILE_SLOW_MS = float(os.getenv("TT_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_S = 0.005
+PROFILE_DIR = Path(__file__).resolve().parent / "out" / "profiles"
+PROFILE_KEEP = 50
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами (кумулятивные ведра считаются при выводе)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._bounds: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Labels, float]]]] = []
+
+    def histogram(self, name: str, help_text: str, bounds: Tuple[float, ...]) -> None:
+        self._help[name] = ("histogram", help_text)
+        self._bounds[name] = bounds
+        self._histograms[name] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._help[name] = ("counter", help_text)
+        self._counters[name] = {}
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._histograms[name]
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = Histogram(self._bounds[name])
+            hist.observe(value)
+
+    def inc(self, name: str, labels: Labels, value: float = 1.0) -> None:
+        with self._lock:
+            series = self._counters[name]
+            series[labels] = series.get(labels, 0.0) + value
+
+    def add_collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Labels, float]]]) -> None:
+        """collect() -> [(имя, тип, описание, метки, значение)] — значения снимаются при выводе."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        pid = (("pid", str(os.getpid())),)
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} histogram"]
+                for labels, hist in sorted(series.items()):
+                    running = 0
+                    for bound, n in zip(hist.bounds, hist.counts):
+                        running += n
+                        lines.append(f"{name}_bucket{_fmt(pid + labels + (('le', _num(bound)),))} {running}")
+                    lines.append(f"{name}_bucket{_fmt(pid + labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_fmt(pid + labels)} {_num(hist.sum)}")
+                    lines.append(f"{name}_count{_fmt(pid + labels)} {hist.count}")
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} counter"]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_fmt(pid + labels)} {_num(value)}")
+
+        declared = set()
+        for collect in self._collectors:
+            for name, kind, help_text, labels, value in collect():
+                if name not in declared:
+                    declared.add(name)
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines.append(f"{name}{_fmt(pid + labels)} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _fmt(labels: Labels) -> str:
+    def esc(v: str) -> str:
+        return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+
+REGISTRY = Registry()
+REGISTRY.histogram("tt_http_request_duration_seconds", "Время обработки запроса", DURATION_BUCKETS)
+REGISTRY.histogram("tt_http_response_size_bytes", "Размер тела ответа (после сжатия)", SIZE_BUCKETS)
+REGISTRY.counter("tt_http_sql_statements_total", "SQL-запросов, выполненных при обработке HTTP-запросов")
+REGISTRY.counter("tt_http_sql_seconds_total", "Время выполнения SQL (без выборки строк) при обработке HTTP-запросов")
+REGISTRY.histogram("tt_sql_statement_duration_seconds", "Длительность выполнения одного SQL-запроса (без выборки строк)", SQL_BUCKETS)
+REGISTRY.histogram("tt_phase_duration_seconds", "Длительность именованных фаз (phase())", DURATION_BUCKETS)
+
+
+class RequestStats:
+    __slots__ = ("route", "method", "started", "sql_count", "sql_seconds", "phases", "samples")
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.phases: Dict[str, float] = {}
+        self.samples: Optional[Counter] = None
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing (на момент вызова)."""
+        parts = [f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}",
+                 f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} statements"']
+        parts += [f"{name};dur={sec * 1000:.1f}" for name, sec in self.phases.items()]
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("tt_request_stats", default=None)
+
+
+def start_request(route: str, method: str) -> RequestStats:
+    stats = RequestStats(route, method)
+    _current.set(stats)
+    if PROFILE_SLOW_MS > 0:
+        _PROFILER.register(stats)
+    return stats
+
+
+def finish_request(stats: RequestStats, status: int, size: Optional[int]) -> None:
+    elapsed = time.perf_counter() - stats.started
+    labels = (("route", stats.route), ("method", stats.method), ("status", str(status)))
+    REGISTRY.observe("tt_http_request_duration_seconds", labels, elapsed)
+    if size is not None:
+        REGISTRY.observe("tt_http_response_size_bytes", labels, size)
+    route = (("route", stats.route),)
+    REGISTRY.inc("tt_http_sql_statements_total", route, stats.sql_count)
+    REGISTRY.inc("tt_http_sql_seconds_total", route, stats.sql_seconds)
+    if PROFILE_SLOW_MS > 0:
+        _PROFILER.unregister(stats, elapsed)
+    if _current.get() is stats:
+        _current.set(None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe("tt_phase_duration_seconds", (("phase", name),), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.phases[name] = stats.phases.get(name, 0.0) + elapsed
+
+
+def counting(chunks: Iterable[bytes], on_done: Callable[[int], None]) -> Iterator[bytes]:
+    """Пропускает поток насквозь и сообщает, сколько байт ушло (для потоковых ответов)."""
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        on_done(total)
+
+
+def instrument_engine(engine) -> None:
+    """Счётчики и время SQL: глобальная гистограмма + счётчики текущего запроса."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("tt_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["tt_query_started"].pop()
+        REGISTRY.observe("tt_sql_statement_duration_seconds", (), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_seconds += elapsed
+
+
+class SlowRequestProfiler:
+    """Сэмплирующий профилировщик запросов в работе (включается TT_PROFILE_SLOW_MS)."""
+
+    def __init__(self, slow_ms: float, interval: float = PROFILE_INTERVAL_S, out_dir: Path = PROFILE_DIR):
+        self.slow_s = slow_ms / 1000.0
+        self.interval = interval
+        self.out_dir = out_dir
+        self._active: Dict[int, RequestStats] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def register(self, stats: RequestStats) -> None:
+        stats.samples = Counter()
+        with self._lock:
+            self._active[threading.get_ident()] = stats
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, stats: RequestStats, elapsed: float) -> None:
+        with self._lock:
+            for tid, item in list(self._active.items()):
+                if item is stats:
+                    del self._active[tid]
+        if elapsed >= self.slow_s and stats.samples:
+            try:
+                self._dump(stats, elapsed)
+            except OSError as exc:
+                print(f"[metrics] профиль не записан: {exc}", file=sys.stderr)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for tid, stats in active:
+                frame = frames.get(tid)
+                if frame is None or stats.samples is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stats.samples[";".join(reversed(stack))] += 1
+
+    def _dump(self, stats: RequestStats, elapsed: float) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        route = stats.route.strip("/").replace("/", "_").replace("<", "").replace(">", "").replace(":", "-")
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{stats.method}-{route or 'root'}.folded"
+        with open(self.out_dir / name, "w", encoding="utf-8") as fh:
+            for stack, n in stats.samples.most_common():
+                fh.write(f"{stack} {n}\n")
+        old = sorted(self.out_dir.glob("*.folded"))[:-PROFILE_KEEP]
+        for path in old:
+            path.unlink(missing_ok=True)
+
+
+_PROFILER = SlowRequestProfiler(PROFILE_SLOW_MS)
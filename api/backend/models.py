@@ -1,7 +1,7 @@
 # api/backend/models.py
 from __future__ import annotations
 
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, Index, inspect
 from sqlalchemy.sql import func
 
 from db import Base
@@ -13,7 +13,7 @@ class FrameRaw(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
 
     # стабильный идентификатор рамки (например apvk-10233)
-    external_id = Column(String(64), index=True, nullable=False)
+    external_id = Column(String(64), index=True, unique=True, nullable=False)
 
     source_url = Column(Text, nullable=True)
     source = Column(String(32), nullable=False, default="nerudas.ru")
@@ -22,14 +22,262 @@ class FrameRaw(Base):
     comment = Column(Text, nullable=True)
 
     lon = Column(Float, nullable=True)
-    lat = Column(Float, nullable=True)
+    lat = Column(Float, nullable=True, index=True)  # рамки рядом с точкой (suggestion_clusters.py)
 
     # строковые поля под ограничения (потом нормально нормализуем)
     height_m = Column(Float, nullable=True)
     width_m = Column(Float, nullable=True)
     weight_t = Column(Float, nullable=True)
 
+    # поля слоя рамок (как в map/data/frames_ready.geojson и api/frames.php)
+    frame_id = Column(String(128), index=True, nullable=True)
+    road_id = Column(String(64), nullable=True)
+    road_name = Column(Text, nullable=True)
+    clazz = Column(String(32), nullable=True)
+    object_type = Column(String(32), nullable=True, default="frame")
+    hgv_access = Column(String(32), nullable=True)
+    weight_limit_tons = Column(Float, nullable=True)
+    axle_load_tons = Column(Float, nullable=True)
+    time_windows = Column(Text, nullable=True)  # JSON-строка
+    tags = Column(Text, nullable=True)  # JSON-строка
+    valid_from = Column(String(32), nullable=True)
+    valid_to = Column(String(32), nullable=True)
+    direction = Column(String(16), nullable=True)
+    source_type = Column(String(32), nullable=True)
+    source_name = Column(Text, nullable=True)
+    priority = Column(Integer, nullable=True)
+    frame_row_id_raw = Column(String(64), nullable=True)
+    frame_url = Column(Text, nullable=True)
+    frame_status_raw = Column(String(32), nullable=True)
+    frame_error_raw = Column(Text, nullable=True)
+    frame_state = Column(String(32), nullable=True)
+    frame_first_seen = Column(String(32), nullable=True)
+    frame_last_seen = Column(String(32), nullable=True)
+    frame_is_active = Column(Boolean, nullable=False, default=True)
+    frame_change_type = Column(String(32), nullable=True)
+    comment_raw = Column(Text, nullable=True)
+    comment_human = Column(Text, nullable=True)
+
     raw_json = Column(Text, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class FrameManual(Base):
+    """Ручные правки админа поверх raw-слоя (или рамки, созданные только руками)."""
+
+    __tablename__ = "frames_manual"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    frame_id = Column(String(128), index=True, nullable=False)
+
+    lon_override = Column(Float, nullable=True)
+    lat_override = Column(Float, nullable=True)
+    road_id_override = Column(String(64), nullable=True)
+    road_name_override = Column(Text, nullable=True)
+    clazz_override = Column(String(32), nullable=True)
+    hgv_access_override = Column(String(32), nullable=True)
+    weight_limit_tons_override = Column(Float, nullable=True)
+    axle_load_tons_override = Column(Float, nullable=True)
+    time_windows_override = Column(Text, nullable=True)  # JSON-строка
+    valid_from_override = Column(String(32), nullable=True)
+    valid_to_override = Column(String(32), nullable=True)
+    direction_override = Column(String(16), nullable=True)
+    frame_state_override = Column(String(32), nullable=True)
+
+    tags_admin = Column(Text, nullable=True)  # JSON-строка
+    comment_admin = Column(Text, nullable=True)
+
+    manual_only = Column(Boolean, nullable=False, default=False)
+    is_deleted_by_admin = Column(Boolean, nullable=False, default=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class FrameSuggestion(Base):
+    """Предложения водителей: правка существующей рамки или новая рамка."""
+
+    __tablename__ = "frame_suggestions"
+    # список модерации листается по (created_at, id) от новых к старым;
+    # у каждого фильтра свой составной индекс, чтобы страница читалась прямо по индексу
+    __table_args__ = (
+        Index("ix_frame_suggestions_created", "created_at", "id"),
+        Index("ix_frame_suggestions_status_created", "status", "created_at", "id"),
+        Index("ix_frame_suggestions_type_created", "type", "created_at", "id"),
+        Index("ix_frame_suggestions_frame_created", "frame_id", "created_at", "id"),
+        Index("ix_frame_suggestions_lon_lat", "suggested_lon", "suggested_lat"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    frame_id = Column(String(128), nullable=True)
+    type = Column(String(32), nullable=False)  # change_existing | new_frame
+
+    suggested_lon = Column(Float, nullable=True)
+    suggested_lat = Column(Float, nullable=True)
+    suggested_weight_limit_tons = Column(Float, nullable=True)
+    suggested_axle_load_tons = Column(Float, nullable=True)
+    suggested_direction = Column(String(16), nullable=True)
+    suggested_frame_state = Column(String(32), nullable=True)
+
+    comment_driver = Column(Text, nullable=False)
+    contact_phone = Column(String(64), nullable=True)
+    contact_name = Column(Text, nullable=True)
+
+    status = Column(String(32), nullable=False, default="new")
+    resolution_comment = Column(Text, nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    processed_by = Column(String(64), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SuggestionTicket(Base):
+    """
+    Итог записи пакета предложений (suggestion_queue.py), пишется в транзакции самой пачки.
+    По нему на GET тикета отвечает любой процесс API, а не только принявший пакет.
+    """
+
+    __tablename__ = "suggestion_tickets"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(16), nullable=False)  # stored | failed
+    suggestion_ids = Column(Text, nullable=True)  # JSON-список id frame_suggestions
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+class FrameRoadMatch(Base):
+    """
+    Привязка рамки к ближайшему отрезку дороги для грузовых (road_snap.py).
+    Пересчитывается целиком после импорта; road_id/road_name отсюда идут в слой,
+    если их нет ни в правке, ни в исходных данных.
+    Ключ — frames_raw.external_id: frame_id у строк frames_raw может повторяться.
+    """
+
+    __tablename__ = "frame_road_matches"
+
+    external_id = Column(String(64), primary_key=True)
+    frame_id = Column(String(128), index=True, nullable=True)  # для пересчёта слоя по frame_id
+    road_id = Column(String(64), nullable=True)
+    road_name = Column(Text, nullable=True)
+    distance_m = Column(Float, nullable=True)
+    bearing_deg = Column(Float, nullable=True)  # азимут отрезка дороги, 0 — север, по часовой
+    confidence = Column(Float, nullable=True)  # 0..1
+
+
+class FrameMerged(Base):
+    """
+    Готовый слой рамок (frames_merged.py): raw + правка админа + привязка к дороге,
+    уже склеенные и сериализованные в GeoJSON Feature. API читает слой отсюда
+    одним проходом по первичному ключу, без склейки в Python.
+
+    Строка — рамка из frames_raw (source=0, source_id = frames_raw.id) или
+    рамка «только руками» (source=1, source_id = frames_manual.id); порядок
+    ключа — порядок рамок в ответе. in_all / in_active — видна ли рамка в слое
+    целиком и в слое только активных. version — поколение данных, в котором строка
+    последний раз изменилась (по нему API узнаёт, что готовая фича в кэше устарела).
+    """
+
+    __tablename__ = "frames_merged"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    source = Column(Integer, primary_key=True)
+    source_id = Column(Integer, primary_key=True)
+    frame_id = Column(String(128), index=True, nullable=True)
+    in_all = Column(Boolean, nullable=False)
+    in_active = Column(Boolean, nullable=False)
+    lon = Column(Float, nullable=True)
+    lat = Column(Float, nullable=True)
+    feature = Column(Text, nullable=False)  # JSON Feature, компактный
+    version = Column(Integer, nullable=False, default=1)
+
+
+class SuggestionCluster(Base):
+    """
+    Группа близких предложений новой рамки (suggestion_clusters.py).
+    Центр — среднее координат участников; frame_id — ближайшая рамка из frames_raw
+    в пределах радиуса сопоставления (вероятно, о ней и сообщают).
+    """
+
+    __tablename__ = "suggestion_clusters"
+    __table_args__ = (Index("ix_suggestion_clusters_lon_lat", "lon", "lat"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    lon = Column(Float, nullable=False)
+    lat = Column(Float, nullable=False)
+    size = Column(Integer, nullable=False, default=0)
+
+    frame_id = Column(String(128), nullable=True)
+    frame_distance_m = Column(Float, nullable=True)
+
+    first_created_at = Column(DateTime(timezone=True), nullable=True)
+    last_created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class SuggestionClusterMember(Base):
+    """Предложение -> группа (у каждого обработанного предложения ровно одна группа)."""
+
+    __tablename__ = "suggestion_cluster_members"
+
+    suggestion_id = Column(Integer, primary_key=True)
+    cluster_id = Column(Integer, index=True, nullable=False)
+
+
+class SuggestionClusterState(Base):
+    """Одна строка (id=1): до какого id предложения дошла кластеризация и с каким радиусом."""
+
+    __tablename__ = "suggestion_cluster_state"
+
+    id = Column(Integer, primary_key=True)
+    last_suggestion_id = Column(Integer, nullable=False, default=0)
+    radius_m = Column(Float, nullable=False)
+
+
+class DatasetState(Base):
+    """
+    Одна строка (id=1) с номером поколения данных рамок.
+    Поколение растёт при каждом импорте и каждой записи в frames_manual —
+    по нему инвалидируются кэши API.
+    """
+
+    __tablename__ = "dataset_state"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+# производные таблицы (пересчитываются целиком): сменился первичный ключ — пересоздаём пустой
+REKEYED_DERIVED_TABLES = ("frame_road_matches",)
+
+
+def _recreate_rekeyed_tables(bind) -> None:
+    inspector = inspect(bind)
+    existing = set(inspector.get_table_names())
+    for name in REKEYED_DERIVED_TABLES:
+        table = Base.metadata.tables[name]
+        if name not in existing:
+            continue
+        if inspector.get_pk_constraint(name)["constrained_columns"] != [c.name for c in table.primary_key]:
+            print(f"[models] {name}: сменился ключ, таблица пересоздаётся (заполнит пересчёт)")
+            table.drop(bind)
+            table.create(bind)
+
+
+def ensure_indexes(bind) -> None:
+    """
+    create_all создаёт индексы только вместе с новой таблицей —
+    индексы, добавленные в модели позже, докатываем на существующие базы.
+    Заодно пересоздаются производные таблицы со сменившимся ключом (REKEYED_DERIVED_TABLES):
+    старую схему create_all не исправит.
+    """
+    _recreate_rekeyed_tables(bind)
+    existing = set(inspect(bind).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
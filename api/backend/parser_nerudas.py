@@ -1,23 +1,139 @@
 # api/backend/parser_nerudas.py
+import argparse
 import json
+import os
 import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+import html_extract
+from crawl_state import PageState, PageStateStore, utc_now_iso
+from html_archive import HtmlArchive, content_hash
 
 BASE = "https://nerudas.ru"
 SOURCES_FILE = Path(__file__).with_name("nerudas_sources.txt")
 OUT_DIR = Path(__file__).with_name("out")
 OUT_FILE = OUT_DIR / "frames_parsed_latest.geojson"
+STATE_FILE = OUT_DIR / "page_state.sqlite"
+ARCHIVE_DIR = OUT_DIR / "archive"
 
 HEADERS = {
     "User-Agent": "Trans-TimeBot/1.0 (+https://trans-time.ru)",
     "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
 }
 
+# Сетевые настройки по умолчанию (переопределяются аргументами командной строки)
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE_PER_HOST = 2.5  # запросов в секунду на хост (раньше: sleep 0.4 между страницами)
+DEFAULT_BURST = 1
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0  # секунды, удваивается с каждой попыткой
+DEFAULT_TIMEOUT = 25
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+COORDS_RE = re.compile(r"(\d{2}\.\d+)\s*[, ]\s*(\d{2}\.\d+)")
+
+# Бэкенды разбора страницы: bs4 — полное дерево BeautifulSoup,
+# stream — потоковый html_extract с ранней остановкой (результат тот же)
+EXTRACTORS = ("bs4", "stream")
+DEFAULT_EXTRACTOR = "bs4"
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше burst в запасе."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Отдельный token bucket на каждый хост."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        if self.rate <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Общая сессия с пулом keep-alive соединений (без повторного TCP/TLS на каждую страницу)."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch(url: str, session: requests.Session, limiter: HostRateLimiter,
+          headers: Optional[Dict[str, str]] = None, retries: int = DEFAULT_RETRIES,
+          backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+    """
+    GET с лимитом на хост и повтором (экспоненциальная пауза) на 429/5xx и сетевых ошибках.
+    Возвращает ответ 2xx или 304 (на условный запрос), остальное — исключение.
+    """
+    for attempt in range(retries + 1):
+        limiter.acquire(url)
+        try:
+            r = session.get(url, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            continue
+
+        if r.status_code in RETRY_STATUSES and attempt < retries:
+            retry_after = r.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+            r.close()
+            time.sleep(delay)
+            continue
+
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+    raise RuntimeError("unreachable")
+
+def fetch_html(url: str, session: requests.Session, limiter: HostRateLimiter, **kwargs) -> str:
+    return fetch(url, session, limiter, **kwargs).text
+
 def read_sources() -> List[str]:
     if not SOURCES_FILE.exists():
         raise FileNotFoundError(f"Нет файла со ссылками: {SOURCES_FILE}")
@@ -48,7 +164,7 @@ def safe_float(x: str) -> Optional[float]:
 def guess_coords(text: str) -> Optional[List[float]]:
     # Пытаемся выцепить "55.12345, 37.12345" или "55.12345 37.12345"
     # (Если на сайте координаты не явные — вернём None)
-    m = re.search(r"(\d{2}\.\d+)\s*[, ]\s*(\d{2}\.\d+)", text)
+    m = COORDS_RE.search(text)
     if not m:
         return None
     lat = safe_float(m.group(1))
@@ -58,10 +174,8 @@ def guess_coords(text: str) -> Optional[List[float]]:
     # GeoJSON: [lon, lat]
     return [lon, lat]
 
-def parse_page(url: str) -> Dict[str, Any]:
-    r = requests.get(url, headers=HEADERS, timeout=25)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+def parse_html_bs4(html: str, url: str) -> Dict[str, Any]:
+    soup = BeautifulSoup(html, "html.parser")
 
     title = (soup.find("h1").get_text(" ", strip=True) if soup.find("h1") else "").strip()
     page_text = soup.get_text("\n", strip=True)
@@ -85,6 +199,17 @@ def parse_page(url: str) -> Dict[str, Any]:
         "coords": coords,
     }
 
+def parse_html(html: str, url: str, extractor: str = DEFAULT_EXTRACTOR) -> Dict[str, Any]:
+    if extractor == "stream":
+        return html_extract.extract(html, url, COORDS_RE, guess_coords)
+    return parse_html_bs4(html, url)
+
+def parse_page(url: str, session: Optional[requests.Session] = None,
+               limiter: Optional[HostRateLimiter] = None) -> Dict[str, Any]:
+    session = session or make_session(1)
+    limiter = limiter or HostRateLimiter(0)
+    return parse_html(fetch_html(url, session, limiter), url)
+
 def build_feature(url: str, data: Dict[str, Any]) -> Dict[str, Any]:
     fid = extract_id(url)
     coords = data.get("coords") or [37.6173, 55.7558]  # fallback: Москва (чтобы geojson был валидный)
@@ -102,28 +227,197 @@ def build_feature(url: str, data: Dict[str, Any]) -> Dict[str, Any]:
         "properties": props,
     }
 
-def main():
-    OUT_DIR.mkdir(exist_ok=True)
-    urls = read_sources()
-    features = []
-    errors = 0
+class UrlResult(NamedTuple):
+    feature: Dict[str, Any]
+    outcome: str  # not_modified (304) | unchanged (тот же хэш) | changed | error
+    state: Optional[PageState]  # новое состояние; None — состояние не трогаем
+    downloaded: int  # скачано байт тела
+    encoding: Optional[str]  # кодировка тела (для записи в индекс архива)
 
-    for i, url in enumerate(urls, 1):
-        try:
-            data = parse_page(url)
-            features.append(build_feature(url, data))
-        except Exception as e:
-            errors += 1
-            # всё равно добавим feature, чтобы не терять рамку
-            features.append(build_feature(url, {"title": url, "comment": f"PARSE_ERROR: {e}", "coords": None}))
-        time.sleep(0.4)
+def process_url(url: str, prev: Optional[PageState], session: requests.Session,
+                limiter: HostRateLimiter, archive: Optional[HtmlArchive],
+                args: argparse.Namespace) -> UrlResult:
+    """Одна ссылка: условный GET, архив тела, разбор при изменении. Ошибки не пробрасываем."""
+    cached = prev if prev is not None and prev.parsed is not None and not args.full else None
 
-        if i % 25 == 0:
-            print(f"[parser] processed {i}/{len(urls)}")
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
 
+    try:
+        r = fetch(url, session, limiter, headers=headers or None, retries=args.retries,
+                  backoff=args.backoff, timeout=args.timeout)
+        now = utc_now_iso()
+
+        if r.status_code == 304 and cached is not None:
+            state = replace(cached, fetched_at=now)
+            return UrlResult(build_feature(url, cached.parsed), "not_modified", state, 0, None)
+
+        body = r.content
+        encoding = r.encoding or r.apparent_encoding
+        digest = archive.put(body) if archive is not None else content_hash(body)
+        state = PageState(
+            url=url,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+            content_hash=digest,
+            fetched_at=now,
+        )
+
+        if cached is not None and cached.content_hash == digest:
+            state.parsed = cached.parsed
+            state.changed_at = cached.changed_at
+            return UrlResult(build_feature(url, cached.parsed), "unchanged", state, len(body), encoding)
+
+        state.parsed = parse_html(r.text, url, args.extractor)
+        state.changed_at = now
+        return UrlResult(build_feature(url, state.parsed), "changed", state, len(body), encoding)
+    except Exception as e:
+        # всё равно добавим feature, чтобы не терять рамку
+        feature = build_feature(url, {"title": url, "comment": f"PARSE_ERROR: {e}", "coords": None})
+        return UrlResult(feature, "error", None, 0, None)
+
+def _reparse_archived(job: Tuple[int, str, str, str, Optional[str], str]
+                      ) -> Tuple[int, Optional[Dict[str, Any]], str]:
+    """Воркер пула процессов: разбор одной страницы из архива."""
+    i, url, archive_root, digest, encoding, extractor = job
+    try:
+        body = HtmlArchive(Path(archive_root)).get(digest)
+        return i, parse_html(body.decode(encoding or "utf-8", errors="replace"), url, extractor), ""
+    except Exception as e:
+        return i, None, str(e)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Парсер рамок nerudas.ru -> GeoJSON")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                    help="сколько страниц качаем параллельно")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_HOST,
+                    help="лимит запросов в секунду на один хост (0 = без лимита)")
+    ap.add_argument("--burst", type=int, default=DEFAULT_BURST,
+                    help="сколько запросов подряд можно сделать без паузы")
+    ap.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                    help="повторы на 429/5xx и сетевых ошибках")
+    ap.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF,
+                    help="базовая пауза перед повтором, сек (удваивается)")
+    ap.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    ap.add_argument("--state", type=Path, default=STATE_FILE,
+                    help="файл состояния для инкрементального обхода")
+    ap.add_argument("--full", action="store_true",
+                    help="игнорировать сохранённое состояние: скачать и разобрать всё заново")
+    ap.add_argument("--archive", type=Path, default=ARCHIVE_DIR,
+                    help="каталог архива скачанных страниц")
+    ap.add_argument("--no-archive", action="store_true",
+                    help="не сохранять скачанные страницы в архив")
+    ap.add_argument("--reparse-from-archive", action="store_true",
+                    help="без сети: заново разобрать страницы из архива")
+    ap.add_argument("--extractor", choices=EXTRACTORS, default=DEFAULT_EXTRACTOR,
+                    help="чем разбирать страницы: bs4 (дерево) или stream (потоковый, быстрее)")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="процессов для --reparse-from-archive (по умолчанию = число ядер)")
+    return ap.parse_args(argv)
+
+def write_output(features: List[Dict[str, Any]]) -> None:
     fc = {"type": "FeatureCollection", "features": features}
     OUT_FILE.write_text(json.dumps(fc, ensure_ascii=False), encoding="utf-8")
-    print(f"[parser] done. features={len(features)} errors={errors}")
+
+def reparse_from_archive(args: argparse.Namespace) -> None:
+    """Повторный разбор всех ссылок из архива пулом процессов, без обращения к сайту."""
+    urls = read_sources()
+    started = time.monotonic()
+
+    archive = HtmlArchive(args.archive)
+    try:
+        index = archive.load_index()
+    finally:
+        archive.close()
+
+    features: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    parsed_by_url: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    jobs = []
+    for i, url in enumerate(urls):
+        if url in index:
+            digest, encoding = index[url]
+            jobs.append((i, url, str(args.archive), digest, encoding, args.extractor))
+        else:
+            features[i] = build_feature(url, {"title": url, "comment": "PARSE_ERROR: not in archive", "coords": None})
+
+    errors = len(urls) - len(jobs)
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        for i, data, error in pool.map(_reparse_archived, jobs, chunksize=chunksize):
+            url = urls[i]
+            if data is None:
+                errors += 1
+                features[i] = build_feature(url, {"title": url, "comment": f"PARSE_ERROR: {error}", "coords": None})
+                continue
+            features[i] = build_feature(url, data)
+            parsed_by_url[url] = (index[url][0], data)
+
+    # обновляем сохранённые разборы, чтобы следующий инкрементальный обход их переиспользовал
+    with PageStateStore(args.state) as store:
+        for url, state in store.load_all().items():
+            if url in parsed_by_url and parsed_by_url[url][0] == state.content_hash:
+                store.save(replace(state, parsed=parsed_by_url[url][1]))
+
+    write_output(features)
+    print(f"[parser] reparse done. features={len(features)} from_archive={len(parsed_by_url)} "
+          f"errors={errors} workers={workers} elapsed={time.monotonic() - started:.1f}s")
+    print(f"[parser] wrote: {OUT_FILE}")
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    OUT_DIR.mkdir(exist_ok=True)
+
+    if args.reparse_from_archive:
+        reparse_from_archive(args)
+        return
+
+    concurrency = max(1, args.concurrency)
+    urls = read_sources()
+    # порядок фич = порядок ссылок в nerudas_sources.txt, независимо от порядка ответов
+    features: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    outcomes: Dict[str, int] = {"not_modified": 0, "unchanged": 0, "changed": 0, "error": 0}
+    downloaded = 0
+
+    limiter = HostRateLimiter(args.rate, args.burst)
+    archive = None if args.no_archive else HtmlArchive(args.archive)
+    started = time.monotonic()
+
+    with PageStateStore(args.state) as store:
+        prev_states = store.load_all()
+
+        with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {
+                pool.submit(process_url, url, prev_states.get(url), session, limiter, archive, args): i
+                for i, url in enumerate(urls)
+            }
+            for done, fut in enumerate(as_completed(futures), 1):
+                res = fut.result()
+                features[futures[fut]] = res.feature
+                outcomes[res.outcome] += 1
+                downloaded += res.downloaded
+                if res.state is not None:
+                    store.save(res.state)
+                    if archive is not None and res.outcome != "not_modified":
+                        archive.record(res.state.url, res.state.content_hash, res.encoding, res.state.fetched_at)
+                if done % 25 == 0:
+                    store.commit()
+                    print(f"[parser] processed {done}/{len(urls)}")
+
+    if archive is not None:
+        archive.close()
+
+    write_output(features)
+    print(f"[parser] done. features={len(features)} errors={outcomes['error']} "
+          f"elapsed={time.monotonic() - started:.1f}s concurrency={concurrency}")
+    print(f"[parser] fetched={outcomes['unchanged'] + outcomes['changed']} "
+          f"not_modified={outcomes['not_modified']} "
+          f"skipped_parse={outcomes['not_modified'] + outcomes['unchanged']} "
+          f"changed={outcomes['changed']} downloaded_bytes={downloaded}")
     print(f"[parser] wrote: {OUT_FILE}")
 
 if __name__ == "__main__":
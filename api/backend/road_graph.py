@@ -0,0 +1,399 @@
+# api/backend/road_graph.py
+"""
+Граф дорог для грузовых (roads_ufo_hgv) и маршрутизация с учётом рамок.
+
+Граф:
+  - узлы — вершины линий (совпавшие до 1e-7° координаты — один узел);
+  - отрезок линии — ребро; длина — по большому кругу;
+  - односторонние дороги (oneway в OSM-тегах comment_raw или direction) — только
+    по направлению оцифровки (или против, для oneway=-1);
+  - смежность в CSR: indptr/adj_to/adj_seg/adj_w для прямого поиска и такие же
+    массивы по входящим дугам для обратного;
+  - node_comp — связная компонента узла: выгрузка сети разорвана, концы маршрута
+    подбираются в одной компоненте.
+
+Артефакт (ROADS_GRAPH_PATH) — один файл:
+  "TTRG", u32 длина заголовка, JSON-заголовок (дополнен до кратности 8),
+  массивы NumPy с выравниванием 8 байт; смещения — от начала файла.
+Загружается через np.memmap: массивы — представления поверх отображённого файла,
+процессы Passenger делят страницы через кэш ОС. Заголовок хранит sha256 исходного
+GeoJSON — если слой дорог изменился, граф пересобирается в памяти.
+
+Поиск — двунаправленный A* с усреднёнными потенциалами
+pf(v) = (h_t(v) - h_s(v)) / 2, pr = -pf (h — расстояние по большому кругу, допустимо
+и согласовано для длин по большому кругу). Рёбра из множества blocked пропускаются.
+
+  python road_graph.py [--roads map/data/roads_ufo_hgv.geojson] [--out roads_graph.bin]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import ROADS_GEOJSON_PATH, ROADS_GRAPH_PATH
+from geojson_stream import iter_features
+from road_snap import RoadSegments
+
+MAGIC = b"TTRG"
+VERSION = 1
+ALIGN = 8
+
+EARTH_RADIUS_M = 6371008.8
+COORD_SCALE = 1e7  # совпадение вершин — до 1e-7°
+
+ONEWAY_FORWARD = {"yes", "true", "1", "forward"}
+ONEWAY_BACKWARD = {"-1", "reverse", "backward"}
+
+# свойства дорог, нужные для проверки ТС (truck_check.FrameLimits)
+ROAD_LIMIT_KEYS = ("weight_limit_tons", "axle_load_tons", "hgv_access", "valid_from", "valid_to", "direction")
+
+ARRAYS = (
+    "node_lon", "node_lat", "node_comp",
+    "seg_u", "seg_v", "seg_road", "seg_len",
+    "indptr", "adj_to", "adj_seg", "adj_w",
+    "rindptr", "radj_from", "radj_seg", "radj_w",
+)
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _oneway(props: dict) -> int:
+    """+1 — только по оцифровке, -1 — только против, 0 — в обе стороны."""
+    direction = str(props.get("direction") or "").lower()
+    if direction in ONEWAY_FORWARD:
+        return 1
+    if direction in ONEWAY_BACKWARD:
+        return -1
+    try:
+        tags = json.loads(props.get("comment_raw") or "{}")
+    except ValueError:
+        return 0
+    value = str(tags.get("oneway") or "").lower() if isinstance(tags, dict) else ""
+    if value in ONEWAY_FORWARD:
+        return 1
+    if value in ONEWAY_BACKWARD:
+        return -1
+    return 0
+
+
+def _components(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Номер связной компоненты узла (без учёта направлений), union-find."""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(u.tolist(), v.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    roots = np.array([find(i) for i in range(n)], dtype=np.int64)
+    return np.unique(roots, return_inverse=True)[1].reshape(-1).astype(np.int32)
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, seg: np.ndarray, w: np.ndarray, n: int):
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32), seg[order].astype(np.int32), w[order]
+
+
+class RoadGraph:
+    def __init__(self, arrays: Dict[str, np.ndarray], roads: List[Dict[str, Any]], source_sha256: str):
+        self.arrays = arrays
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.roads = roads
+        self.source_sha256 = source_sha256
+        self._adjacency = None
+        self._segments: Optional[RoadSegments] = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_lon)
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.seg_u)
+
+    # --- сборка / артефакт ---
+
+    @classmethod
+    def build(cls, features: Sequence[dict], source_sha256: str = "") -> "RoadGraph":
+        coords_a, coords_b, owner, oneway, roads = [], [], [], [], []
+        for f in features:
+            geom = f.get("geometry") or {}
+            if geom.get("type") == "LineString":
+                lines = [geom.get("coordinates") or []]
+            elif geom.get("type") == "MultiLineString":
+                lines = geom.get("coordinates") or []
+            else:
+                continue
+            props = f.get("properties") or {}
+            n = len(roads)
+            roads.append({
+                "road_id": props.get("road_id") or f.get("id"),
+                "road_name": props.get("road_name"),
+                **{key: props.get(key) for key in ROAD_LIMIT_KEYS},
+            })
+            way = _oneway(props)
+            for line in lines:
+                pts = np.asarray(line, dtype=np.float64)
+                if pts.ndim != 2 or len(pts) < 2:
+                    continue
+                coords_a.append(pts[:-1, :2])
+                coords_b.append(pts[1:, :2])
+                owner.append(np.full(len(pts) - 1, n, dtype=np.int32))
+                oneway.append(np.full(len(pts) - 1, way, dtype=np.int8))
+
+        a = np.concatenate(coords_a) if coords_a else np.empty((0, 2))
+        b = np.concatenate(coords_b) if coords_b else np.empty((0, 2))
+        seg_road = np.concatenate(owner) if owner else np.empty(0, dtype=np.int32)
+        seg_way = np.concatenate(oneway) if oneway else np.empty(0, dtype=np.int8)
+
+        # узлы: уникальные вершины
+        keys = np.round(np.concatenate((a, b)) * COORD_SCALE).astype(np.int64)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        node_lon = unique[:, 0] / COORD_SCALE
+        node_lat = unique[:, 1] / COORD_SCALE
+        seg_u = inverse[:len(a)].astype(np.int32)
+        seg_v = inverse[len(a):].astype(np.int32)
+
+        keep = seg_u != seg_v  # вырожденные отрезки (повтор вершины)
+        seg_u, seg_v, seg_road, seg_way = seg_u[keep], seg_v[keep], seg_road[keep], seg_way[keep]
+        seg_len = haversine_m(node_lon[seg_u], node_lat[seg_u], node_lon[seg_v], node_lat[seg_v])
+
+        seg_ids = np.arange(len(seg_u), dtype=np.int32)
+        fwd = seg_way >= 0
+        bwd = seg_way <= 0
+        src = np.concatenate((seg_u[fwd], seg_v[bwd])).astype(np.int64)
+        dst = np.concatenate((seg_v[fwd], seg_u[bwd]))
+        arc_seg = np.concatenate((seg_ids[fwd], seg_ids[bwd]))
+        arc_w = np.concatenate((seg_len[fwd], seg_len[bwd]))
+
+        n = len(node_lon)
+        indptr, adj_to, adj_seg, adj_w = _csr(src, dst, arc_seg, arc_w, n)
+        rindptr, radj_from, radj_seg, radj_w = _csr(dst.astype(np.int64), src, arc_seg, arc_w, n)
+
+        arrays = {
+            "node_lon": node_lon, "node_lat": node_lat, "node_comp": _components(n, seg_u, seg_v),
+            "seg_u": seg_u, "seg_v": seg_v, "seg_road": seg_road, "seg_len": seg_len,
+            "indptr": indptr, "adj_to": adj_to, "adj_seg": adj_seg, "adj_w": adj_w,
+            "rindptr": rindptr, "radj_from": radj_from, "radj_seg": radj_seg, "radj_w": radj_w,
+        }
+        return cls(arrays, roads, source_sha256)
+
+    def save(self, path: Path) -> int:
+        parts: List[bytes] = []
+        size = 0
+        layout = {}
+        for name in ARRAYS:
+            arr = np.ascontiguousarray(self.arrays[name])
+            pad = (-size) % ALIGN
+            parts.append(b"\0" * pad)
+            size += pad
+            layout[name] = {"dtype": arr.dtype.str, "length": len(arr), "offset": size}
+            parts.append(arr.tobytes())
+            size += arr.nbytes
+
+        # смещения — от начала файла: подбираем длину заголовка, как в frames_binary.encode
+        base = 0
+        while True:
+            header = {
+                "version": VERSION,
+                "source_sha256": self.source_sha256,
+                "arrays": {k: {**v, "offset": v["offset"] + base} for k, v in layout.items()},
+                "roads": self.roads,
+            }
+            raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            raw += b" " * ((-(8 + len(raw))) % ALIGN)
+            if 8 + len(raw) == base:
+                break
+            base = 8 + len(raw)
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(MAGIC + struct.pack("<I", len(raw)) + raw)
+            fh.writelines(parts)
+        tmp.replace(path)
+        return path.stat().st_size
+
+    @classmethod
+    def load(cls, path: Path) -> "RoadGraph":
+        buf = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(buf[:4]) != MAGIC:
+            raise ValueError(f"{path}: not a road graph")
+        (header_len,) = struct.unpack("<I", bytes(buf[4:8]))
+        header = json.loads(bytes(buf[8:8 + header_len]).decode("utf-8"))
+        if header.get("version") != VERSION:
+            raise ValueError(f"{path}: unsupported version {header.get('version')}")
+        arrays = {
+            name: np.frombuffer(buf, dtype=np.dtype(spec["dtype"]), count=spec["length"], offset=spec["offset"])
+            for name, spec in header["arrays"].items()
+        }
+        return cls(arrays, header["roads"], header.get("source_sha256", ""))
+
+    # --- привязка точек ---
+
+    @property
+    def segments(self) -> RoadSegments:
+        """Индекс отрезков графа для привязки рамок (road_snap.RoadSegments)."""
+        if self._segments is None:
+            u, v = self.seg_u, self.seg_v
+            self._segments = RoadSegments(
+                self.node_lon[u], self.node_lat[u], self.node_lon[v], self.node_lat[v],
+                self.seg_road.astype(np.int64),
+                [r["road_id"] for r in self.roads], [r["road_name"] for r in self.roads],
+            )
+        return self._segments
+
+    def endpoints(self, start: Sequence[float], end: Sequence[float]) -> Tuple[int, float, int, float]:
+        """
+        Узлы для начала и конца маршрута: ближайшие узлы одной связной компоненты
+        (сеть в выгрузке разорвана), с минимальной суммой расстояний до точек.
+        Возвращает (узел начала, расстояние до него м, узел конца, расстояние м).
+        """
+        ds = haversine_m(self.node_lon, self.node_lat, start[0], start[1])
+        de = haversine_m(self.node_lon, self.node_lat, end[0], end[1])
+        n_comp = int(self.node_comp.max()) + 1
+        best_s = np.full(n_comp, np.inf)
+        best_e = np.full(n_comp, np.inf)
+        np.minimum.at(best_s, self.node_comp, ds)
+        np.minimum.at(best_e, self.node_comp, de)
+        comp = int(np.argmin(best_s + best_e))
+        in_comp = self.node_comp == comp
+        s = int(np.argmin(np.where(in_comp, ds, np.inf)))
+        e = int(np.argmin(np.where(in_comp, de, np.inf)))
+        return s, float(ds[s]), e, float(de[e])
+
+    # --- поиск ---
+
+    def _lists(self):
+        # в цикле A* индексация списков Python заметно быстрее поэлементного доступа к NumPy
+        if self._adjacency is None:
+            self._adjacency = tuple(
+                getattr(self, name).tolist()
+                for name in ("indptr", "adj_to", "adj_seg", "adj_w", "rindptr", "radj_from", "radj_seg", "radj_w")
+            )
+        return self._adjacency
+
+    def route(self, source: int, target: int, blocked: Set[int] = frozenset()
+              ) -> Optional[Tuple[List[int], List[int], float]]:
+        """(узлы, отрезки, длина м) кратчайшего пути source -> target без рёбер blocked; None — пути нет."""
+        if source == target:
+            return [source], [], 0.0
+        indptr, adj_to, adj_seg, adj_w, rindptr, radj_from, radj_seg, radj_w = self._lists()
+
+        h_t = haversine_m(self.node_lon, self.node_lat, self.node_lon[target], self.node_lat[target])
+        h_s = haversine_m(self.node_lon, self.node_lat, self.node_lon[source], self.node_lat[source])
+        pf = ((h_t - h_s) / 2.0).tolist()
+
+        inf = math.inf
+        dist = ({source: 0.0}, {target: 0.0})
+        parent: Tuple[Dict[int, Tuple[int, int]], Dict[int, Tuple[int, int]]] = ({}, {})
+        heaps = ([(pf[source], source)], [(-pf[target], target)])
+        settled: Tuple[Set[int], Set[int]] = (set(), set())
+        graph = ((indptr, adj_to, adj_seg, adj_w, 1.0), (rindptr, radj_from, radj_seg, radj_w, -1.0))
+        best, meet = inf, -1
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+
+            ptr, to, segs, weights, sign = graph[side]
+            mine, other = dist[side], dist[1 - side]
+            du = mine[u]
+            for k in range(ptr[u], ptr[u + 1]):
+                seg = segs[k]
+                if seg in blocked:
+                    continue
+                v = to[k]
+                nd = du + weights[k]
+                if nd < mine.get(v, inf):
+                    mine[v] = nd
+                    parent[side][v] = (u, seg)
+                    heapq.heappush(heaps[side], (nd + sign * pf[v], v))
+                    total = nd + other.get(v, inf)
+                    if total < best:
+                        best, meet = total, v
+
+        if meet < 0:
+            return None
+
+        nodes, segs = [meet], []
+        v = meet
+        while v != source:
+            v, seg = parent[0][v]
+            nodes.append(v)
+            segs.append(seg)
+        nodes.reverse()
+        segs.reverse()
+        v = meet
+        while v != target:
+            v, seg = parent[1][v]
+            nodes.append(v)
+            segs.append(seg)
+        return nodes, segs, float(best)
+
+
+def load_or_build(roads_path: Path = ROADS_GEOJSON_PATH, graph_path: Path = ROADS_GRAPH_PATH) -> RoadGraph:
+    """Артефакт, если он собран из текущего слоя дорог; иначе сборка в памяти."""
+    sha = file_sha256(roads_path)
+    if graph_path.exists():
+        try:
+            graph = RoadGraph.load(graph_path)
+            if graph.source_sha256 == sha:
+                return graph
+            print(f"[road_graph] {graph_path.name} собран из другой версии слоя дорог — пересобираем в памяти")
+        except (ValueError, KeyError) as exc:
+            print(f"[road_graph] {graph_path.name} не читается ({exc}) — пересобираем в памяти")
+    return RoadGraph.build(list(iter_features(roads_path)), sha)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Сборка графа дорог для /api/route")
+    ap.add_argument("--roads", type=Path, default=ROADS_GEOJSON_PATH)
+    ap.add_argument("--out", type=Path, default=ROADS_GRAPH_PATH)
+    args = ap.parse_args(argv)
+
+    started = time.perf_counter()
+    graph = RoadGraph.build(list(iter_features(args.roads)), file_sha256(args.roads))
+    size = graph.save(args.out)
+    print(f"[road_graph] узлов {graph.node_count}, отрезков {graph.segment_count}, дуг {len(graph.adj_to)}, "
+          f"{size} байт -> {args.out} ({(time.perf_counter() - started) * 1000:.0f}мс)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
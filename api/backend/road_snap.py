@@ -0,0 +1,297 @@
+# api/backend/road_snap.py
+"""
+Привязка рамок к сети дорог для грузовых (map/data/roads_ufo_hgv.geojson).
+
+Каждой рамке frames_raw ищется ближайший отрезок дороги (не дальше MAX_SNAP_M);
+результат — road_id/road_name дороги, расстояние, азимут отрезка и уверенность —
+пишется в frame_road_matches и подмешивается в слой рамок при сборке снимка,
+так что API за привязку во время запроса ничего не платит.
+
+Схема (всё векторно, без цикла по рамкам):
+  1) дороги режутся на отрезки; каждый отрезок (его bbox + MAX_SNAP_M) заносится
+     во все ячейки сетки со стороной CELL_M — упакованный индекс «ячейка -> отрезки»
+     (отсортированные ключи + searchsorted, как в spatial_index.py);
+  2) для рамки берутся отрезки её ячейки, расстояния до них считаются разом
+     в локальной равнопромежуточной проекции (как в corridor.py);
+  3) минимум по рамке — привязка; до ближайшего отрезка другой дороги — второй кандидат.
+
+Уверенность = exp(-(d/SIGMA_M)^2 / 2) * (1 - exp(-(d2 - d)/SIGMA_M)):
+падает с расстоянием до дороги и когда рядом почти так же близко другая дорога.
+
+Запускается после импорта (geojson_import.py) и после применения changeset
+на сервере (upload_sftp.py); вручную:
+
+  python road_snap.py [--roads map/data/roads_ufo_hgv.geojson]
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from config import ROADS_GEOJSON_PATH
+from corridor import M_PER_DEG, _expand_ranges
+from db import Base, engine
+from frames_merged import refresh as refresh_merged
+from generation import bump_generation
+from geojson_stream import iter_features
+from models import FrameMerged, FrameRaw, FrameRoadMatch, ensure_indexes
+
+MAX_SNAP_M = 200.0
+CELL_M = 500.0
+SIGMA_M = 25.0
+ROUND_M = 1  # знаков после запятой у расстояний
+
+
+class RoadSegments:
+    """Отрезки слоя дорог и индекс «ячейка сетки -> отрезки»."""
+
+    def __init__(self, ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray, owner: np.ndarray,
+                 road_ids: List[Any], road_names: List[Optional[str]],
+                 max_m: float = MAX_SNAP_M, cell_m: float = CELL_M):
+        """Отрезки i: (ax[i], ay[i]) -> (bx[i], by[i]) дороги owner[i]."""
+        self.ax, self.ay, self.bx, self.by = ax, ay, bx, by
+        self.owner = owner
+        self.road_ids = road_ids
+        self.road_names = road_names
+        self.max_m = max_m
+        self._build_index(cell_m)
+
+    @classmethod
+    def from_features(cls, features: List[dict], **kwargs) -> "RoadSegments":
+        ax, ay, bx, by, owner = [], [], [], [], []
+        road_ids: List[Any] = []
+        road_names: List[Optional[str]] = []
+        for f in features:
+            geom = f.get("geometry") or {}
+            if geom.get("type") == "LineString":
+                lines = [geom.get("coordinates") or []]
+            elif geom.get("type") == "MultiLineString":
+                lines = geom.get("coordinates") or []
+            else:
+                continue
+            props = f.get("properties") or {}
+            n = len(road_ids)
+            road_ids.append(props.get("road_id") or f.get("id"))
+            road_names.append(props.get("road_name"))
+            for line in lines:
+                pts = np.asarray(line, dtype=np.float64)
+                if pts.ndim != 2 or len(pts) < 2:
+                    continue
+                ax.append(pts[:-1, 0])
+                ay.append(pts[:-1, 1])
+                bx.append(pts[1:, 0])
+                by.append(pts[1:, 1])
+                owner.append(np.full(len(pts) - 1, n, dtype=np.int64))
+
+        def cat(parts, dtype=np.float64):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return cls(cat(ax), cat(ay), cat(bx), cat(by), cat(owner, np.int64), road_ids, road_names, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ax)
+
+    def _build_index(self, cell_m: float) -> None:
+        n = len(self)
+        self.cell_lat = cell_m / M_PER_DEG
+        if n == 0:
+            self.cell_lon, self.min_lon, self.min_lat, self.nx = 1.0, 0.0, 0.0, 1
+            self._keys = np.empty(0, dtype=np.int64)
+            self._segs = np.empty(0, dtype=np.int64)
+            return
+
+        max_abs_lat = min(float(np.abs(np.concatenate((self.ay, self.by))).max()) + 1.0, 89.0)
+        self.cell_lon = cell_m / (M_PER_DEG * math.cos(math.radians(max_abs_lat)))
+        pad_lat = self.max_m / M_PER_DEG
+        pad_lon = self.max_m / (M_PER_DEG * math.cos(math.radians(max_abs_lat)))
+
+        min_lon = np.minimum(self.ax, self.bx) - pad_lon
+        max_lon = np.maximum(self.ax, self.bx) + pad_lon
+        min_lat = np.minimum(self.ay, self.by) - pad_lat
+        max_lat = np.maximum(self.ay, self.by) + pad_lat
+        self.min_lon = float(min_lon.min())
+        self.min_lat = float(min_lat.min())
+        self.nx = int((float(max_lon.max()) - self.min_lon) // self.cell_lon) + 1
+
+        cx0 = ((min_lon - self.min_lon) // self.cell_lon).astype(np.int64)
+        cx1 = ((max_lon - self.min_lon) // self.cell_lon).astype(np.int64)
+        cy0 = ((min_lat - self.min_lat) // self.cell_lat).astype(np.int64)
+        cy1 = ((max_lat - self.min_lat) // self.cell_lat).astype(np.int64)
+
+        # каждый отрезок — во все ячейки своего прямоугольника: сначала строки, потом столбцы
+        wx, wy = cx1 - cx0 + 1, cy1 - cy0 + 1
+        seg = np.repeat(np.arange(n, dtype=np.int64), wx * wy)
+        k = _expand_ranges(np.zeros(n, dtype=np.int64), wx * wy)
+        cx = cx0[seg] + k % wx[seg]
+        cy = cy0[seg] + k // wx[seg]
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._segs = seg[order]
+
+    def snap(self, lon: np.ndarray, lat: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Ближайший отрезок для каждой точки. Возвращает массивы длины len(lon):
+        segment (номер отрезка, -1 — нет в пределах max_m), road (номер дороги),
+        distance_m, bearing_deg, confidence.
+        """
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        n = len(lon)
+        result = {
+            "segment": np.full(n, -1, dtype=np.int64),
+            "road": np.full(n, -1, dtype=np.int64),
+            "distance_m": np.full(n, np.nan),
+            "bearing_deg": np.full(n, np.nan),
+            "confidence": np.full(n, np.nan),
+        }
+        valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+        if len(self) == 0 or valid.size == 0:
+            return result
+
+        # 1) кандидаты: отрезки из ячейки точки
+        cx = ((lon[valid] - self.min_lon) // self.cell_lon).astype(np.int64)
+        cy = ((lat[valid] - self.min_lat) // self.cell_lat).astype(np.int64)
+        inside = (cx >= 0) & (cx < self.nx) & (cy >= 0)
+        valid, cx, cy = valid[inside], cx[inside], cy[inside]
+        keys = cy * self.nx + cx
+        starts = np.searchsorted(self._keys, keys, side="left")
+        counts = np.searchsorted(self._keys, keys, side="right") - starts
+        has = counts > 0
+        valid, starts, counts = valid[has], starts[has], counts[has]
+        if valid.size == 0:
+            return result
+        pt = np.repeat(valid, counts)
+        seg = self._segs[_expand_ranges(starts, counts)]
+
+        # 2) расстояние точка — отрезок
+        k = np.cos(np.radians(lat[pt])) * M_PER_DEG
+        sx = (self.bx[seg] - self.ax[seg]) * k
+        sy = (self.by[seg] - self.ay[seg]) * M_PER_DEG
+        dx = (lon[pt] - self.ax[seg]) * k
+        dy = (lat[pt] - self.ay[seg]) * M_PER_DEG
+        l2 = sx * sx + sy * sy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip(np.where(l2 > 0, (dx * sx + dy * sy) / l2, 0.0), 0.0, 1.0)
+        dist = np.hypot(dx - t * sx, dy - t * sy)
+
+        # 3) минимум по точке (пары идут группами по точке — pt не убывает)
+        group_starts = np.flatnonzero(np.r_[True, pt[1:] != pt[:-1]])
+        group_pt = pt[group_starts]
+        sizes = np.diff(np.append(group_starts, len(pt)))
+        best = np.minimum.reduceat(dist, group_starts)
+        is_best = dist == np.repeat(best, sizes)
+        best_pos = np.flatnonzero(is_best)
+        _, first = np.unique(pt[best_pos], return_index=True)
+        best_pos = best_pos[first]
+        best_road = self.owner[seg[best_pos]]
+
+        # второй кандидат — ближайший отрезок другой дороги
+        other = np.where(self.owner[seg] != np.repeat(best_road, sizes), dist, np.inf)
+        second = np.minimum.reduceat(other, group_starts)
+
+        ok = best <= self.max_m
+        rows = group_pt[ok]
+        d1 = best[ok]
+        d2 = np.minimum(second[ok], self.max_m * 2)
+        bp = best_pos[ok]
+        result["segment"][rows] = seg[bp]
+        result["road"][rows] = best_road[ok]
+        result["distance_m"][rows] = np.round(d1, ROUND_M)
+        # азимут отрезка (по оцифровке дороги): 0 — север, по часовой
+        result["bearing_deg"][rows] = np.round(np.degrees(np.arctan2(sx[bp], sy[bp])) % 360.0, 1)
+        conf = np.exp(-0.5 * (d1 / SIGMA_M) ** 2) * (1.0 - np.exp(-(d2 - d1) / SIGMA_M))
+        result["confidence"][rows] = np.round(conf, 3)
+        return result
+
+
+def load_segments(path: Path = ROADS_GEOJSON_PATH) -> RoadSegments:
+    return RoadSegments.from_features(list(iter_features(path)))
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+FrameCoords = Tuple[str, Optional[str], Optional[float], Optional[float]]
+
+
+def snap_rows(roads: RoadSegments, frames: List[FrameCoords]) -> List[Dict[str, Any]]:
+    """[(external_id, frame_id, lon, lat)] -> строки frame_road_matches (только привязанные рамки)."""
+    lon = np.array([np.nan if f[2] is None else f[2] for f in frames], dtype=np.float64)
+    lat = np.array([np.nan if f[3] is None else f[3] for f in frames], dtype=np.float64)
+    snapped = roads.snap(lon, lat)
+    rows = []
+    for i in np.flatnonzero(snapped["road"] >= 0).tolist():
+        road = int(snapped["road"][i])
+        rows.append({
+            "external_id": frames[i][0],
+            "frame_id": frames[i][1],
+            "road_id": roads.road_ids[road],
+            "road_name": roads.road_names[road],
+            "distance_m": _none_if_nan(snapped["distance_m"][i]),
+            "bearing_deg": _none_if_nan(snapped["bearing_deg"][i]),
+            "confidence": _none_if_nan(snapped["confidence"][i]),
+        })
+    return rows
+
+
+def refresh_matches(conn, roads: RoadSegments) -> Dict[str, int]:
+    """
+    Пересчитывает привязку всех рамок в текущей транзакции соединения.
+    Поколение данных увеличивается (и слой frames_merged пересчитывается), только если привязка изменилась.
+    """
+    frames = conn.execute(
+        select(FrameRaw.external_id, FrameRaw.frame_id, FrameRaw.lon, FrameRaw.lat).order_by(FrameRaw.external_id)
+    ).all()
+    rows = snap_rows(roads, [tuple(f) for f in frames])
+
+    columns = [c.name for c in FrameRoadMatch.__table__.columns]
+    old = {r.external_id: tuple(r) for r in conn.execute(select(*FrameRoadMatch.__table__.columns))}
+    new = {r["external_id"]: tuple(r[c] for c in columns) for r in rows}
+    changed = {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+    if changed:
+        conn.execute(delete(FrameRoadMatch))
+        if rows:
+            conn.execute(insert(FrameRoadMatch), rows)
+        # дорога из привязки входит в слой — пересчитываем только рамки, у которых она сменилась
+        frame_index = columns.index("frame_id")
+        frame_ids = {rows_by_key[k][frame_index] for rows_by_key in (old, new) for k in changed if k in rows_by_key}
+        refresh_merged(conn, frame_ids)
+        bump_generation(conn)
+    return {"frames": len(frames), "matched": len(rows), "changed": len(changed)}
+
+
+def run(roads_path: Path = ROADS_GEOJSON_PATH) -> Dict[str, int]:
+    started = time.perf_counter()
+    roads = load_segments(roads_path)
+    Base.metadata.create_all(bind=engine, tables=[FrameRoadMatch.__table__, FrameMerged.__table__])
+    ensure_indexes(engine)
+    with engine.begin() as conn:
+        stats = refresh_matches(conn, roads)
+    stats["segments"] = len(roads)
+    stats["ms"] = round((time.perf_counter() - started) * 1000)
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Привязка рамок к ближайшему отрезку дорог для грузовых")
+    ap.add_argument("--roads", type=Path, default=ROADS_GEOJSON_PATH)
+    args = ap.parse_args(argv)
+    if not args.roads.exists():
+        raise SystemExit(f"[road_snap] нет слоя дорог {args.roads}")
+    stats = run(args.roads)
+    print(f"[road_snap] рамок {stats['frames']}, привязано {stats['matched']}, отрезков {stats['segments']}, "
+          f"{'обновлено' if stats['changed'] else 'без изменений'}, {stats['ms']} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# api/backend/sftp_publish.py
+"""
+Общие куски публикации на хостинг по SFTP (upload_sftp.py, upload_api_sftp.py).
+
+  - одно SSH-соединение на запуск (SFTP + exec, если хостинг его разрешает);
+  - манифест <remote_dir>/.publish_manifest.json: sha256 каждого опубликованного
+    файла — неизменившиеся файлы не грузим;
+  - put_atomic: загрузка во временное имя и posix-rename поверх старого файла,
+    так что сервер никогда не видит наполовину записанный файл.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import paramiko
+
+MANIFEST_NAME = ".publish_manifest.json"
+HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def connect() -> paramiko.SSHClient:
+    """SSH-клиент по переменным окружения SFTP_HOST/SFTP_PORT/SFTP_USER/SFTP_PASSWORD."""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(
+        os.environ["SFTP_HOST"],
+        port=int(os.environ.get("SFTP_PORT") or 22),
+        username=os.environ["SFTP_USER"],
+        password=os.environ["SFTP_PASSWORD"],
+    )
+    return ssh
+
+
+def remote_exists(sftp: paramiko.SFTPClient, path: str) -> bool:
+    try:
+        sftp.stat(path)
+        return True
+    except IOError:
+        return False
+
+
+def put_atomic(sftp: paramiko.SFTPClient, local_path: Path, remote_path: str) -> None:
+    """Загрузка во временный файл рядом с целевым и атомарная замена."""
+    tmp = f"{remote_path}.tmp-{os.getpid()}"
+    try:
+        sftp.put(str(local_path), tmp)
+        sftp.posix_rename(tmp, remote_path)
+    except BaseException:
+        try:
+            sftp.remove(tmp)
+        except IOError:
+            pass
+        raise
+
+
+def run_remote(ssh: paramiko.SSHClient, remote_dir: str, *argv: str) -> Tuple[Optional[int], str]:
+    """
+    Выполняет команду в remote_dir. Возвращает (код выхода, вывод);
+    код None — exec на хостинге недоступен (только SFTP).
+    """
+    command = f"cd {shlex.quote(remote_dir)} && " + " ".join(shlex.quote(a) for a in argv)
+    try:
+        _stdin, stdout, stderr = ssh.exec_command(command, timeout=300)
+        output = stdout.read().decode("utf-8", "replace") + stderr.read().decode("utf-8", "replace")
+        return stdout.channel.recv_exit_status(), output.strip()
+    except paramiko.SSHException as e:
+        return None, str(e)
+
+
+class RemoteManifest:
+    """{имя файла: {"sha256": ..., ...}} в remote_dir/.publish_manifest.json"""
+
+    def __init__(self, sftp: paramiko.SFTPClient, remote_dir: str):
+        self.sftp = sftp
+        self.path = posixpath.join(remote_dir, MANIFEST_NAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            with sftp.open(self.path, "r") as fh:
+                self.entries = json.loads(fh.read().decode("utf-8"))
+        except (IOError, ValueError):
+            self.entries = {}  # первый запуск или битый манифест — всё считаем изменившимся
+
+    def get(self, name: str) -> Dict[str, Any]:
+        return self.entries.get(name) or {}
+
+    def unchanged(self, name: str, sha256: str) -> bool:
+        return self.get(name).get("sha256") == sha256
+
+    def set(self, name: str, **fields: Any) -> None:
+        self.entries[name] = fields
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+        with self.sftp.open(tmp, "w") as fh:
+            fh.write(json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8"))
+        self.sftp.posix_rename(tmp, self.path)
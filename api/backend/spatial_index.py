@@ -0,0 +1,117 @@
+# api/backend/spatial_index.py
+"""
+Пространственный индекс по точкам рамок.
+
+Упакованная равномерная сетка: точки отсортированы по номеру ячейки
+(строка за строкой), поэтому ячейки одной строки сетки лежат в массиве
+непрерывным куском и bbox-запрос — это пара searchsorted на строку
+плюс точная проверка координат. Индекс неизменяемый, его пересобирают
+на каждое поколение данных.
+"""
+from __future__ import annotations
+
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Сколько точек в среднем хотим видеть в одной ячейке
+TARGET_POINTS_PER_CELL = 8
+MIN_CELL_DEG = 0.01
+
+
+class GridIndex:
+    def __init__(self, lon: Sequence[Optional[float]], lat: Sequence[Optional[float]],
+                 cell_deg: Optional[float] = None):
+        lon_arr = np.asarray(lon, dtype=np.float64)
+        lat_arr = np.asarray(lat, dtype=np.float64)
+        valid = np.isfinite(lon_arr) & np.isfinite(lat_arr)
+        ids = np.flatnonzero(valid)
+        lon_arr = lon_arr[ids]
+        lat_arr = lat_arr[ids]
+
+        self.size = int(ids.size)
+        if self.size == 0:
+            self.min_lon = self.min_lat = 0.0
+            self.cell = 1.0
+            self.nx = self.ny = 1
+            self._cells = np.empty(0, dtype=np.int64)
+            self._ids = ids
+            self._lon = lon_arr
+            self._lat = lat_arr
+            return
+
+        self.min_lon = float(lon_arr.min())
+        self.min_lat = float(lat_arr.min())
+        span_lon = float(lon_arr.max()) - self.min_lon
+        span_lat = float(lat_arr.max()) - self.min_lat
+
+        if cell_deg is None:
+            cells_wanted = max(1.0, self.size / TARGET_POINTS_PER_CELL)
+            cell_deg = math.sqrt(max(span_lon * span_lat, 1e-12) / cells_wanted)
+        self.cell = max(float(cell_deg), MIN_CELL_DEG)
+        self.nx = int(span_lon // self.cell) + 1
+        self.ny = int(span_lat // self.cell) + 1
+
+        cells = self._cell_xy(lon_arr, lat_arr)
+        order = np.argsort(cells, kind="stable")
+        self._cells = cells[order]
+        self._ids = ids[order]
+        self._lon = lon_arr[order]
+        self._lat = lat_arr[order]
+
+    def _cell_xy(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        cx = np.clip(((lon - self.min_lon) // self.cell).astype(np.int64), 0, self.nx - 1)
+        cy = np.clip(((lat - self.min_lat) // self.cell).astype(np.int64), 0, self.ny - 1)
+        return cy * self.nx + cx
+
+    def query_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                   limit: Optional[int] = None) -> np.ndarray:
+        """
+        Номера точек (позиции во входных массивах), попавших в bbox,
+        по возрастанию — т.е. в исходном порядке фич.
+        """
+        if self.size == 0 or min_lon > max_lon or min_lat > max_lat:
+            return np.empty(0, dtype=np.int64)
+
+        cx0 = int((min_lon - self.min_lon) // self.cell)
+        cx1 = int((max_lon - self.min_lon) // self.cell)
+        cy0 = int((min_lat - self.min_lat) // self.cell)
+        cy1 = int((max_lat - self.min_lat) // self.cell)
+        if cx1 < 0 or cy1 < 0 or cx0 >= self.nx or cy0 >= self.ny:
+            return np.empty(0, dtype=np.int64)
+        cx0, cx1 = max(cx0, 0), min(cx1, self.nx - 1)
+        cy0, cy1 = max(cy0, 0), min(cy1, self.ny - 1)
+
+        rows = np.arange(cy0, cy1 + 1, dtype=np.int64) * self.nx
+        starts = np.searchsorted(self._cells, rows + cx0, side="left")
+        ends = np.searchsorted(self._cells, rows + cx1, side="right")
+
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # склеиваем диапазоны [start, end) всех строк без цикла на Python
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(total, dtype=np.int64)
+
+        lon = self._lon[positions]
+        lat = self._lat[positions]
+        inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        result = np.sort(self._ids[positions[inside]])
+        if limit is not None:
+            result = result[:limit]
+        return result
+
+
+def parse_bbox(text: Optional[str]):
+    """'minLon,minLat,maxLon,maxLat' -> кортеж float; ValueError на мусор."""
+    if not text:
+        return None
+    parts = [float(p) for p in text.split(",")]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox min must not exceed max")
+    return min_lon, min_lat, max_lon, max_lat
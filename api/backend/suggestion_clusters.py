@@ -0,0 +1,233 @@
+# api/backend/suggestion_clusters.py
+"""
+Группировка предложений новых рамок по близости.
+
+После появления рамки на трассе водители присылают пачку new_frame-предложений
+с немного разными координатами. Здесь они собираются в группы (suggestion_clusters),
+чтобы модератор разбирал группу целиком:
+
+  - предложение попадает в ближайшую группу, если до её центра не больше radius_m,
+    иначе открывает новую; центр — среднее координат участников;
+  - поиск групп — по сетке с ячейкой в радиус: кандидаты только из 3x3 соседних ячеек;
+  - каждая изменившаяся группа сопоставляется с ближайшей рамкой frames_raw
+    (не дальше match_m) — «о какой рамке, вероятно, речь».
+
+Обработка инкрементальная: в suggestion_cluster_state хранится последний
+обработанный id, каждый проход читает только новые предложения и только группы
+рядом с ними. Запускается очередью записи после каждой пачки предложений
+(suggestion_queue.py) и вручную / по cron:
+
+  python suggestion_clusters.py              # догнать новые предложения
+  python suggestion_clusters.py --rebuild    # пересчитать всё (например, с другим радиусом)
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, delete, or_, select, update
+
+from config import SUGGESTION_CLUSTER_RADIUS_M, SUGGESTION_MATCH_RADIUS_M
+from corridor import M_PER_DEG
+from db import Base, SessionLocal, engine
+from models import (
+    FrameRaw, FrameSuggestion, SuggestionCluster, SuggestionClusterMember, SuggestionClusterState,
+    ensure_indexes,
+)
+from spatial_index import GridIndex
+
+STATE_ROW_ID = 1
+MATCH_BOX_CHUNK = 100  # окрестностей групп в одном запросе к frames_raw (по 4 параметра)
+
+
+def _distance_m(lon1, lat1, lon2, lat2):
+    """Расстояние в локальной равнопромежуточной проекции (на радиусах в сотни метров точнее не нужно)."""
+    kx = np.cos(np.radians((np.asarray(lat1) + lat2) / 2.0)) * M_PER_DEG
+    return np.hypot((np.asarray(lon1) - lon2) * kx, (np.asarray(lat1) - lat2) * M_PER_DEG)
+
+
+class _Grid:
+    """Группы по ячейкам размером не меньше радиуса в обе стороны."""
+
+    def __init__(self, radius_m: float, max_abs_lat: float):
+        self.cell_lat = radius_m / M_PER_DEG
+        self.cell_lon = radius_m / (M_PER_DEG * math.cos(math.radians(min(max_abs_lat, 89.0))))
+        self.cells: Dict[Tuple[int, int], List[SuggestionCluster]] = {}
+
+    def key(self, lon: float, lat: float) -> Tuple[int, int]:
+        return int(lon // self.cell_lon), int(lat // self.cell_lat)
+
+    def add(self, cluster: SuggestionCluster) -> None:
+        self.cells.setdefault(self.key(cluster.lon, cluster.lat), []).append(cluster)
+
+    def remove(self, cluster: SuggestionCluster) -> None:
+        self.cells[self.key(cluster.lon, cluster.lat)].remove(cluster)
+
+    def near(self, lon: float, lat: float) -> List[SuggestionCluster]:
+        cx, cy = self.key(lon, lat)
+        return [c for dx in (-1, 0, 1) for dy in (-1, 0, 1) for c in self.cells.get((cx + dx, cy + dy), ())]
+
+
+def _match_frames(db, clusters: List[SuggestionCluster], match_m: float) -> None:
+    """
+    Ближайшая рамка frames_raw к центру каждой группы.
+    Читаются только рамки в окрестности групп (индекс по lat), а не вся таблица:
+    проход идёт в потоке записи предложений после каждой пачки.
+    """
+    pad_lat = match_m / M_PER_DEG
+    boxes = []
+    for cluster in clusters:
+        pad_lon = match_m / (M_PER_DEG * math.cos(math.radians(min(abs(cluster.lat) + pad_lat, 89.0))))
+        boxes.append((cluster.lon - pad_lon, cluster.lat - pad_lat, cluster.lon + pad_lon, cluster.lat + pad_lat))
+
+    found = {}
+    for i in range(0, len(boxes), MATCH_BOX_CHUNK):
+        near = or_(*(
+            and_(FrameRaw.lat.between(lat0, lat1), FrameRaw.lon.between(lon0, lon1))
+            for lon0, lat0, lon1, lat1 in boxes[i:i + MATCH_BOX_CHUNK]
+        ))
+        for row in db.execute(select(FrameRaw.id, FrameRaw.frame_id, FrameRaw.lon, FrameRaw.lat).where(near)):
+            found[row[0]] = row
+    rows = [found[row_id] for row_id in sorted(found)]  # при равных расстояниях — рамка с меньшим id, как раньше
+
+    frame_ids = [r[1] for r in rows]
+    lon = np.array([r[2] for r in rows], dtype=np.float64)
+    lat = np.array([r[3] for r in rows], dtype=np.float64)
+    index = GridIndex(lon, lat) if rows else None
+
+    for cluster, (lon0, lat0, lon1, lat1) in zip(clusters, boxes):
+        cand = index.query_bbox(lon0, lat0, lon1, lat1) if index is not None else np.empty(0, dtype=np.int64)
+        cluster.frame_id = None
+        cluster.frame_distance_m = None
+        if cand.size:
+            dist = _distance_m(lon[cand], lat[cand], cluster.lon, cluster.lat)
+            best = int(np.argmin(dist))
+            if dist[best] <= match_m:
+                cluster.frame_id = frame_ids[int(cand[best])]
+                cluster.frame_distance_m = round(float(dist[best]), 1)
+
+
+def cluster_new_suggestions(db, radius_m: float = SUGGESTION_CLUSTER_RADIUS_M,
+                            match_m: float = SUGGESTION_MATCH_RADIUS_M) -> Dict[str, int]:
+    """
+    Один инкрементальный проход в текущей транзакции (commit делает вызывающий).
+    Если радиус сменился — группы пересобираются с нуля.
+    """
+    # сначала пишем: транзакция сразу берёт блокировку записи, и параллельный проход
+    # (cron и очередь) ждёт её, а потом читает уже сдвинутую отметку, а не ту же самую
+    db.execute(update(SuggestionClusterState).where(SuggestionClusterState.id == STATE_ROW_ID)
+               .values(last_suggestion_id=SuggestionClusterState.last_suggestion_id))
+    state = db.get(SuggestionClusterState, STATE_ROW_ID)
+    if state is None or state.radius_m != radius_m:
+        db.execute(delete(SuggestionClusterMember))
+        db.execute(delete(SuggestionCluster))
+        if state is None:
+            state = SuggestionClusterState(id=STATE_ROW_ID, last_suggestion_id=0, radius_m=radius_m)
+            db.add(state)
+        state.last_suggestion_id = 0
+        state.radius_m = radius_m
+
+    new = db.execute(
+        select(FrameSuggestion.id, FrameSuggestion.type, FrameSuggestion.suggested_lon,
+               FrameSuggestion.suggested_lat, FrameSuggestion.created_at)
+        .where(FrameSuggestion.id > state.last_suggestion_id)
+        .order_by(FrameSuggestion.id)
+    ).all()
+    if not new:
+        return {"suggestions": 0, "clusters_touched": 0, "clusters_created": 0}
+    # отметку двигают все предложения, группируются только новые рамки с координатами
+    state.last_suggestion_id = new[-1][0]
+    points = [
+        (sid, lon, lat, created_at) for sid, kind, lon, lat, created_at in new
+        if kind == "new_frame" and lon is not None and lat is not None
+    ]
+    if not points:
+        db.flush()
+        return {"suggestions": len(new), "clusters_touched": 0, "clusters_created": 0}
+
+    lons = np.array([p[1] for p in points], dtype=np.float64)
+    lats = np.array([p[2] for p in points], dtype=np.float64)
+    pad_lat = radius_m / M_PER_DEG
+    max_abs_lat = float(np.abs(lats).max()) + pad_lat
+    grid = _Grid(radius_m, max_abs_lat)
+    pad_lon = grid.cell_lon
+
+    # существующие группы — только рядом с новыми точками (индекс по lon, lat)
+    for cluster in db.execute(
+        select(SuggestionCluster).where(
+            SuggestionCluster.lon.between(float(lons.min()) - pad_lon, float(lons.max()) + pad_lon),
+            SuggestionCluster.lat.between(float(lats.min()) - pad_lat, float(lats.max()) + pad_lat),
+        )
+    ).scalars():
+        grid.add(cluster)
+
+    touched: Dict[int, SuggestionCluster] = {}
+    created = 0
+    members: List[Tuple[int, SuggestionCluster]] = []
+    for suggestion_id, lon, lat, created_at in points:
+        best: Optional[SuggestionCluster] = None
+        best_dist = radius_m
+        for cluster in grid.near(lon, lat):
+            dist = float(_distance_m(cluster.lon, cluster.lat, lon, lat))
+            if dist <= best_dist:
+                best, best_dist = cluster, dist
+
+        if best is None:
+            best = SuggestionCluster(lon=lon, lat=lat, size=1, first_created_at=created_at, last_created_at=created_at)
+            db.add(best)
+            grid.add(best)
+            created += 1
+        else:
+            grid.remove(best)
+            size = best.size + 1
+            best.lon = best.lon + (lon - best.lon) / size
+            best.lat = best.lat + (lat - best.lat) / size
+            best.size = size
+            best.last_created_at = created_at
+            grid.add(best)
+        touched[id(best)] = best
+        members.append((suggestion_id, best))
+
+    _match_frames(db, list(touched.values()), match_m)
+    db.flush()  # id новых групп
+    db.add_all(SuggestionClusterMember(suggestion_id=sid, cluster_id=c.id) for sid, c in members)
+    db.flush()
+    return {"suggestions": len(new), "clusters_touched": len(touched), "clusters_created": created}
+
+
+def run_once(radius_m: float = SUGGESTION_CLUSTER_RADIUS_M, match_m: float = SUGGESTION_MATCH_RADIUS_M,
+             rebuild: bool = False) -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        if rebuild:
+            db.execute(delete(SuggestionClusterState))
+        stats = cluster_new_suggestions(db, radius_m, match_m)
+        db.commit()
+        return stats
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Группировка предложений новых рамок по близости")
+    ap.add_argument("--radius", type=float, default=SUGGESTION_CLUSTER_RADIUS_M, help="радиус группы, м")
+    ap.add_argument("--match", type=float, default=SUGGESTION_MATCH_RADIUS_M, help="радиус сопоставления с рамкой, м")
+    ap.add_argument("--rebuild", action="store_true", help="пересчитать все группы заново")
+    args = ap.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
+    stats = run_once(args.radius, args.match, args.rebuild)
+    print(f"[clusters] предложений {stats['suggestions']}, групп затронуто {stats['clusters_touched']}, "
+          f"новых {stats['clusters_created']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# api/backend/suggestion_queue.py
+"""
+Очередь записи предложений водителей (write-behind).
+
+Запрос проверяет данные сам и кладёт готовые строки frame_suggestions в очередь;
+фоновый поток пишет их пачками — одна транзакция (один fsync) на пачку,
+а не на каждое предложение. Пачка уходит, когда набралось FLUSH_ROWS строк
+или самая старая строка ждёт дольше FLUSH_INTERVAL_S.
+
+  - submit(rows, track) -> Ticket: строки одного запроса попадают в одну пачку целиком;
+  - Ticket.wait(timeout): дождаться записи (одиночные предложения ждут, чтобы вернуть
+    id с 201; пакетный запрос — нет, сразу 202 с тикетом);
+  - cancel(ticket): убрать из очереди ещё не взятый в запись тикет (одиночный запрос
+    не дождался — отвечает ошибкой, и строка точно не будет записана позже);
+  - QueueFull: в очереди уже MAX_PENDING строк — запрос надо отклонить (503),
+    а не копить неограниченно в памяти;
+  - lookup(ticket_id): состояние тикета. Итог отслеживаемых (track=True, пакетных)
+    тикетов пишется в suggestion_tickets той же транзакцией, что и пачка, — на опрос
+    отвечает любой процесс Passenger, и после перезапуска тоже. Тикет, которого ещё нет
+    нигде, но выданный меньше QUEUED_GRACE_S назад, ждёт записи в другом процессе.
+
+Очередь живёт в памяти процесса: при штатной остановке она дописывается (atexit),
+при падении процесса невзятые в запись строки теряются (тикет так и остаётся неизвестным).
+
+После пачки с новыми рамками поток же догоняет их группировку (suggestion_clusters.py).
+Поток запускается при первой записи — после fork (Passenger) у каждого процесса свой.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, List, Optional
+
+from sqlalchemy import delete, insert, select
+
+from db import SessionLocal
+from models import FrameSuggestion, SuggestionTicket
+from suggestion_clusters import run_once as cluster_suggestions
+
+FLUSH_ROWS = 200
+FLUSH_INTERVAL_S = 0.05
+MAX_PENDING = 10000
+TICKETS_KEPT = 10000
+TICKET_TTL = timedelta(days=7)  # сколько хранить итоги тикетов в suggestion_tickets
+QUEUED_GRACE_S = 60.0
+
+QUEUED, STORED, FAILED = "queued", "stored", "failed"
+
+
+class QueueFull(Exception):
+    """В очереди нет места — клиенту стоит повторить позже."""
+
+
+def _new_ticket_id() -> str:
+    # первые 12 hex — время выдачи в мс: по нему другой процесс отличит «ещё в очереди» от неизвестного
+    return f"{time.time_ns() // 1_000_000:012x}{uuid.uuid4().hex[:20]}"
+
+
+def _ticket_age_s(ticket_id: str) -> Optional[float]:
+    try:
+        return time.time() - int(ticket_id[:12], 16) / 1000
+    except ValueError:
+        return None
+
+
+class Ticket:
+    """Строки одного запроса и судьба их записи."""
+
+    def __init__(self, rows: List[dict], track: bool = False):
+        self.id = _new_ticket_id()
+        self.track = track
+        self.rows = rows
+        self.status = QUEUED
+        self.suggestion_ids: List[int] = []
+        self.error: Optional[str] = None
+        self.enqueued_at = time.monotonic()
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def finish(self, status: str, suggestion_ids: List[int] = (), error: Optional[str] = None) -> None:
+        self.status = status
+        self.suggestion_ids = list(suggestion_ids)
+        self.error = error
+        self.rows = []  # строки больше не нужны, в тикете остаётся только итог
+        self._done.set()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "suggestion_ids": self.suggestion_ids,
+            "error": self.error,
+        }
+
+
+class SuggestionQueue:
+    def __init__(self, flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL_S,
+                 max_pending: int = MAX_PENDING):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Deque[Ticket] = deque()
+        self._pending_rows = 0
+        self._tickets: "OrderedDict[str, Ticket]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.batches = 0
+        self.rows_written = 0
+        self.rejected = 0
+
+    # --- приём ---
+
+    def submit(self, rows: List[dict], track: bool = False) -> Ticket:
+        ticket = Ticket(rows, track)
+        with self._cond:
+            if self._pending_rows + len(rows) > self.max_pending:
+                self.rejected += len(rows)
+                raise QueueFull(f"suggestion queue is full ({self._pending_rows} pending)")
+            self._ensure_thread()
+            self._queue.append(ticket)
+            self._pending_rows += len(rows)
+            self._tickets[ticket.id] = ticket
+            while len(self._tickets) > TICKETS_KEPT:
+                self._tickets.popitem(last=False)
+            self._cond.notify()
+        return ticket
+
+    def cancel(self, ticket: Ticket) -> bool:
+        """Убирает тикет из очереди, если его ещё не взяли в запись (True — строки записаны не будут)."""
+        with self._cond:
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                return False
+            self._pending_rows -= len(ticket.rows)
+        ticket.finish(FAILED, error="cancelled")
+        return True
+
+    def lookup(self, ticket_id: str) -> Optional[dict]:
+        """Состояние тикета: из памяти этого процесса, из suggestion_tickets или «ещё в очереди»."""
+        with self._cond:
+            ticket = self._tickets.get(ticket_id)
+        if ticket is not None:
+            return ticket.to_dict()
+
+        db = SessionLocal()
+        try:
+            row = db.execute(select(SuggestionTicket).where(SuggestionTicket.id == ticket_id)).scalar()
+        finally:
+            db.close()
+        if row is not None:
+            return {
+                "id": row.id,
+                "status": row.status,
+                "suggestion_ids": json.loads(row.suggestion_ids or "[]"),
+                "error": row.error,
+            }
+
+        age = _ticket_age_s(ticket_id)
+        if age is not None and -QUEUED_GRACE_S < age < QUEUED_GRACE_S:
+            return {"id": ticket_id, "status": QUEUED, "suggestion_ids": [], "error": None}
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending_rows": self._pending_rows,
+                "max_pending": self.max_pending,
+                "batches": self.batches,
+                "rows_written": self.rows_written,
+                "rejected_rows": self.rejected,
+            }
+
+    # --- запись ---
+
+    def _ensure_thread(self) -> None:
+        # после fork потока в дочернем процессе нет — запускаем заново
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="suggestion-writer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self) -> List[Ticket]:
+        """Ждёт порога по числу строк или по возрасту самой старой, забирает пачку (под self._cond)."""
+        while True:
+            if self._queue:
+                age = time.monotonic() - self._queue[0].enqueued_at
+                if self._pending_rows >= self.flush_rows or age >= self.flush_interval:
+                    break
+                self._cond.wait(self.flush_interval - age)
+            else:
+                self._cond.wait()
+
+        batch: List[Ticket] = []
+        rows = 0
+        # тикет не делим: запрос целиком в одной транзакции (первый берём даже если он больше порога)
+        while self._queue and (not batch or rows + len(self._queue[0].rows) <= self.flush_rows):
+            ticket = self._queue.popleft()
+            batch.append(ticket)
+            rows += len(ticket.rows)
+        self._pending_rows -= rows
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            self.write(batch)
+
+    def write(self, batch: List[Ticket]) -> None:
+        rows = [row for ticket in batch for row in ticket.rows]
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                insert(FrameSuggestion).returning(FrameSuggestion.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+            ids_by_ticket = []
+            pos = 0
+            for ticket in batch:
+                ids_by_ticket.append(ids[pos:pos + len(ticket.rows)])
+                pos += len(ticket.rows)
+            tracked = [
+                {"id": t.id, "status": STORED, "suggestion_ids": json.dumps(t_ids)}
+                for t, t_ids in zip(batch, ids_by_ticket) if t.track
+            ]
+            if tracked:
+                db.execute(insert(SuggestionTicket), tracked)
+                db.execute(delete(SuggestionTicket).where(
+                    SuggestionTicket.created_at < datetime.now(timezone.utc).replace(tzinfo=None) - TICKET_TTL
+                ))
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            print(f"[suggestion_queue] пачка из {len(rows)} строк не записана: {exc}", file=sys.stderr)
+            self._record_failed([t for t in batch if t.track], str(exc))
+            for ticket in batch:
+                ticket.finish(FAILED, error=str(exc))
+            return
+        finally:
+            db.close()
+
+        with self._cond:
+            self.batches += 1
+            self.rows_written += len(rows)
+        for ticket, t_ids in zip(batch, ids_by_ticket):
+            ticket.finish(STORED, t_ids)
+
+        if any(row["type"] == "new_frame" for row in rows):
+            # догоняем группы новых рамок тем же потоком — писатель у предложений один
+            try:
+                cluster_suggestions()
+            except Exception as exc:
+                print(f"[suggestion_queue] группировка не обновлена: {exc}", file=sys.stderr)
+
+    @staticmethod
+    def _record_failed(tickets: List[Ticket], error: str) -> None:
+        """Итог неудачной пачки — отдельной транзакцией (как получится: база может быть недоступна)."""
+        if not tickets:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(insert(SuggestionTicket), [{"id": t.id, "status": FAILED, "error": error} for t in tickets])
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            print(f"[suggestion_queue] итог тикетов не записан: {exc}", file=sys.stderr)
+        finally:
+            db.close()
+
+    def drain(self) -> None:
+        """Записать всё, что осталось в очереди (при остановке процесса)."""
+        with self._cond:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._pending_rows = 0
+        if batch:
+            self.write(batch)
+
+
+QUEUE = SuggestionQueue()
+atexit.register(QUEUE.drain)
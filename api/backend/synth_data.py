@@ -0,0 +1,337 @@
+# api/backend/synth_data.py
+"""
+Синтетические данные для замеров: frames_raw, frames_manual и frame_suggestions
+в нужных объёмах (реальных рамок ~750, планируем десятки тысяч).
+
+  - рамки — фичи того же вида, что map/data/frames_ready.geojson, пишутся через
+    geojson_import.normalize_feature (те же строки, что дал бы импорт);
+  - правки админа — доля manual_ratio рамок со случайным набором *_override,
+    плюс рамки «только руками» и удалённые админом;
+  - размер JSON-полей time_windows / tags задаётся числом элементов;
+  - координаты — равномерно в bbox или гауссовыми «городами» (--spread clusters);
+  - предложения водителей — правки существующих рамок и новые рамки рядом с ними,
+    created_at растянут на последние days дней, часть уже разобрана.
+
+Всё детерминировано по seed. Пишет в базу из db.py, затирая эти три таблицы, поэтому
+базу нужно указать явно через TT_DB_URL (по умолчанию db.py смотрит на боевой frames.db),
+а непустую базу скрипт затирает только с --force:
+
+  TT_DB_URL=sqlite:////tmp/synth.db python synth_data.py --frames 50000 --suggestions 200000
+  TT_DB_URL=sqlite:////tmp/synth.db python synth_data.py --force --geojson out/synth_frames.geojson
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import delete, insert, select
+
+from db import Base, engine
+from frames_merged import refresh as refresh_merged
+from generation import bump_generation
+from geojson_import import normalize_feature
+from models import (
+    FrameManual, FrameRaw, FrameRoadMatch, FrameSuggestion, SuggestionCluster, SuggestionClusterMember,
+    SuggestionClusterState, ensure_indexes,
+)
+
+# что считается из заменяемых таблиц — от прошлых данных чистим вместе с ними
+DERIVED_MODELS = (SuggestionClusterMember, SuggestionCluster, SuggestionClusterState, FrameRoadMatch)
+
+CHUNK_ROWS = 2000
+DEFAULT_BBOX = (30.0, 50.0, 50.0, 60.0)  # европейская часть России
+
+HGV_ACCESS = ("unknown", "yes", "no", "conditional", "destination", "delivery")
+DIRECTIONS = ("both", "both", "both", "forward", "backward")
+FRAME_STATES = ("unknown", "active", "inactive", "broken")
+SUGGESTION_STATUSES = ("new", "new", "new", "accepted", "rejected")
+TAG_WORDS = ("frame", "nerudas", "needs_error_details", "platon", "camera", "scale", "apvk", "spvk", "checked", "night")
+
+
+@dataclass
+class SynthSpec:
+    frames: int = 1000
+    manual_ratio: float = 0.2
+    manual_only_ratio: float = 0.01
+    deleted_ratio: float = 0.01
+    suggestions: int = 5000
+    new_frame_ratio: float = 0.3
+    time_windows: int = 2
+    tags: int = 3
+    spread: str = "clusters"  # uniform | clusters
+    centers: int = 40
+    sigma_km: float = 30.0
+    days: int = 365
+    bbox: Tuple[float, float, float, float] = DEFAULT_BBOX
+    seed: int = 1
+
+
+def _point_source(spec: SynthSpec, rng: random.Random):
+    min_lon, min_lat, max_lon, max_lat = spec.bbox
+    if spec.spread == "uniform":
+        return lambda: (round(rng.uniform(min_lon, max_lon), 6), round(rng.uniform(min_lat, max_lat), 6))
+
+    centers = [(rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)) for _ in range(max(1, spec.centers))]
+    sigma_lat = spec.sigma_km / 111.0
+
+    def point():
+        lon, lat = rng.choice(centers)
+        lat = min(max(rng.gauss(lat, sigma_lat), min_lat), max_lat)
+        lon = min(max(rng.gauss(lon, sigma_lat * 1.8), min_lon), max_lon)
+        return round(lon, 6), round(lat, 6)
+
+    return point
+
+
+def _time_windows(rng: random.Random, n: int) -> List[Dict[str, Any]]:
+    windows = []
+    for _ in range(n):
+        start = rng.randrange(0, 23)
+        windows.append({
+            "days": sorted(rng.sample(range(1, 8), rng.randint(1, 7))),
+            "from": f"{start:02d}:00",
+            "to": f"{rng.randrange(start + 1, 25):02d}:00",
+        })
+    return windows
+
+
+def _tags(rng: random.Random, n: int) -> List[str]:
+    return [rng.choice(TAG_WORDS) if i < 3 else f"{rng.choice(TAG_WORDS)}_{rng.randrange(1000)}" for i in range(n)]
+
+
+def frame_id(i: int) -> str:
+    return f"synth-{i:06d}"
+
+
+def iter_features(spec: SynthSpec) -> Iterator[Dict[str, Any]]:
+    """Рамки в формате frames_ready.geojson (одинаковые для одинакового spec)."""
+    rng = random.Random(spec.seed)
+    point = _point_source(spec, rng)
+    for i in range(spec.frames):
+        fid = frame_id(i)
+        url = f"https://nerudas.ru/vesy-platon/vesovoj-kontrol/apvk/{i}-ramka-synth"
+        weight = rng.choice((None, None, 8.0, 10.0, 12.0, 25.0, 40.0))
+        yield {
+            "type": "Feature",
+            "id": fid,
+            "geometry": {"type": "Point", "coordinates": list(point())},
+            "properties": {
+                "road_id": rng.choice((None, f"R-{rng.randrange(300)}")),
+                "road_name": rng.choice((None, "М-4 «Дон»", "М-11 «Нева»", "Р-22 «Каспий»")),
+                "class": rng.choice((None, "trunk", "primary")),
+                "object_type": "frame",
+                "hgv_access": rng.choice(HGV_ACCESS),
+                "weight_limit_tons": weight,
+                "axle_load_tons": rng.choice((None, 6.0, 10.0, 11.5)) if weight else None,
+                "time_windows": _time_windows(rng, spec.time_windows),
+                "valid_from": None,
+                "valid_to": None,
+                "direction": rng.choice(DIRECTIONS),
+                "source_type": "geojson",
+                "source_name": "synth_data.py",
+                "comment_human": "Синтетическая рамка для замеров. " * rng.randint(1, 3),
+                "comment_raw": f"Источник: synth, url={url}, status=MATCH, id=row_{i}.",
+                "priority": 1,
+                "tags": _tags(rng, spec.tags),
+                "frame_id": fid,
+                "frame_row_id_raw": f"row_{i}",
+                "frame_url": url,
+                "frame_status_raw": "MATCH",
+                "frame_error_raw": None,
+                "frame_state": rng.choice(FRAME_STATES),
+                "frame_first_seen": "2025-11-13",
+                "frame_last_seen": "2025-11-13",
+                "frame_is_active": rng.random() > 0.05,
+                "frame_change_type": "new",
+            },
+        }
+
+
+def iter_manual(spec: SynthSpec) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(spec.seed + 1)
+    point = _point_source(spec, rng)
+    for i in range(spec.frames):
+        roll = rng.random()
+        if roll >= spec.manual_ratio + spec.deleted_ratio:
+            continue
+        row: Dict[str, Any] = {"frame_id": frame_id(i), "is_deleted_by_admin": roll >= spec.manual_ratio}
+        if rng.random() < 0.3:
+            row["lon_override"], row["lat_override"] = point()
+        if rng.random() < 0.5:
+            row["weight_limit_tons_override"] = rng.choice((8.0, 10.0, 25.0, 44.0))
+        if rng.random() < 0.3:
+            row["hgv_access_override"] = rng.choice(HGV_ACCESS)
+        if rng.random() < 0.3:
+            row["frame_state_override"] = rng.choice(FRAME_STATES)
+        if rng.random() < 0.4:
+            row["time_windows_override"] = json.dumps(_time_windows(rng, spec.time_windows), ensure_ascii=False)
+        if rng.random() < 0.5:
+            row["tags_admin"] = json.dumps(_tags(rng, spec.tags), ensure_ascii=False)
+        if rng.random() < 0.3:
+            row["comment_admin"] = "Проверено на месте."
+        yield row
+
+    for i in range(int(spec.frames * spec.manual_only_ratio)):
+        lon, lat = point()
+        yield {
+            "frame_id": f"manual-synth-{i:06d}",
+            "manual_only": True,
+            "lon_override": lon,
+            "lat_override": lat,
+            "weight_limit_tons_override": rng.choice((None, 10.0, 25.0)),
+            "tags_admin": json.dumps(_tags(rng, spec.tags), ensure_ascii=False),
+            "comment_admin": "Добавлено вручную.",
+        }
+
+
+def iter_suggestions(spec: SynthSpec) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(spec.seed + 2)
+    point = _point_source(spec, rng)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    span_s = spec.days * 86400
+    for i in range(spec.suggestions):
+        created_at = now - timedelta(seconds=span_s * (1 - i / max(1, spec.suggestions)))
+        status = rng.choice(SUGGESTION_STATUSES)
+        row: Dict[str, Any] = {
+            "comment_driver": "Рамка на месте, ограничение другое." if rng.random() < 0.5 else "Новая рамка.",
+            "contact_phone": f"+7900{rng.randrange(10 ** 7):07d}" if rng.random() < 0.3 else None,
+            "contact_name": None,
+            "status": status,
+            "processed_at": created_at + timedelta(days=1) if status != "new" else None,
+            "processed_by": "admin" if status != "new" else None,
+            "created_at": created_at,
+        }
+        if rng.random() < spec.new_frame_ratio or not spec.frames:
+            lon, lat = point()
+            row.update(type="new_frame", frame_id=None, suggested_lon=lon, suggested_lat=lat)
+        else:
+            row.update(type="change_existing", frame_id=frame_id(rng.randrange(spec.frames)),
+                       suggested_weight_limit_tons=rng.choice((None, 8.0, 25.0)))
+        yield row
+
+
+def write_geojson(path: Path, spec: SynthSpec) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write('{"type":"FeatureCollection","features":[\n')
+        for i, feature in enumerate(iter_features(spec)):
+            if i:
+                fh.write(",\n")
+            fh.write(json.dumps(feature, ensure_ascii=False))
+        fh.write("\n]}\n")
+    return path
+
+
+def _insert_chunks(conn, table, rows: Iterator[Dict[str, Any]]) -> int:
+    total = 0
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            conn.execute(insert(table), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(table), chunk)
+        total += len(chunk)
+    return total
+
+
+def populate(spec: SynthSpec, bind=engine, force: bool = False) -> Dict[str, int]:
+    """
+    Заменяет frames_raw / frames_manual / frame_suggestions синтетикой, поднимает поколение.
+    Группы предложений и привязки к дорогам прошлых данных удаляются, frames_merged
+    пересчитывается в той же транзакции — API сразу отдаёт новый слой.
+    Если в заменяемых таблицах уже есть строки — RuntimeError, пока не передан force=True.
+    """
+    Base.metadata.create_all(bind=bind)
+    ensure_indexes(bind)
+    with bind.begin() as conn:
+        if not force:
+            filled = [m.__tablename__ for m in (FrameSuggestion, FrameManual, FrameRaw)
+                      if conn.execute(select(m.id).limit(1)).first() is not None]
+            if filled:
+                raise RuntimeError(f"в базе уже есть данные ({', '.join(filled)}) — затираем только с --force")
+        for model in (*DERIVED_MODELS, FrameSuggestion, FrameManual, FrameRaw):
+            conn.execute(delete(model))
+        # executemany по столбцам: у строк manual/suggestions разные наборы ключей —
+        # дополняем до полного набора, иначе INSERT возьмёт столбцы первой строки
+        manual_cols = [c.name for c in FrameManual.__table__.columns
+                       if c.name not in ("id", "created_at", "updated_at")]
+        counts = {
+            "frames_raw": _insert_chunks(conn, FrameRaw, (normalize_feature(f) for f in iter_features(spec))),
+            "frames_manual": _insert_chunks(conn, FrameManual, (
+                {**dict.fromkeys(manual_cols), "manual_only": False, "is_deleted_by_admin": False, **row}
+                for row in iter_manual(spec)
+            )),
+            "frame_suggestions": _insert_chunks(conn, FrameSuggestion, (
+                {"suggested_weight_limit_tons": None, "suggested_lon": None, "suggested_lat": None, **row}
+                for row in iter_suggestions(spec)
+            )),
+        }
+        counts["frames_merged"] = refresh_merged(conn)["rows"]
+        bump_generation(conn)
+    return counts
+
+
+def parse_args(argv=None) -> Tuple[SynthSpec, argparse.Namespace]:
+    d = SynthSpec()
+    ap = argparse.ArgumentParser(description="Синтетические рамки, правки и предложения для замеров")
+    ap.add_argument("--frames", type=int, default=d.frames)
+    ap.add_argument("--manual-ratio", type=float, default=d.manual_ratio, help="доля рамок с правкой админа")
+    ap.add_argument("--manual-only-ratio", type=float, default=d.manual_only_ratio,
+                    help="рамок «только руками» (доля от --frames)")
+    ap.add_argument("--deleted-ratio", type=float, default=d.deleted_ratio, help="доля рамок, удалённых админом")
+    ap.add_argument("--suggestions", type=int, default=d.suggestions)
+    ap.add_argument("--new-frame-ratio", type=float, default=d.new_frame_ratio, help="доля предложений новых рамок")
+    ap.add_argument("--time-windows", type=int, default=d.time_windows, help="окон в time_windows каждой рамки")
+    ap.add_argument("--tags", type=int, default=d.tags, help="тегов у каждой рамки")
+    ap.add_argument("--spread", choices=("uniform", "clusters"), default=d.spread)
+    ap.add_argument("--centers", type=int, default=d.centers, help="число «городов» для --spread clusters")
+    ap.add_argument("--sigma-km", type=float, default=d.sigma_km, help="разброс вокруг «города», км")
+    ap.add_argument("--days", type=int, default=d.days, help="за сколько дней растянуты предложения")
+    ap.add_argument("--bbox", type=str, default=",".join(map(str, d.bbox)), help="minLon,minLat,maxLon,maxLat")
+    ap.add_argument("--seed", type=int, default=d.seed)
+    ap.add_argument("--geojson", type=Path, default=None, help="ещё и записать рамки GeoJSON-файлом (для импорта)")
+    ap.add_argument("--force", action="store_true", help="затереть таблицы, даже если в них уже есть данные")
+    args = ap.parse_args(argv)
+    if not os.getenv("TT_DB_URL"):
+        ap.error("укажи базу явно через TT_DB_URL — без неё db.py пишет в боевой frames.db")
+    bbox = tuple(float(v) for v in args.bbox.split(","))
+    if len(bbox) != 4:
+        ap.error("--bbox: нужно четыре числа")
+    spec = SynthSpec(
+        frames=args.frames, manual_ratio=args.manual_ratio, manual_only_ratio=args.manual_only_ratio,
+        deleted_ratio=args.deleted_ratio, suggestions=args.suggestions, new_frame_ratio=args.new_frame_ratio,
+        time_windows=args.time_windows, tags=args.tags, spread=args.spread, centers=args.centers,
+        sigma_km=args.sigma_km, days=args.days, bbox=bbox, seed=args.seed,
+    )
+    return spec, args
+
+
+def main(argv=None) -> int:
+    spec, args = parse_args(argv)
+    started = time.perf_counter()
+    try:
+        counts = populate(spec, force=args.force)
+    except RuntimeError as exc:
+        print(f"[synth] {exc}", file=sys.stderr)
+        return 1
+    print(f"[synth] {engine.url.render_as_string(hide_password=True)}: " +
+          ", ".join(f"{k}={v}" for k, v in counts.items()) + f" за {time.perf_counter() - started:.1f}с")
+    if args.geojson:
+        write_geojson(args.geojson, spec)
+        print(f"[synth] GeoJSON: {args.geojson}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# api/backend/tiles.py
+"""
+Тайлы слоёв карты для /api/tiles/<layer>/<z>/<x>/<y>.
+
+Схема тайлов — обычная XYZ поверх Web Mercator (256 px, y сверху вниз).
+Тайл — GeoJSON FeatureCollection в lon/lat:
+
+  - точки (рамки): до CLUSTER_MAX_ZOOM группируются по сетке CLUSTER_CELL_PX
+    в пикселях зума; сетка общая для всех тайлов, поэтому кластер на стыке
+    тайлов не раздваивается. Кластер — Point с properties.cluster = true,
+    point_count и bbox входящих рамок;
+  - линии (дороги): обрезаются по тайлу с запасом LINE_BUFFER_PX, координаты
+    квантуются сеткой LINE_EXTENT на тайл и совпавшие соседние вершины выкидываются —
+    на мелких зумах линия сама упрощается до видимой детализации.
+
+Все расчёты — в единичных координатах Меркатора (0..1 по обеим осям).
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from spatial_index import GridIndex
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+MAX_LAT = 85.05112878
+
+CLUSTER_CELL_PX = 64
+CLUSTER_MAX_ZOOM = 14  # с этого зума рамки отдаются по одной
+
+LINE_BUFFER_PX = 8
+# сырой дамп OSM-тегов карте не нужен, а это большая часть веса тайла дорог
+LINE_DROP_PROPERTIES = ("comment_raw",)
+LINE_EXTENT = 4096
+COORD_DIGITS = 6
+
+
+def validate_tile(z: int, x: int, y: int) -> None:
+    if not 0 <= z <= MAX_ZOOM:
+        raise ValueError(f"z must be in [0, {MAX_ZOOM}]")
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"x and y must be in [0, {n - 1}] for z={z}")
+
+
+def lonlat_to_unit(lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    ux = (lon + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    uy = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return ux, uy
+
+
+def unit_to_lonlat(ux, uy) -> Tuple[np.ndarray, np.ndarray]:
+    lon = np.asarray(ux) * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * np.asarray(uy)))))
+    return lon, lat
+
+
+def tile_unit_bounds(z: int, x: int, y: int, buffer_px: float = 0.0) -> Tuple[float, float, float, float]:
+    """(x0, y0, x1, y1) тайла в единичных координатах, y0 — верхний край."""
+    n = float(1 << z)
+    pad = buffer_px / TILE_SIZE
+    return (x - pad) / n, (y - pad) / n, (x + 1 + pad) / n, (y + 1 + pad) / n
+
+
+def tile_bbox(z: int, x: int, y: int, buffer_px: float = 0.0) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) тайла."""
+    x0, y0, x1, y1 = tile_unit_bounds(z, x, y, buffer_px)
+    (min_lon, max_lon), (max_lat, min_lat) = unit_to_lonlat([x0, x1], [y0, y1])
+    return float(min_lon), float(min_lat), float(max_lon), float(max_lat)
+
+
+def feature_collection(features: List[dict]) -> Dict[str, Any]:
+    return {"type": "FeatureCollection", "features": features}
+
+
+class PointTiles:
+    """Тайлы точечного слоя (рамки одного снимка)."""
+
+    def __init__(self, features: List[dict], lon: np.ndarray, lat: np.ndarray, index: GridIndex):
+        self.features = features
+        self.lon = lon
+        self.lat = lat
+        self.index = index
+        self.ux, self.uy = lonlat_to_unit(lon, lat)
+
+    def tile(self, z: int, x: int, y: int) -> Dict[str, Any]:
+        pos = self.index.query_bbox(*tile_bbox(z, x, y))
+        # точка на границе попадает в bbox двух тайлов — оставляем только в одном
+        x0, y0, x1, y1 = tile_unit_bounds(z, x, y)
+        ux, uy = self.ux[pos], self.uy[pos]
+        keep = (ux >= x0) & (ux < x1) & (uy >= y0) & (uy < y1)
+        pos, ux, uy = pos[keep], ux[keep], uy[keep]
+
+        if z >= CLUSTER_MAX_ZOOM or pos.size <= 1:
+            return feature_collection([self.features[i] for i in pos.tolist()])
+
+        cells_per_unit = (1 << z) * TILE_SIZE / CLUSTER_CELL_PX
+        cx = np.floor(ux * cells_per_unit).astype(np.int64)
+        cy = np.floor(uy * cells_per_unit).astype(np.int64)
+        _, group, counts = np.unique(cx * (1 << 32) + cy, return_inverse=True, return_counts=True)
+        order = np.argsort(group, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        features = []
+        for start, count in zip(starts.tolist(), counts.tolist()):
+            members = pos[order[start:start + count]]
+            if count == 1:
+                features.append(self.features[int(members[0])])
+                continue
+            lon, lat = self.lon[members], self.lat[members]
+            first = int(members[0])
+            features.append({
+                "type": "Feature",
+                "id": f"cluster-{z}-{int(cx[order[start]])}-{int(cy[order[start]])}",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [round(float(lon.mean()), COORD_DIGITS), round(float(lat.mean()), COORD_DIGITS)],
+                },
+                "properties": {
+                    "cluster": True,
+                    "point_count": count,
+                    "bbox": [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())],
+                    "first_frame_id": self.features[first].get("id"),
+                },
+            })
+        return feature_collection(features)
+
+
+def _clip_polyline(ux: np.ndarray, uy: np.ndarray, bounds) -> List[np.ndarray]:
+    """Обрезка ломаной прямоугольником (Лянг–Барски по всем отрезкам сразу) -> куски (k, 2)."""
+    xmin, ymin, xmax, ymax = bounds
+    x0, y0, dx, dy = ux[:-1], uy[:-1], np.diff(ux), np.diff(uy)
+    t0 = np.zeros_like(x0)
+    t1 = np.ones_like(x0)
+    inside = np.ones(x0.shape, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            inside &= ~((p == 0) & (q < 0))
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    inside &= t0 <= t1
+
+    pieces: List[np.ndarray] = []
+    current: List[Tuple[float, float]] = []
+    for i in np.flatnonzero(inside).tolist():
+        start = (x0[i] + t0[i] * dx[i], y0[i] + t0[i] * dy[i])
+        end = (x0[i] + t1[i] * dx[i], y0[i] + t1[i] * dy[i])
+        # продолжаем кусок, если предыдущий отрезок целиком дошёл до этого
+        if current and t0[i] == 0.0 and inside[i - 1] and t1[i - 1] == 1.0:
+            current.append(end)
+        else:
+            if len(current) >= 2:
+                pieces.append(np.array(current))
+            current = [start, end]
+    if len(current) >= 2:
+        pieces.append(np.array(current))
+    return pieces
+
+
+class LineTiles:
+    """Тайлы линейного слоя (дороги)."""
+
+    def __init__(self, features: List[dict]):
+        self.parts: List[Tuple[int, np.ndarray, np.ndarray]] = []  # (номер фичи, ux, uy)
+        self.properties: List[dict] = []
+        self.ids: List[Any] = []
+        bounds = []
+        for f in features:
+            geom = f.get("geometry") or {}
+            if geom.get("type") == "LineString":
+                lines = [geom.get("coordinates") or []]
+            elif geom.get("type") == "MultiLineString":
+                lines = geom.get("coordinates") or []
+            else:
+                continue
+            n = len(self.properties)
+            props = f.get("properties") or {}
+            self.properties.append({k: v for k, v in props.items() if k not in LINE_DROP_PROPERTIES})
+            self.ids.append(f.get("id") or props.get("road_id") or n)
+            for line in lines:
+                coords = np.asarray(line, dtype=np.float64)
+                if coords.ndim != 2 or len(coords) < 2:
+                    continue
+                ux, uy = lonlat_to_unit(coords[:, 0], coords[:, 1])
+                self.parts.append((n, ux, uy))
+                bounds.append((ux.min(), uy.min(), ux.max(), uy.max()))
+        self.bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+
+    def tile(self, z: int, x: int, y: int) -> Dict[str, Any]:
+        xmin, ymin, xmax, ymax = clip = tile_unit_bounds(z, x, y, LINE_BUFFER_PX)
+        b = self.bounds
+        hits = np.flatnonzero((b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin))
+
+        scale = (1 << z) * LINE_EXTENT
+        ox, oy = x / float(1 << z), y / float(1 << z)
+        by_feature: Dict[int, List[list]] = {}
+        for k in hits.tolist():
+            n, ux, uy = self.parts[k]
+            for piece in _clip_polyline(ux, uy, clip):
+                # квантуем в сетку тайла и убираем совпавшие соседние вершины
+                q = np.round((piece - (ox, oy)) * scale)
+                keep = np.ones(len(q), dtype=bool)
+                keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+                q = q[keep]
+                if len(q) < 2:
+                    continue
+                lon, lat = unit_to_lonlat(q[:, 0] / scale + ox, q[:, 1] / scale + oy)
+                coords = np.round(np.column_stack((lon, lat)), COORD_DIGITS).tolist()
+                by_feature.setdefault(n, []).append(coords)
+
+        features = []
+        for n, lines in by_feature.items():
+            geometry = (
+                {"type": "LineString", "coordinates": lines[0]}
+                if len(lines) == 1
+                else {"type": "MultiLineString", "coordinates": lines}
+            )
+            features.append({"type": "Feature", "id": self.ids[n], "geometry": geometry, "properties": self.properties[n]})
+        return feature_collection(features)
@@ -0,0 +1,169 @@
+# api/backend/truck_check.py
+"""
+Проверка ТС против ограничений рамок.
+
+FrameLimits — колоночное представление ограничений слоя (строится один раз на
+поколение данных из уже склеенных raw + manual фич). evaluate() классифицирует
+набор рамок сразу для одного или многих профилей ТС одним векторным проходом:
+массивы (профили x рамки) и битовая маска причин.
+
+Статусы: ok / warn / violates.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+STATUS_NAMES = ("ok", "warn", "violates")
+OK, WARN, VIOLATES = 0, 1, 2
+
+# Доля от лимита, начиная с которой предупреждаем (90% -> warn)
+WARN_RATIO = 0.9
+
+# hgv_access -> код
+HGV_OPEN, HGV_LIMITED, HGV_CLOSED = 0, 1, 2
+HGV_LIMITED_VALUES = {"conditional", "destination", "delivery", "private", "agricultural"}
+HGV_CLOSED_VALUES = {"no"}
+
+# Направления, при которых ограничение действует не во всех направлениях движения
+ONE_WAY_DIRECTIONS = {"forward", "backward", "oneway", "-1", "1", "yes"}
+
+# Причины: бит -> код причины в ответе
+REASONS = (
+    (1 << 0, "weight_over_limit"),
+    (1 << 1, "weight_near_limit"),
+    (1 << 2, "axle_load_over_limit"),
+    (1 << 3, "axle_load_near_limit"),
+    (1 << 4, "hgv_forbidden"),
+    (1 << 5, "hgv_conditional"),
+    (1 << 6, "direction_dependent"),
+)
+R_WEIGHT_OVER, R_WEIGHT_NEAR, R_AXLE_OVER, R_AXLE_NEAR, R_HGV_NO, R_HGV_COND, R_DIRECTION = (
+    bit for bit, _ in REASONS
+)
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_datetime64(value, end_of_day: bool = False) -> np.datetime64:
+    if not value:
+        return np.datetime64("NaT", "s")
+    text = str(value).strip()
+    try:
+        if end_of_day and len(text) == 10:
+            # только дата (как на фронтенде): граница включительная — ограничение действует весь этот день
+            return np.datetime64(text, "D") + np.timedelta64(1, "D") - np.timedelta64(1, "s")
+        return np.datetime64(text[:19], "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+class FrameLimits:
+    """Ограничения рамок в виде колонок NumPy (порядок = порядок фич)."""
+
+    def __init__(self, features: Sequence[dict]):
+        props = [f.get("properties") or {} for f in features]
+        self.size = len(props)
+        self.weight_limit_tons = np.array([_float_or_nan(p.get("weight_limit_tons")) for p in props])
+        self.axle_load_tons = np.array([_float_or_nan(p.get("axle_load_tons")) for p in props])
+
+        access = [str(p.get("hgv_access") or "").lower() for p in props]
+        self.hgv_access = np.array(
+            [
+                HGV_CLOSED if a in HGV_CLOSED_VALUES else HGV_LIMITED if a in HGV_LIMITED_VALUES else HGV_OPEN
+                for a in access
+            ],
+            dtype=np.int8,
+        )
+        self.one_way = np.array(
+            [str(p.get("direction") or "").lower() in ONE_WAY_DIRECTIONS for p in props], dtype=bool
+        )
+        self.valid_from = np.array([_to_datetime64(p.get("valid_from")) for p in props], dtype="datetime64[s]")
+        self.valid_to = np.array(
+            [_to_datetime64(p.get("valid_to"), end_of_day=True) for p in props], dtype="datetime64[s]"
+        )
+
+
+def parse_truck_profile(data: dict) -> Dict[str, float]:
+    """
+    Профиль ТС из JSON. Понимаем ключи фронтенда (window.__TT_TRUCK_PARAMS: weight, height...)
+    и явные weight_t / axle_load_t. Нули и пустые значения = параметр не задан.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("truck profile must be an object")
+
+    def pick(*keys) -> float:
+        for key in keys:
+            if data.get(key) not in (None, ""):
+                value = float(data[key])
+                if value < 0 or not np.isfinite(value):
+                    raise ValueError(f"{key} must be a non-negative number")
+                return value if value > 0 else np.nan
+        return np.nan
+
+    return {
+        "weight_t": pick("weight_t", "weight"),
+        "axle_load_t": pick("axle_load_t", "axle_load"),
+    }
+
+
+def evaluate(limits: FrameLimits, positions: np.ndarray, profiles: Sequence[Dict[str, float]],
+             at: Optional[datetime] = None):
+    """
+    Классифицирует рамки positions для каждого профиля.
+
+    Возвращает (status, reasons): массивы формы (len(profiles), len(positions)),
+    status — коды OK/WARN/VIOLATES, reasons — битовая маска REASONS.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    at = at or datetime.now(timezone.utc)
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    now = np.datetime64(at, "s")
+
+    weight = np.array([p["weight_t"] for p in profiles], dtype=np.float64)[:, None]
+    axle = np.array([p["axle_load_t"] for p in profiles], dtype=np.float64)[:, None]
+
+    w_lim = limits.weight_limit_tons[positions][None, :]
+    a_lim = limits.axle_load_tons[positions][None, :]
+    access = limits.hgv_access[positions][None, :]
+    one_way = limits.one_way[positions][None, :]
+    v_from = limits.valid_from[positions]
+    v_to = limits.valid_to[positions]
+
+    # ограничение действует сейчас (пустые границы = без ограничения по времени)
+    active = (np.isnat(v_from) | (v_from <= now)) & (np.isnat(v_to) | (v_to >= now))
+    active = active[None, :]
+
+    # сравнения с NaN дают False -> незаданные лимиты/параметры ничего не нарушают
+    reasons = np.zeros((len(profiles), positions.size), dtype=np.int16)
+    reasons |= np.where(weight > w_lim, R_WEIGHT_OVER, 0)
+    reasons |= np.where((weight <= w_lim) & (weight > w_lim * WARN_RATIO), R_WEIGHT_NEAR, 0)
+    reasons |= np.where(axle > a_lim, R_AXLE_OVER, 0)
+    reasons |= np.where((axle <= a_lim) & (axle > a_lim * WARN_RATIO), R_AXLE_NEAR, 0)
+    reasons |= np.where(access == HGV_CLOSED, R_HGV_NO, 0)
+    reasons |= np.where(access == HGV_LIMITED, R_HGV_COND, 0)
+    reasons[~np.broadcast_to(active, reasons.shape)] = 0
+
+    hard = (reasons & (R_WEIGHT_OVER | R_AXLE_OVER | R_HGV_NO)) != 0
+    soft = (reasons & (R_WEIGHT_NEAR | R_AXLE_NEAR | R_HGV_COND)) != 0
+
+    # одностороннее ограничение может не касаться нашего направления движения
+    directional = hard & one_way
+    reasons |= np.where(directional, R_DIRECTION, 0)
+
+    status = np.full(reasons.shape, OK, dtype=np.int8)
+    status[soft | directional] = WARN
+    status[hard & ~directional] = VIOLATES
+    return status, reasons
+
+
+def reason_names(mask: int) -> List[str]:
+    return [name for bit, name in REASONS if mask & bit]
@@ -1,11 +1,9 @@
 import os
 import posixpath
-import paramiko
+import sys
+from pathlib import Path
 
-HOST = os.environ["SFTP_HOST"]
-USER = os.environ["SFTP_USER"]
-PASSWORD = os.environ["SFTP_PASSWORD"]
-PORT = int(os.environ.get("SFTP_PORT", "22"))
+from sftp_publish import RemoteManifest, connect, file_sha256, put_atomic
 
 # ВАЖНО: для Reg.ru часто нельзя писать в /www/... по SFTP.
 # Грузим в относительный путь. Если не сработает — поменяешь на "api/backend".
@@ -16,16 +14,34 @@ FILES = [
     "db.py",
     "models.py",
     "config.py",
+    "generation.py",
+    "spatial_index.py",
+    "corridor.py",
+    "truck_check.py",
+    "tiles.py",
+    "frames_binary.py",
+    "compression.py",
+    "suggestion_queue.py",
+    "suggestion_clusters.py",
+    "geojson_stream.py",
     "geojson_import.py",
+    "road_snap.py",
+    "road_graph.py",
+    "metrics.py",
+    "frames_merged.py",
+    "fragments.py",
+    "roads_graph.bin",
+    "frames_changeset.py",
     "parser_nerudas.py",
+    "crawl_state.py",
+    "html_archive.py",
+    "html_extract.py",
     "upload_sftp.py",
+    "sftp_publish.py",
 ]
 
 def main():
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(HOST, port=PORT, username=USER, password=PASSWORD)
-
+    ssh = connect()
     sftp = ssh.open_sftp()
 
     # НЕ создаём папки. Просто проверяем, что папка существует.
@@ -38,19 +54,33 @@ def main():
             f"Original error: {e}"
         )
 
+    # sha256 уже опубликованных файлов — неизменившиеся не грузим
+    manifest = RemoteManifest(sftp, REMOTE_DIR)
+    uploaded = skipped = 0
+
     for fn in FILES:
-        local_path = fn
-        if not os.path.exists(local_path):
+        local_path = Path(fn)
+        if not local_path.exists():
             print(f"[upload_api_sftp] skip missing: {local_path}")
             continue
 
+        digest = file_sha256(local_path)
+        if manifest.unchanged(fn, digest):
+            skipped += 1
+            continue
+
         remote_path = posixpath.join(REMOTE_DIR, fn)
         print(f"[upload_api_sftp] put {local_path} -> {remote_path}")
-        sftp.put(local_path, remote_path)
+        put_atomic(sftp, local_path, remote_path)
+        manifest.set(fn, sha256=digest)
+        uploaded += 1
+
+    if uploaded:
+        manifest.save()
 
     sftp.close()
     ssh.close()
-    print("[upload_api_sftp] done")
+    print(f"[upload_api_sftp] done: uploaded={uploaded} unchanged={skipped}")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,53 +1,194 @@
-import paramiko
+# api/backend/upload_sftp.py
+"""
+Публикация frames.db на хостинг.
+
+Обычный путь — changeset (frames_changeset.py): сравниваем локальную базу с копией
+последней опубликованной версии (out/published/frames.db, живёт в кэше Actions),
+грузим сжатую разницу frames_raw и применяем её на сервере через exec
+(`python3 frames_changeset.py apply ...`). Объём передачи зависит от числа
+изменившихся рамок, а не от размера базы; правки и предложения на сервере не затираются.
+После changeset там же пересчитывается привязка рамок к дорогам (road_snap.py).
+
+Если changeset невозможен (первая публикация, потерян кэш, на хостинге нет exec,
+база на сервере разошлась) — грузим frames.db целиком во временное имя на сервере
+и подменяем содержимое живой базы через `frames_changeset.py install` (backup API SQLite:
+пишет через WAL, старые -wal/-shm не остаются в паре с новым файлом). Поверх живой
+базы файл не переименовываем никогда. install отказывается, если на сервере есть ручные
+правки или предложения водителей — полная замена их бы уничтожила; тогда публикация
+останавливается с ошибкой, и нужно вернуть changeset (копию опубликованной базы).
+Без exec полная загрузка возможна, только пока базы на сервере ещё нет.
+Если frames_raw не изменилась — не грузим ничего.
+"""
+from __future__ import annotations
+
 import os
+import posixpath
+import sqlite3
+import sys
+from pathlib import Path
 
-HOST = os.environ["SFTP_HOST"]
-PORT = int(os.environ.get("SFTP_PORT", 22))
-USER = os.environ["SFTP_USER"]
-PASS = os.environ["SFTP_PASSWORD"]
+from frames_changeset import EXIT_USER_DATA, build_changeset, digest_of_file, write_changeset
+from sftp_publish import RemoteManifest, connect, put_atomic, remote_exists, run_remote
 
-LOCAL_FILE = "frames.db"
+BASE_DIR = Path(__file__).resolve().parent
+LOCAL_FILE = BASE_DIR / "frames.db"
+PUBLISHED_FILE = BASE_DIR / "out" / "published" / "frames.db"
+CHANGESET_FILE = BASE_DIR / "out" / "frames_changeset.json.gz"
+UPLOAD_FILE = BASE_DIR / "out" / "frames_upload.db"
 
-transport = paramiko.Transport((HOST, PORT))
-transport.connect(username=USER, password=PASS)
-sftp = paramiko.SFTPClient.from_transport(transport)
+REMOTE_PYTHON = os.environ.get("SFTP_REMOTE_PYTHON", "python3")
 
-def ls(path="."):
-    try:
-        return sftp.listdir(path)
-    except Exception as e:
-        return f"ERROR: {e}"
-
-print("SFTP PWD:", sftp.getcwd())
-print("SFTP ls('.'): ", ls("."))
-print("SFTP ls('..'): ", ls(".."))
-print("SFTP ls('www'): ", ls("www"))
-print("SFTP ls('public_html'): ", ls("public_html"))
-print("SFTP ls('trans-time.ru'): ", ls("trans-time.ru"))
-
-# ПОПРОБУЕМ несколько типичных путей
-candidates = [
-    "api/backend/frames.db",
-    "trans-time.ru/api/backend/frames.db",
-    "www/trans-time.ru/api/backend/frames.db",
-    "public_html/api/backend/frames.db",
-    "public_html/trans-time.ru/api/backend/frames.db",
+# Типичные пути backend на хостинге (можно задать явно через SFTP_DB_REMOTE_DIR)
+CANDIDATE_DIRS = [
+    "api/backend",
+    "trans-time.ru/api/backend",
+    "www/trans-time.ru/api/backend",
+    "public_html/api/backend",
+    "public_html/trans-time.ru/api/backend",
 ]
 
-last_err = None
-for remote in candidates:
+
+def find_remote_dir(sftp) -> str:
+    explicit = os.environ.get("SFTP_DB_REMOTE_DIR")
+    candidates = [explicit] if explicit else CANDIDATE_DIRS
+    for path in candidates:
+        if remote_exists(sftp, path):
+            return path
+    raise SystemExit(f"[upload_sftp] ни один путь не доступен: {candidates}")
+
+
+def remember_published() -> None:
+    """Копия опубликованной базы — основа для следующего changeset."""
+    PUBLISHED_FILE.parent.mkdir(parents=True, exist_ok=True)
+    src = sqlite3.connect(f"file:{LOCAL_FILE.as_posix()}?mode=ro", uri=True)
+    dst = sqlite3.connect(str(PUBLISHED_FILE))
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def compact_copy() -> Path:
+    """
+    Согласованная копия без пустых страниц (после подмены теневой таблицы
+    в frames.db остаётся место старой frames_raw) — для полной загрузки.
+    """
+    UPLOAD_FILE.parent.mkdir(parents=True, exist_ok=True)
+    UPLOAD_FILE.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(LOCAL_FILE))
+    try:
+        conn.execute("VACUUM INTO ?", (str(UPLOAD_FILE),))
+    finally:
+        conn.close()
+    return UPLOAD_FILE
+
+
+def publish_changeset(ssh, sftp, remote_dir: str, published_digest: str) -> bool:
+    if not PUBLISHED_FILE.exists():
+        print("[upload_sftp] нет копии опубликованной базы — changeset не построить")
+        return False
+    if digest_of_file(PUBLISHED_FILE) != published_digest:
+        print("[upload_sftp] копия опубликованной базы не совпадает с манифестом сервера")
+        return False
+
+    changeset = build_changeset(PUBLISHED_FILE, LOCAL_FILE)
+    size = write_changeset(changeset, CHANGESET_FILE)
+    print(f"[upload_sftp] changeset: upsert={len(changeset['upsert'])} "
+          f"delete={len(changeset['delete'])} bytes={size} (база {LOCAL_FILE.stat().st_size})")
+
+    remote_name = f".frames_changeset-{changeset['target'][:16]}.json.gz"
+    remote_path = posixpath.join(remote_dir, remote_name)
+    put_atomic(sftp, CHANGESET_FILE, remote_path)
     try:
-        print("TRY UPLOAD ->", remote)
-        sftp.put(LOCAL_FILE, remote)
-        print("OK UPLOADED TO:", remote)
-        last_err = None
-        break
-    except Exception as e:
-        print("FAIL:", remote, "=>", e)
-        last_err = e
-
-sftp.close()
-transport.close()
-
-if last_err:
-    raise SystemExit(f"Upload failed for all candidates: {last_err}")
+        code, output = run_remote(ssh, remote_dir, REMOTE_PYTHON, "frames_changeset.py", "apply", remote_name)
+    finally:
+        sftp.remove(remote_path)
+
+    if output:
+        print(f"[upload_sftp] remote: {output}")
+    if code != 0:
+        print(f"[upload_sftp] changeset не применён (код {code})")
+        return False
+
+    # привязка к дорогам живёт вне frames_raw — пересчитываем на сервере (не критично для публикации)
+    code, output = run_remote(ssh, remote_dir, REMOTE_PYTHON, "road_snap.py")
+    if output:
+        print(f"[upload_sftp] remote: {output}")
+    if code != 0:
+        print(f"[upload_sftp] привязка к дорогам на сервере не обновлена (код {code})")
+    return True
+
+
+def publish_full(ssh, sftp, remote_dir: str, remote_db: str, local_digest: str) -> bool:
+    upload = compact_copy()
+    try:
+        size = upload.stat().st_size
+        if not remote_exists(sftp, remote_db):
+            # первая публикация: живой базы нет, но от старой могли остаться -wal/-shm
+            for suffix in ("-wal", "-shm"):
+                if remote_exists(sftp, remote_db + suffix):
+                    sftp.remove(remote_db + suffix)
+            print(f"[upload_sftp] полная загрузка {size} байт -> {remote_db}")
+            put_atomic(sftp, upload, remote_db)
+            return True
+
+        remote_name = f".frames_upload-{local_digest[:16]}.db"
+        remote_path = posixpath.join(remote_dir, remote_name)
+        print(f"[upload_sftp] полная загрузка {size} байт -> {remote_path}, замена через install")
+        put_atomic(sftp, upload, remote_path)
+        try:
+            code, output = run_remote(ssh, remote_dir, REMOTE_PYTHON, "frames_changeset.py", "install", remote_name)
+        finally:
+            sftp.remove(remote_path)
+    finally:
+        upload.unlink(missing_ok=True)
+
+    if output:
+        print(f"[upload_sftp] remote: {output}")
+    if code is None:
+        print("[upload_sftp] на хостинге нет exec — живую базу поверх не переписываем")
+    elif code == EXIT_USER_DATA:
+        print("[upload_sftp] на сервере есть правки/предложения — полная замена отменена, нужен changeset")
+    elif code != 0:
+        print(f"[upload_sftp] база не заменена (код {code})")
+    return code == 0
+
+
+def main() -> int:
+    if not LOCAL_FILE.exists():
+        raise SystemExit(f"[upload_sftp] нет {LOCAL_FILE}")
+    local_digest = digest_of_file(LOCAL_FILE)
+
+    ssh = connect()
+    sftp = ssh.open_sftp()
+    try:
+        remote_dir = find_remote_dir(sftp)
+        remote_db = posixpath.join(remote_dir, "frames.db")
+        manifest = RemoteManifest(sftp, remote_dir)
+        published_digest = manifest.get("frames.db").get("frames_digest")
+        print(f"[upload_sftp] remote dir: {remote_dir}")
+
+        if published_digest == local_digest and remote_exists(sftp, remote_db):
+            print("[upload_sftp] frames_raw не изменилась — загрузка не нужна")
+            return 0
+
+        mode = "changeset"
+        if not (published_digest and remote_exists(sftp, remote_db)
+                and publish_changeset(ssh, sftp, remote_dir, published_digest)):
+            mode = "full"
+            if not publish_full(ssh, sftp, remote_dir, remote_db, local_digest):
+                return 1
+
+        manifest.set("frames.db", frames_digest=local_digest, mode=mode)
+        manifest.save()
+        remember_published()
+        print(f"[upload_sftp] OK ({mode})")
+        return 0
+    finally:
+        sftp.close()
+        ssh.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# api/backend/upload_static_sftp.py
+"""
+Выгрузка собранных статических слоёв (map/data/build, см. build_layers.py) по SFTP.
+Неизменившиеся файлы пропускаются по манифесту на сервере, остальные
+заменяются атомарно (sftp_publish.put_atomic).
+"""
+import os
+import posixpath
+import sys
+
+from build_layers import OUT_DIR
+from sftp_publish import RemoteManifest, connect, file_sha256, put_atomic, remote_exists
+
+REMOTE_DIR = os.environ.get("SFTP_STATIC_REMOTE_DIR", "trans-time.ru/map/data/build")
+
+
+def main():
+    files = sorted(p for p in OUT_DIR.iterdir() if p.is_file())
+    if not files:
+        raise SystemExit(f"[upload_static_sftp] нечего выгружать: {OUT_DIR} пуст (сначала build_layers.py)")
+
+    ssh = connect()
+    sftp = ssh.open_sftp()
+    try:
+        if not remote_exists(sftp, REMOTE_DIR):
+            # папка сборки наша — её можно создать (родитель map/data должен существовать)
+            sftp.mkdir(REMOTE_DIR)
+
+        manifest = RemoteManifest(sftp, REMOTE_DIR)
+        uploaded = skipped = 0
+        for path in files:
+            digest = file_sha256(path)
+            if manifest.unchanged(path.name, digest):
+                skipped += 1
+                continue
+            put_atomic(sftp, path, posixpath.join(REMOTE_DIR, path.name))
+            manifest.set(path.name, sha256=digest)
+            uploaded += 1
+
+        if uploaded:
+            manifest.save()
+    finally:
+        sftp.close()
+        ssh.close()
+
+    print(f"[upload_static_sftp] done: uploaded={uploaded} unchanged={skipped}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@
 //   const framesSvc = await initFramesService(map);
 //   const result = framesSvc.updateFramesForRoute(routeCoords, currentTruckParams);
 //   // result.criticalFrames -> список проблемных/подозрительных рамок для UI
+//   const precise = await framesSvc.fetchFramesForRoute(routeCoords, currentTruckParams);
+//   // то же, но по серверному коридору вдоль линии маршрута
 
 const HAS_WINDOW = typeof window !== 'undefined';
 const HAS_DOC = typeof document !== 'undefined';
@@ -114,6 +116,8 @@ function isPointInBBoxObject(coords, bboxObj) {
  *
  * options:
  *   framesUrl      — источник рамок (по умолчанию /api/frames)
+ *   corridorUrl    — коридор маршрута (по умолчанию /api/frames/corridor)
+ *   corridorBufferM — ширина коридора в метрах (по умолчанию 150)
  *   roadsUrl       — источник дорог (пока не используем, зарезервировано)
  *   hgvAllowedUrl  — HGV-разрешённые (зарезервировано)
  *   hgvConditionalUrl — условно разрешённые (зарезервировано)
@@ -133,6 +137,12 @@ export async function initFramesService(map, options = {}) {
         bbox: null,
         frames: [],
         criticalFrames: []
+      }),
+      fetchFramesForRoute: async () => ({
+        state,
+        bbox: null,
+        frames: [],
+        criticalFrames: []
       })
     };
   }
@@ -141,6 +151,8 @@ export async function initFramesService(map, options = {}) {
 
   const {
     framesUrl = '/api/frames',
+    corridorUrl = '/api/frames/corridor',
+    corridorBufferM = 150,
     roadsUrl = null,
     hgvAllowedUrl = null,
     hgvConditionalUrl = null
@@ -207,10 +219,60 @@ export async function initFramesService(map, options = {}) {
     };
   }
 
+  /**
+   * Рамки вдоль маршрута по серверному коридору (POST /api/frames/corridor):
+   * учитывается реальное расстояние до линии маршрута, а не bbox,
+   * и параметры ТС (truck_status: ok / warn / violates).
+   * Возвращает тот же формат, что и updateFramesForRoute; при ошибке сети
+   * откатывается на локальный bbox-фильтр.
+   */
+  async function fetchFramesForRoute(routePoints, truckParams = {}, bufferM = corridorBufferM) {
+    const route = (Array.isArray(routePoints) ? routePoints : [])
+      .map(normalizeCoordPair)
+      .filter(Boolean);
+    if (!route.length) {
+      return updateFramesForRoute(routePoints, truckParams);
+    }
+
+    try {
+      const res = await fetch(corridorUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ route, buffer_m: bufferM, truck: truckParams || {} })
+      });
+      if (!res.ok) {
+        console.warn('[TT][frames-service] Коридор маршрута недоступен:', res.status);
+        return updateFramesForRoute(routePoints, truckParams);
+      }
+      const data = await res.json();
+      const frames = data && Array.isArray(data.features) ? data.features : [];
+      const bboxObj = bboxFromRoutePointsWithPadding(route, bufferM / 1000);
+      return {
+        state,
+        bbox: bboxObj
+          ? [
+              [bboxObj.minLon, bboxObj.minLat],
+              [bboxObj.maxLon, bboxObj.maxLat]
+            ]
+          : null,
+        frames,
+        // сервер уже сверил рамки с параметрами ТС: критичны только warn/violates
+        criticalFrames: frames.filter((f) => {
+          const status = f && f.properties && f.properties.truck_status;
+          return status !== 'ok';
+        })
+      };
+    } catch (e) {
+      console.warn('[TT][frames-service] Ошибка сети при запросе коридора:', e);
+      return updateFramesForRoute(routePoints, truckParams);
+    }
+  }
+
   console.log('[TT][frames-service] Сервис рамок инициализирован, источник:', '/api/frames');
 
   return {
     state,
-    updateFramesForRoute
+    updateFramesForRoute,
+    fetchFramesForRoute
   };
 }
@@ -234,7 +234,7 @@ async function doInit() {
   // 10. Инициализация frames-service (анализ рамок)
   try {
     // ?v=2 — пробиваем кэш старой версии модуля
-    const { initFramesService } = await import('./frames-service.js?v=2');
+    const { initFramesService } = await import('./frames-service.js?v=4');
     const svc = await initFramesService(mapInstance);
     if (hasWindow) {
       window.__TT_FRAMES_SERVICE = svc;
@@ -8,6 +8,7 @@ const hasWindow = typeof window !== 'undefined';
 const hasDom = typeof document !== 'undefined';
 
 let multiRoute = null;
+let framesRequestSeq = 0;
 
 /* ------------------------------------------------------
    Получение карты
@@ -362,11 +363,24 @@ export function refreshFramesForActiveRoute(fallbackPoints) {
         routePoints = collectRouteGeometryPoints(activeRoute);
       }
       const truckParams = window.__TT_TRUCK_PARAMS || {};
-      const res = framesSvc.updateFramesForRoute(routePoints || [], truckParams);
-
-      if (res?.criticalFrames?.length) {
-        toast?.(`Внимание: найдено проблемных рамок: ${res.criticalFrames.length}`, 7000);
-        console.log('[TT][router] Критичные рамки:', res.criticalFrames);
+      const requestId = ++framesRequestSeq;
+
+      const report = (res) => {
+        // ответ по устаревшему маршруту не показываем
+        if (requestId !== framesRequestSeq) return;
+        if (res?.criticalFrames?.length) {
+          toast?.(`Внимание: найдено проблемных рамок: ${res.criticalFrames.length}`, 7000);
+          console.log('[TT][router] Критичные рамки:', res.criticalFrames);
+        }
+      };
+
+      if (typeof framesSvc.fetchFramesForRoute === 'function') {
+        framesSvc
+          .fetchFramesForRoute(routePoints || [], truckParams)
+          .then(report)
+          .catch((e) => console.warn('[TT][router] Ошибка frames-service:', e));
+      } else {
+        report(framesSvc.updateFramesForRoute(routePoints || [], truckParams));
       }
     } catch (e) {
       console.warn('[TT][router] Ошибка frames-service:', e);